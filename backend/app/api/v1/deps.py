@@ -0,0 +1,21 @@
+# app/api/v1/deps.py
+"""Dépendances FastAPI partagées : driver Neo4j du lifespan + vector store."""
+from fastapi import Request
+
+from settings import NEO4J_CFG
+from embedding.vector_store import Neo4jVectorManager
+
+
+def get_neo4j_driver(request: Request):
+    """Driver créé par le lifespan (None hors application complète → registre partagé)."""
+    return getattr(request.app.state, "neo4j_driver", None)
+
+
+def get_neo4j_async_driver(request: Request):
+    """Driver asynchrone du lifespan, pour les routes qui ne doivent pas bloquer la boucle."""
+    return getattr(request.app.state, "neo4j_async_driver", None)
+
+
+def get_vector_store(request: Request) -> Neo4jVectorManager:
+    return Neo4jVectorManager(**NEO4J_CFG, driver=get_neo4j_driver(request),
+                              async_driver=get_neo4j_async_driver(request))
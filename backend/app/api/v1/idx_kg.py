@@ -1,21 +1,31 @@
 from settings import NEO4J_CFG  # ← mon dict centralisé
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import os, json
+import os, json, asyncio
 from pathlib import Path
 
 from .schemas import (         # met tes Pydantic ici si besoin
-    SeriesIndexRequest, KGRequest
+    SeriesIndexRequest, KGRequest, ReindexRequest, KGJobRequest, CommunityRequest
 )
+from .deps import get_vector_store
 
-from embedding.embedding_manager import EmbeddingManager
+from embedding.embedding_manager import EmbeddingManager, IndexEmbeddingManager
 from embedding.Embedding_config import EmbeddingConfig
 from embedding.embedding_pipeline import EmbeddingPipeline
 from embedding.vector_store import Neo4jVectorManager
+from embedding.reindexer import BlueGreenReindexer, register_job, get_job, list_jobs
 from knowledge.kg_builder import KGBuilder
 from knowledge.schema_manager import GraphSchemaManager
 
 from knowledge.graph_builder import GraphBuilder  # depuis repo Neo4j Labs
+from knowledge.rule_extractor import ExtractionRouter
+from knowledge.extraction_cache import get_extraction_cache
+from knowledge.entity_resolver import EntityResolver
+from knowledge.numeric_normalizer import NumericNormalizer
+from knowledge.geocoder import Geocoder
+from knowledge import community
+from knowledge import kg_jobs
 
 router = APIRouter(prefix="/idx-kg", tags=["Indexing&KG"])
 # database_name = os.getenv("NEO4J_DATABASE", "addoha2") 
@@ -27,24 +37,32 @@ def _load_default():
         return json.loads(_DEF_CFG.read_text())
     return {"provider": "huggingface", "params": {}}
 
+def _index_embedder(store: Neo4jVectorManager, provider: str | None):
+    """Embedder de l'index servi (configuration portée par l'alias) ; *provider* explicite :
+    ce provider, refusé à l'écriture s'il diffère du modèle de l'index."""
+    if provider is not None:
+        return EmbeddingManager(provider)
+    return IndexEmbeddingManager(store, _load_default())
+
 # -------------------------------------------------------------------
 @router.post("/create-idx") # (POST) http://localhost:8050/api/v1/idx-kg/create-idx
-async def create_index(req: SeriesIndexRequest):
+async def create_index(req: SeriesIndexRequest, store: Neo4jVectorManager = Depends(get_vector_store)):
     try:
-        cfg = _load_default() if req.embedder is None else {"provider": req.embedder, "params": {}}
         # mgr = EmbeddingManager(cfg["provider"], **cfg.get("params", {}))
-        mgr = EmbeddingManager(EmbeddingConfig(**cfg))
-        store = Neo4jVectorManager(**NEO4J_CFG)
+        mgr = _index_embedder(store, req.embedder)
         pipeline = EmbeddingPipeline(embedder=mgr, vector_store=store)
-        results = pipeline.get_chunks_text(req.series)
+        # Embeddings + écritures synchrones : exécutés hors de la boucle d'événements
+        results = await asyncio.to_thread(pipeline.get_chunks_text, req.series)
         if results["status"] == "error":
             return results
-        r = pipeline.run_from_series(results["chunks"], req.series)
+        r = await asyncio.to_thread(pipeline.run_from_series, results["chunks"], req.series)
         return r
         # return {"index": store.index_name, "chunks_indexed": n_chunks, "embedder": cfg["provider"]}
 
     except (FileNotFoundError, RuntimeError) as e:
         raise HTTPException(404, str(e))
+    except ValueError as e:                 # embedder différent de celui de l'index servi
+        raise HTTPException(409, str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {"status": "OK"}
@@ -76,9 +94,160 @@ async def create_index(req: SeriesIndexRequest):
 
 # -------------------------------------------------------------------
 @router.post("/build-kg") # (POST) http://localhost:8050/api/v1/idx-kg/build-kg
-async def build_kg(body: KGRequest):
-    store = Neo4jVectorManager(**NEO4J_CFG)
-    llm_chain = GraphBuilder()  # config LLM selon ton choix (OpenAI, Gemini…)
+async def build_kg(body: KGRequest, store: Neo4jVectorManager = Depends(get_vector_store)):
+    llm_chain = ExtractionRouter(GraphBuilder())  # règles pour le structuré, LLM (Gemini…) pour le texte libre
     kg = KGBuilder(driver=store.driver, database=store.db, llm=llm_chain, schema_manager=GraphSchemaManager())
-    results = kg.build_from_series(body.series)
-    return results
\ No newline at end of file
+    # extraction LLM concurrente (ainvoke), limitée aux chunks nouveaux / modifiés
+    try:
+        results = await kg.abuild_from_series(body.series, incremental=body.incremental)
+    except ValueError as e:                     # série non ingérée
+        raise HTTPException(409, str(e))
+    # géocodage hors ligne (gazetteer) : lieux et projets nouvellement reliés
+    results["geocoded"] = await asyncio.to_thread(Geocoder(store.driver, store.db).run)
+    return results
+
+# -------------------------------------------------------------------
+def _kg_builder(store: Neo4jVectorManager) -> KGBuilder:
+    return KGBuilder(driver=store.driver, database=store.db, llm=ExtractionRouter(GraphBuilder()),
+                     schema_manager=GraphSchemaManager())
+
+def _check_series(series: str) -> None:
+    """Un seul job à la fois par série (création comme reprise)."""
+    if any(j["status"] == "running" and j["series"] == series for j in kg_jobs.list_jobs()):
+        raise HTTPException(409, f"Un job est déjà en cours sur la série {series}")
+
+def _start(job: kg_jobs.KGBuildJob, **kwargs) -> dict:
+    if job.state["status"] == "running":
+        raise HTTPException(409, f"Job déjà en cours : {job.job_id}")
+    job.task = asyncio.create_task(job.run(**kwargs))      # référence gardée : pas de GC de la tâche
+    return job.state
+
+@router.post("/build-kg/jobs") # (POST) http://localhost:8050/api/v1/idx-kg/build-kg/jobs
+async def start_kg_job(req: KGJobRequest, store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Construction du KG en arrière-plan, avec points de reprise et budget de tokens."""
+    _check_series(req.series)
+    job = kg_jobs.register_job(kg_jobs.KGBuildJob(_kg_builder(store), req.series,
+                                                  concurrency=req.concurrency, token_budget=req.token_budget))
+    return _start(job)
+
+@router.get("/build-kg/jobs") # (GET) http://localhost:8050/api/v1/idx-kg/build-kg/jobs
+async def kg_jobs_list():
+    return await asyncio.to_thread(kg_jobs.list_jobs)
+
+@router.post("/build-kg/jobs/{job_id}/resume") # (POST) http://localhost:8050/api/v1/idx-kg/build-kg/jobs/<job_id>/resume
+async def resume_kg_job(job_id: str, token_budget: int | None = None,
+                        store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Reprend un job interrompu / en échec / à court de budget / terminé avec des groupes en
+    échec (``done_with_errors``) à partir de son point de reprise."""
+    job = await asyncio.to_thread(kg_jobs.load_job, _kg_builder(store), job_id)
+    if job is None:
+        raise HTTPException(404, f"Job inconnu : {job_id}")
+    if job.state["status"] != "running":
+        _check_series(job.state["series"])
+    return _start(job, token_budget=token_budget)
+
+@router.post("/build-kg/jobs/{job_id}/cancel") # (POST) http://localhost:8050/api/v1/idx-kg/build-kg/jobs/<job_id>/cancel
+async def cancel_kg_job(job_id: str):
+    job = kg_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job inconnu : {job_id}")
+    job.cancel()            # les groupes en vol terminent, les suivants ne sont pas lancés
+    return job.state
+
+@router.get("/build-kg/jobs/{job_id}") # (GET) http://localhost:8050/api/v1/idx-kg/build-kg/jobs/<job_id>
+async def kg_job_status(job_id: str):
+    job = kg_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job inconnu : {job_id}")
+    return job.state
+
+@router.get("/build-kg/jobs/{job_id}/stream") # (GET) http://localhost:8050/api/v1/idx-kg/build-kg/jobs/<job_id>/stream
+async def kg_job_stream(job_id: str, interval: float = 1.0):
+    """Progression en NDJSON (une ligne par changement d'état) jusqu'à la fin du job."""
+    job = kg_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job inconnu : {job_id}")
+
+    async def events():
+        last = None
+        while True:
+            line = json.dumps(job.state, ensure_ascii=False, default=str)
+            if line != last:
+                yield line + "\n"
+                last = line
+            if job.state["status"] in kg_jobs.TERMINAL:
+                return
+            await asyncio.sleep(max(0.2, interval))
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# -------------------------------------------------------------------
+@router.post("/reindex") # (POST) http://localhost:8050/api/v1/idx-kg/reindex
+async def start_reindex(req: ReindexRequest, store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Lance en arrière-plan une reconstruction bleu / vert de l'index vectoriel ;
+    l'index actuel continue de servir jusqu'à la bascule de l'alias."""
+    if not store.use_alias:
+        raise HTTPException(400, "NEO4J_INDEX_ALIAS doit être activé pour une reconstruction bleu / vert")
+    if any(j["status"] == "running" for j in list_jobs()):
+        raise HTTPException(409, "Une reconstruction est déjà en cours")
+    cfg = _load_default() if req.embedder is None else {"provider": req.embedder, "params": {}}
+    mgr = EmbeddingManager(cfg["provider"], **cfg.get("params", {}))
+    job = register_job(BlueGreenReindexer(store, mgr, similarity=req.similarity, batch_size=req.batch_size))
+    job.task = asyncio.create_task(asyncio.to_thread(job.run))   # référence gardée : pas de GC de la tâche
+    return job.state
+
+@router.get("/reindex/{job_id}") # (GET) http://localhost:8050/api/v1/idx-kg/reindex/<job_id>
+async def reindex_status(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job inconnu : {job_id}")
+    return job.state
+
+# -------------------------------------------------------------------
+@router.post("/communities") # (POST) http://localhost:8050/api/v1/idx-kg/communities
+async def start_communities(req: CommunityRequest, store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Lance en arrière-plan la détection des communautés et leurs résumés (mode de retrieval "global").
+    Seules les communautés nouvelles ou modifiées sont résumées par le LLM."""
+    if any(j["status"] == "running" for j in community.list_jobs()):
+        raise HTTPException(409, "Un calcul des communautés est déjà en cours")
+    mgr = _index_embedder(store, req.embedder)     # même espace que les questions
+    job = community.register_job(community.CommunityJob(store.driver, store.db, embedder=mgr,
+                                                        min_size=req.min_size, force=req.force))
+    job.task = asyncio.create_task(job.run())       # référence gardée : pas de GC de la tâche
+    return job.state
+
+@router.get("/communities/{job_id}") # (GET) http://localhost:8050/api/v1/idx-kg/communities/<job_id>
+async def communities_status(job_id: str):
+    job = community.get_job(job_id)
+    if job is None:
+        raise HTTPException(404, f"Job inconnu : {job_id}")
+    return job.state
+
+# -------------------------------------------------------------------
+@router.post("/entities/backfill") # (POST) http://localhost:8050/api/v1/idx-kg/entities/backfill
+async def backfill_entity_keys(store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Migration : clé canonique sur les entités existantes, doublons fusionnés."""
+    return await asyncio.to_thread(EntityResolver().backfill, store.driver, store.db)
+
+@router.post("/entities/numeric/backfill") # (POST) http://localhost:8050/api/v1/idx-kg/entities/numeric/backfill
+async def backfill_numeric_properties(store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Migration : propriétés typées (price_mad, surface_m2, rooms) depuis les relations existantes."""
+    return await asyncio.to_thread(NumericNormalizer(store.driver, store.db).backfill)
+
+@router.post("/geocode") # (POST) http://localhost:8050/api/v1/idx-kg/geocode
+async def geocode_entities(store: Neo4jVectorManager = Depends(get_vector_store)):
+    """Points (gazetteer hors ligne) sur les villes / quartiers et les entités LOCATED_IN ; idempotent."""
+    return await asyncio.to_thread(Geocoder(store.driver, store.db).run)
+
+# -------------------------------------------------------------------
+@router.post("/extraction-cache/purge") # (POST) http://localhost:8050/api/v1/idx-kg/extraction-cache/purge
+async def purge_extraction_cache(all: bool = False):
+    """Supprime les triplets en cache des anciennes versions du prompt (ou tout le cache si all=true)."""
+    cache = get_extraction_cache()
+    if cache is None:
+        return {"enabled": False}
+    if all:
+        removed = await asyncio.to_thread(cache.invalidate)
+    else:
+        removed = await asyncio.to_thread(cache.purge_stale, GraphBuilder.prompt_hash())
+    return {"removed": removed, **cache.stats()}
@@ -4,7 +4,7 @@ from ingestion.data_info_manager import DataInfoManager
 from ingestion.data_importer import DataImporter
 from ingestion.extractor import Extractor
 from ingestion.chunker import Chunker
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends
 from typing import List, Optional
 from .schemas import (         # met tes Pydantic ici si besoin
     SimpleFileRequest, CustomFileRequest, SaveChunksRequest, SaveChunksResponse, GetChunksByVersionResponse
@@ -12,6 +12,10 @@ from .schemas import (         # met tes Pydantic ici si besoin
 from ingestion.document_loader import DocumentLoader
 from pydantic import BaseModel
 from embedding.embedding_pipeline import EmbeddingPipeline
+from embedding.vector_store import Neo4jVectorManager
+from ingestion.tabular_importer import TabularImporter
+from .deps import get_vector_store
+import asyncio, json, shutil
 
 router = APIRouter(prefix="/ingestion", tags=["Ingestion"])
 # router = APIRouter()
@@ -157,6 +161,31 @@ async def get_latest_series():
 
 
 
+# --------------------------------------------------------------------------
+# Import tabulaire direct (CSV / XLSX → nœuds / relations, sans LLM)
+# --------------------------------------------------------------------------
+
+@router.post("/tabular-import") # (POST) http://localhost:8050/api/v1/ingestion/tabular-import
+async def tabular_import(file: UploadFile = File(...), mapping: str = Form(...), sheet: Optional[str] = Form(None),
+                         batch_size: int = Form(5000), store: Neo4jVectorManager = Depends(get_vector_store)):
+    """mapping : JSON {nodes: [...], relationships: [...]} (voir ingestion/tabular_importer.py)."""
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    if suffix not in (".csv", ".txt", ".xlsx", ".xlsm"):
+        raise HTTPException(400, f"Format non pris en charge : {suffix or file.filename}")
+    try:
+        spec = json.loads(mapping)
+    except ValueError as e:
+        raise HTTPException(400, f"Mapping JSON invalide : {e}")
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp)          # copie en flux : pas de fichier entier en mémoire
+    try:
+        importer = TabularImporter(store.driver, store.db, batch_size=batch_size)
+        return await asyncio.to_thread(importer.run, tmp.name, spec, sheet=sheet)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    finally:
+        os.unlink(tmp.name)
+
 # --------------------------------------------------------------------------
 # Routes for Extraction
 # --------------------------------------------------------------------------
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from pathlib import Path
+from typing import Literal
 import os
 # from app.rag.graphrag_core import GraphRAG
 # http://127.0.0.1:8050/docs#/Diag sur navigateur
@@ -11,8 +12,11 @@ from tools.graph_rag_tool import search_data   # même fonction que pour MCP
 
 router = APIRouter(prefix="/diag", tags=["Diag"])
 
+RetrievalMode = Literal["vector", "hybrid", "global"]   # "global" : résumés de communautés
+
 class QueryIn(BaseModel):
     question: str
+    mode: RetrievalMode | None = None     # défaut RAG_RETRIEVAL_MODE
 
 # @router.post("/query")
 # def query(req: QueryIn, rag: GraphRAG = Depends(GraphRAG)):
@@ -20,10 +24,10 @@ class QueryIn(BaseModel):
 
 
 @router.post("/search") # (POST) http://localhost:8050/api/v1/rag/diag/search
-async def diag_search(q: str, k: int = 8):
+async def diag_search(q: str, k: int = 8, mode: RetrievalMode | None = None):
     try:
         ctx = Context(client_id="diag")          # contexte bidon
-        answer = await search_data(ctx, q, k)    # appel direct
+        answer = await search_data(ctx, q, k, mode)    # appel direct
         return {"answer": answer}
     except Exception as e:
         raise HTTPException(500, str(e))
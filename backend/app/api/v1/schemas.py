@@ -51,5 +51,21 @@ class SeriesIndexRequest(BaseModel):
     embedder: str | None = None  # sinon ← config persistée
     version: str | None = None
 
+class ReindexRequest(BaseModel):
+    embedder: str | None = None     # provider de la nouvelle génération (sinon ← config persistée)
+    similarity: str = "cosine"
+    batch_size: int = 256
+
 class KGRequest(BaseModel):
-    series: str  # ex: "110625-022017"
\ No newline at end of file
+    series: str  # ex: "110625-022017"
+    incremental: bool = True   # False : réextrait tous les chunks (ex. après changement de modèle)
+
+class KGJobRequest(BaseModel):
+    series: str
+    concurrency: int | None = None      # appels LLM simultanés (sinon KG_CFG)
+    token_budget: int | None = None     # plafond de tokens de prompt estimés, cumulé sur les reprises
+
+class CommunityRequest(BaseModel):
+    embedder: str | None = None         # provider des vecteurs de résumés (sinon ← config persistée)
+    min_size: int | None = None         # taille minimale d'une communauté résumée (sinon COMMUNITY_CFG)
+    force: bool = False                 # True : régénère tous les résumés (ex. après changement de LLM)
@@ -1,14 +1,14 @@
 # app/api/v1/ingestion.py
 from settings import NEO4J_CFG  # ← mon dict centralisé
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
 from typing import List, Optional
 from embedding import embedder_base
 from embedding.embedding_manager import EmbeddingManager
 from embedding.vector_store import Neo4jVectorManager
-import os
+import os, asyncio
 
 from knowledge.graph_builder import GraphBuilder
-from knowledge.schema_manager import GraphSchemaManager
+from knowledge.schema_manager import GraphSchemaManager, SchemaBootstrap
 from knowledge.kg_builder import KGBuilder
 from embedding import embedding_pipeline
 from embedding.embedder_base import HuggingFaceEmbedder, OpenAIEmbedder, GeminiEmbedder
@@ -18,6 +18,8 @@ from pydantic import BaseModel
 from .schemas import (         # met tes Pydantic ici si besoin
     EmbedderConfigResponse,
 )
+from .deps import get_vector_store
+from rag.retrieval_cache import get_retrieval_cache
 
 router = APIRouter(prefix="/status", tags=["Status"])
 # database_name = os.getenv("NEO4J_DATABASE", "addoha2") 
@@ -40,10 +42,9 @@ async def api_health():
 
 
 @router.get("/neo4j-cnx") # (GET) http://localhost:8050/api/v1/status/neo4j-cnx
-async def neo4j_status():
-    store = Neo4jVectorManager(**NEO4J_CFG)
+async def neo4j_status(store: Neo4jVectorManager = Depends(get_vector_store)):
     try:
-        connected = store.test_connection()
+        connected = await store.atest_connection()
         return {"connected": connected, "to": store.db}
     except Exception as e:
         raise HTTPException(500, str(e))
@@ -51,13 +52,10 @@ async def neo4j_status():
 # -------------------------------------------------------------------
 
 @router.get("/neo4j-idx") # (GET) http://localhost:8050/api/v1/status/neo4j-idx
-async def neo4j_indexes():
+async def neo4j_indexes(store: Neo4jVectorManager = Depends(get_vector_store)):
     """Retourne **tout** le catalogue d’index + sous‑liste VECTOR pour diagnostic."""
-    store = Neo4jVectorManager(**NEO4J_CFG)
     try:
-        with store.driver.session(database=store.db) as s:
-            rows = s.run("SHOW INDEXES YIELD name, type, entityType, state RETURN name, type, entityType, state").data()
-        vec_only = [r for r in rows if r["type"].upper().startswith("VECTOR")]
+        vec_only = await store.ashow_indexes(vector_only=True)
         return {"vector_indexes": vec_only}#, "all_indexes": rows}
     except Exception as e:
         raise HTTPException(500, str(e))
@@ -65,30 +63,46 @@ async def neo4j_indexes():
     #     raise HTTPException(500, str(e))(500, str(e))
 
 @router.get("/neo4j-idx-name") # (GET) http://localhost:8050/api/v1/status/neo4j-idx-name
-async def neo4j_indexe_name():
+async def neo4j_indexe_name(store: Neo4jVectorManager = Depends(get_vector_store)):
     """Retourne **tout** le catalogue d’index + sous‑liste VECTOR pour diagnostic."""
-    store = Neo4jVectorManager(**NEO4J_CFG)
     try:
-        with store.driver.session(database=store.db) as s:
-            row = s.run("SHOW INDEXES YIELD name, type, entityType, labelsOrTypes, properties WHERE type = 'VECTOR'").data()
+        row = await store.ashow_indexes(vector_only=True)
         return {"default_index_name": row[0]['name']}
     except Exception as e:
         raise HTTPException(500, str(e))
     # except Exception as e:
     #     raise HTTPException(500, str(e))(500, str(e))
 
+@router.get("/neo4j-schema") # (GET) http://localhost:8050/api/v1/status/neo4j-schema
+async def neo4j_schema(store: Neo4jVectorManager = Depends(get_vector_store)):
+    """État des contraintes / index créés par le bootstrap du schéma (ONLINE, POPULATING, MISSING…)."""
+    try:
+        bootstrap = SchemaBootstrap.for_store(store)
+        items = await asyncio.to_thread(bootstrap.state)
+        return {"ready": all(i["state"] == "ONLINE" for i in items), "items": items}
+    except Exception as e:
+        raise HTTPException(500, str(e))
+
+# -------------------------------------------------------------------
+
+@router.get("/retrieval-cache") # (GET) http://localhost:8050/api/v1/status/retrieval-cache
+async def retrieval_cache_stats():
+    """Entrées, taille et taux de hit du cache de retrieval."""
+    cache = get_retrieval_cache()
+    return {"enabled": False} if cache is None else {"enabled": True, **cache.stats()}
+
 # -------------------------------------------------------------------
 
 @router.get("/neo4j-kg") # (GET) http://localhost:8050/api/v1/status/neo4j-kg
-async def neo4j_kgExists():
+async def neo4j_kgExists(store: Neo4jVectorManager = Depends(get_vector_store)):
     """Retourn si dans la base de données Neo4j il existe un Knowledge Graph."""
     
-    store = Neo4jVectorManager(**NEO4J_CFG)
 
-    kg_builder = KGBuilder(driver=store.driver, database=store.db, llm=GraphBuilder(), schema_manager=GraphSchemaManager())
+    kg_builder = KGBuilder(driver=store.driver, database=store.db, llm=GraphBuilder(), schema_manager=GraphSchemaManager(),
+                           async_driver=store.async_driver)
     try:
         # Vérifier si un KG existe
-        if not kg_builder.check_kg_exists():
+        if not await kg_builder.acheck_kg_exists():
             return {"status": "error", "message": "Aucun KG dans la base de données "+store.db}
         return {"kg_exists": True}
     except Exception as e:
@@ -98,7 +112,7 @@ async def neo4j_kgExists():
 
 @router.get("/embedders")
 async def embedders_status():
-    provs = ["huggingface", "openai", "gemini"]
+    provs = ["huggingface", "openai", "gemini", "hash"]
     statuses = {}
     for p in provs:
         try:
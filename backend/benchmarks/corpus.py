@@ -0,0 +1,51 @@
+"""Corpus synthétique (FR / AR) d'annonces immobilières pour les benchmarks.
+
+Généré à partir d'une graine fixe : deux appels avec les mêmes paramètres
+renvoient exactement les mêmes textes, ce qui rend les mesures comparables.
+"""
+from __future__ import annotations
+import random
+from typing import List
+
+_PROJECTS = ["Al Abrar", "Riad Salam", "Jardins d'Anfa", "Dyar Al Mansour", "Nour Residence", "Les Orangers"]
+_CITIES = ["Casablanca", "Mediouna", "Rabat", "Marrakech", "Tanger", "Agadir", "Fès", "Kénitra"]
+_TYPES = ["F2", "F3", "F4", "studio", "villa", "duplex"]
+_STANDINGS = ["économique", "moyen standing", "haut standing"]
+_EQUIPMENTS = ["parking", "ascenseur", "piscine", "espaces verts", "mosquée", "école"]
+
+_PROJECTS_AR = ["الأبرار", "رياض السلام", "ديار المنصور", "إقامة النور", "البرتقال"]
+_CITIES_AR = ["الدار البيضاء", "مديونة", "الرباط", "مراكش", "طنجة", "أكادير", "فاس"]
+_EQUIPMENTS_AR = ["موقف سيارات", "مصعد", "مسبح", "مساحات خضراء", "مسجد"]
+
+_FR_TEMPLATES = [
+    "Le projet {project} situé à {city} propose des appartements {type} de {surface} m² "
+    "à partir de {price} DH, en {standing}, avec {equipment}.",
+    "Prix : {price} DH — {type} de {rooms} pièces, {surface} m², résidence {project} ({city}). "
+    "Contact commercial : 05 22 {phone}.",
+    '{{"projet": "{project}", "ville": "{city}", "type": "{type}", "surface": {surface}, '
+    '"prix": {price}, "standing": "{standing}"}}',
+]
+_AR_TEMPLATES = [
+    "مشروع {project_ar} في {city_ar} يقدم شققا من {rooms} غرف بمساحة {surface} متر مربع "
+    "بثمن يبدأ من {price} درهم مع {equipment_ar}.",
+    "إقامة {project_ar} ب{city_ar}: شقة {surface} م² ، {rooms} غرف ، الثمن {price} درهم.",
+]
+
+
+def synthetic_corpus(n: int = 512, *, seed: int = 42, arabic_ratio: float = 0.3) -> List[str]:
+    """Retourne *n* passages (≈ ``arabic_ratio`` en arabe, le reste en français)."""
+    rnd = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        fields = {
+            "project": rnd.choice(_PROJECTS), "city": rnd.choice(_CITIES), "type": rnd.choice(_TYPES),
+            "standing": rnd.choice(_STANDINGS), "equipment": rnd.choice(_EQUIPMENTS),
+            "project_ar": rnd.choice(_PROJECTS_AR), "city_ar": rnd.choice(_CITIES_AR),
+            "equipment_ar": rnd.choice(_EQUIPMENTS_AR),
+            "surface": rnd.randrange(45, 250), "rooms": rnd.randrange(1, 7),
+            "price": f"{rnd.randrange(200, 3500) * 1000:,}".replace(",", " "),
+            "phone": f"{rnd.randrange(10, 99)} {rnd.randrange(10, 99)} {rnd.randrange(10, 99)}",
+        }
+        templates = _AR_TEMPLATES if rnd.random() < arabic_ratio else _FR_TEMPLATES
+        texts.append(rnd.choice(templates).format(**fields))
+    return texts
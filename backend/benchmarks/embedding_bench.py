@@ -0,0 +1,150 @@
+"""Benchmark des embedders (+ chemin d'écriture / recherche Neo4j en option).
+
+Usage :
+    python -m benchmarks.embedding_bench --providers hash huggingface --batch-sizes 8 32 128
+    python -m benchmarks.embedding_bench --providers hash --neo4j      # écrit une série de test
+
+Pour chaque provider et chaque taille de batch : textes/s, tokens/s (approximation
+par mots), latence p50/p95 par batch et RSS maximal du processus.
+"""
+from __future__ import annotations
+import argparse, json, re, sys, time
+from typing import Dict, List, Sequence
+
+try:
+    import resource                     # Unix uniquement
+except ImportError:                     # Windows : psutil si installé
+    resource = None
+
+from embedding.embedder_base import EmbedderInterface
+from embedding.embedding_manager import EmbeddingManager
+from benchmarks.corpus import synthetic_corpus
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+# ------------------------------------------------------------------
+def _count_tokens(texts: Sequence[str]) -> int:
+    """Approximation indépendante du tokenizer : un mot = un token."""
+    return sum(len(_TOKEN_RE.findall(t)) for t in texts)
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """Percentile par rang le plus proche (suffisant pour quelques dizaines de batchs)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def _peak_rss_mb() -> float | None:
+    """RSS maximal du processus depuis son démarrage (ko sous Linux, octets sous macOS,
+    pic du working set via psutil sous Windows) ; None si aucune mesure n'est disponible."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    mem = psutil.Process().memory_info()
+    return getattr(mem, "peak_wset", mem.rss) / (1024 * 1024)
+
+
+def _round(value: float | None, ndigits: int) -> float | None:
+    return None if value is None else round(value, ndigits)
+
+
+# ------------------------------------------------------------------
+def run_embedder_benchmark(embedder: EmbedderInterface, texts: List[str],
+                           batch_sizes: Sequence[int] = (8, 32, 128), *, warmup: int = 1) -> List[Dict]:
+    """Mesure *embedder.batch_embed* sur *texts* pour chaque taille de batch."""
+    n_tokens = _count_tokens(texts)
+    results = []
+    for bs in batch_sizes:
+        for _ in range(warmup):
+            embedder.batch_embed(texts[:bs])
+        latencies = []
+        t0 = time.perf_counter()
+        for i in range(0, len(texts), bs):
+            tb = time.perf_counter()
+            embedder.batch_embed(texts[i:i + bs])
+            latencies.append(time.perf_counter() - tb)
+        elapsed = time.perf_counter() - t0
+        results.append({
+            "embedder": repr(embedder),
+            "batch_size": bs,
+            "n_texts": len(texts),
+            "texts_per_sec": round(len(texts) / elapsed, 2) if elapsed else None,
+            "tokens_per_sec": round(n_tokens / elapsed, 2) if elapsed else None,
+            "p50_batch_ms": round(_percentile(latencies, 50) * 1000, 3),
+            "p95_batch_ms": round(_percentile(latencies, 95) * 1000, 3),
+            "peak_rss_mb": _round(_peak_rss_mb(), 1),
+        })
+    return results
+
+
+def run_store_benchmark(embedder: EmbeddingManager, texts: List[str], *, series: str = "bench-000000",
+                        k: int = 8, n_queries: int = 32) -> Dict:
+    """Écrit *texts* comme une série Neo4j puis chronomètre *search_similar*.
+
+    Utilise la configuration NEO4J_CFG : à lancer sur une base de test.
+    """
+    from settings import NEO4J_CFG
+    from embedding.vector_store import Neo4jVectorManager
+    from embedding.embedding_pipeline import EmbeddingPipeline
+
+    store = Neo4jVectorManager(**NEO4J_CFG)
+    pipeline = EmbeddingPipeline(embedder=embedder, vector_store=store)
+
+    t0 = time.perf_counter()
+    write_stats = pipeline.run_from_series(texts, series)
+    write_s = time.perf_counter() - t0
+
+    queries = embedder.embed_texts(texts[:n_queries])
+    latencies = []
+    for vec in queries:
+        tq = time.perf_counter()
+        store.search_similar(vec, k=k)
+        latencies.append(time.perf_counter() - tq)
+    return {
+        "series": series,
+        "written": write_stats["chunks_indexed"],
+        "write_rows_per_sec": round(len(texts) / write_s, 2) if write_s else None,   # embeddings inclus
+        "write_only_rows_per_sec": write_stats["rows_per_sec"],
+        "search_p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "search_p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+    }
+
+
+# ------------------------------------------------------------------
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--providers", nargs="+", default=["hash"], help="clés de EmbeddingManager._registry")
+    ap.add_argument("--batch-sizes", nargs="+", type=int, default=[8, 32, 128])
+    ap.add_argument("--n-texts", type=int, default=512)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--params", default="{}", help="JSON passé au constructeur de l'embedder")
+    ap.add_argument("--neo4j", action="store_true", help="benchmark aussi l'écriture / recherche Neo4j")
+    args = ap.parse_args(argv)
+
+    texts = synthetic_corpus(args.n_texts, seed=args.seed)
+    params = json.loads(args.params)
+    report = {"n_texts": len(texts), "n_tokens": _count_tokens(texts), "embedders": [], "skipped": {}}
+    for provider in args.providers:
+        mgr = EmbeddingManager(provider, **params)
+        try:
+            embedder = mgr.get_embedder()
+        except Exception as e:   # dépendance absente, clé API manquante…
+            report["skipped"][provider] = str(e)
+            continue
+        report["embedders"] += run_embedder_benchmark(embedder, texts, args.batch_sizes)
+        if args.neo4j:
+            report.setdefault("neo4j", {})[provider] = run_store_benchmark(mgr, texts)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
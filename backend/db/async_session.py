@@ -0,0 +1,30 @@
+"""Aides pour le chemin de données asynchrone (driver ``AsyncGraphDatabase``).
+
+Les routes FastAPI et l'outil MCP tournent sur la boucle d'événements : une
+requête Neo4j synchrone y bloquerait toutes les autres. Ces fonctions exécutent
+les requêtes dans des transactions gérées asynchrones (``execute_read`` /
+``execute_write``), rejouées par le driver en cas d'erreur transitoire.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List
+
+
+async def run_read(driver, database: str | None, query: str, **params) -> List[Dict[str, Any]]:
+    async def _work(tx):
+        result = await tx.run(query, **params)
+        return [r.data() async for r in result]
+
+    async with driver.session(database=database) as s:
+        return await s.execute_read(_work)
+
+
+async def run_write(driver, database: str | None, query: str, **params) -> Dict[str, Any]:
+    async def _work(tx):
+        result = await tx.run(query, **params)
+        c = (await result.consume()).counters
+        return {"nodes_created": c.nodes_created, "nodes_deleted": c.nodes_deleted,
+                "relationships_created": c.relationships_created,
+                "relationships_deleted": c.relationships_deleted, "properties_set": c.properties_set}
+
+    async with driver.session(database=database) as s:
+        return await s.execute_write(_work)
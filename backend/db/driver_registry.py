@@ -0,0 +1,76 @@
+"""Registre des drivers Neo4j partagés : un seul pool de connexions par serveur.
+
+Le driver est créé au démarrage (lifespan FastAPI) puis réutilisé par tous les
+composants (Neo4jVectorManager, GraphRAG, KGBuilder, DataInfoManager…) ; il est
+fermé une seule fois à l'arrêt de l'application.
+"""
+from __future__ import annotations
+import threading
+from typing import Any, Dict, Tuple
+
+from settings import NEO4J_POOL_CFG
+
+
+class DriverRegistry:
+    def __init__(self, pool_cfg: Dict[str, Any] | None = None):
+        self.pool_cfg = dict(NEO4J_POOL_CFG if pool_cfg is None else pool_cfg)
+        self._drivers: Dict[Tuple[str, str], Any] = {}
+        self._async_drivers: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    def get(self, url: str, username: str, password: str):
+        """Retourne le driver partagé pour (url, username) ; le crée au premier appel."""
+        key = (url, username)
+        with self._lock:
+            drv = self._drivers.get(key)
+            if drv is None:
+                from neo4j import GraphDatabase
+                drv = GraphDatabase.driver(url, auth=(username, password), **self.pool_cfg)
+                self._drivers[key] = drv
+            return drv
+
+    def from_cfg(self, cfg: Dict[str, Any]):
+        """Raccourci depuis un dict au format NEO4J_CFG."""
+        return self.get(cfg["url"], cfg["username"], cfg["password"])
+
+    def get_async(self, url: str, username: str, password: str):
+        """Pendant asynchrone (``AsyncGraphDatabase``) pour les routes et l'outil MCP."""
+        key = (url, username)
+        with self._lock:
+            drv = self._async_drivers.get(key)
+            if drv is None:
+                from neo4j import AsyncGraphDatabase
+                drv = AsyncGraphDatabase.driver(url, auth=(username, password), **self.pool_cfg)
+                self._async_drivers[key] = drv
+            return drv
+
+    def from_cfg_async(self, cfg: Dict[str, Any]):
+        return self.get_async(cfg["url"], cfg["username"], cfg["password"])
+
+    # ------------------------------------------------------------------
+    def close_all(self) -> None:
+        with self._lock:
+            drivers, self._drivers = list(self._drivers.values()), {}
+        for drv in drivers:
+            try:
+                drv.close()
+            except Exception as e:
+                print(f"Fermeture du driver Neo4j impossible : {e}")
+
+    async def aclose_all(self) -> None:
+        """Ferme les drivers asynchrones (à appeler depuis la boucle qui les a utilisés)."""
+        with self._lock:
+            drivers, self._async_drivers = list(self._async_drivers.values()), {}
+        for drv in drivers:
+            try:
+                await drv.close()
+            except Exception as e:
+                print(f"Fermeture du driver Neo4j asynchrone impossible : {e}")
+
+    def __len__(self) -> int:
+        return len(self._drivers)
+
+
+# Instance unique utilisée par toute l'application
+driver_registry = DriverRegistry()
@@ -0,0 +1,117 @@
+"""Compteurs de génération des données indexées (invalidation des caches de lecture).
+
+Chaque écriture (chunks d'une série, triplets du KG) incrémente la génération de la
+série concernée et le total de son type ; un cache de résultats inclut le *token*
+courant dans sa clé : après une ingestion, les anciennes entrées ne sont plus jamais
+relues (elles sortent ensuite par LRU / TTL).
+
+La bascule de l'alias vectoriel (reconstruction bleu / vert) incrémente l'époque
+``index``, incluse dans tous les tokens : filtrés par série ou non, les résultats
+calculés sur l'index retiré ne sont plus relus.
+
+Multi-workers : une fois lié à Neo4j (:meth:`GenerationCounter.bind`, au démarrage de
+l'application et des commandes d'ingestion), chaque ``bump`` incrémente aussi un nœud
+``(:DataGeneration {scope})`` — comme la génération de l'alias, portée par le nœud
+``VectorIndexAlias`` — et ``token`` / ``atoken`` relisent ces nœuds : une ingestion faite
+par un worker invalide le cache de tous les autres dès la requête suivante. Non lié
+(tests, scripts), les compteurs restent en mémoire du processus.
+"""
+from __future__ import annotations
+import threading
+from typing import Dict, List, Tuple
+
+from db.async_session import run_read
+
+KINDS = ("chunks", "kg", "index")
+LABEL = "DataGeneration"
+
+
+class GenerationCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], int] = {}
+        self._totals: Dict[str, int] = {k: 0 for k in KINDS}
+        self.driver = self.async_driver = self.db = None
+
+    def bind(self, driver, database: str | None = None, *, async_driver=None) -> None:
+        """Partage les compteurs entre processus via Neo4j (``None`` : retour au mode local)."""
+        self.driver, self.db, self.async_driver = driver, database, async_driver
+
+    @staticmethod
+    def _scopes(series: str | None, kind: str) -> List[str]:
+        return [kind] if series is None else [kind, f"{kind}:{series}"]
+
+    _BUMP_Q = (f"UNWIND $scopes AS scope MERGE (g:{LABEL} {{scope: scope}}) "
+               f"SET g.n = coalesce(g.n, 0) + 1")
+    _READ_Q = (f"UNWIND $scopes AS scope OPTIONAL MATCH (g:{LABEL} {{scope: scope}}) "
+               f"RETURN scope, coalesce(g.n, 0) AS n")
+
+    def bump(self, series: str | None = None, *, kind: str = "chunks") -> int:
+        """Nouvelle génération pour *series* (et le total de *kind*) ; retourne le total local.
+
+        Lié à Neo4j, l'incrément y est aussi écrit ; en cas d'échec, les autres workers
+        gardent leurs entrées jusqu'au TTL du cache (les données, elles, sont écrites)."""
+        if kind not in KINDS:
+            raise ValueError(f"kind inconnu : {kind}")
+        with self._lock:
+            if series is not None:
+                key = (kind, series)
+                self._series[key] = self._series.get(key, 0) + 1
+            self._totals[kind] += 1
+            total = self._totals[kind]
+        if self.driver is not None:
+            try:
+                with self.driver.session(database=self.db) as s:
+                    s.execute_write(lambda tx: tx.run(self._BUMP_Q, scopes=self._scopes(series, kind)).consume())
+            except Exception as e:
+                print(f"Générations : incrément partagé en échec ({e})")
+        return total
+
+    def get(self, series: str | None = None, *, kind: str = "chunks") -> int:
+        with self._lock:
+            return self._totals[kind] if series is None else self._series.get((kind, series), 0)
+
+    def token(self, series: str | None = None) -> Tuple[int, int, int] | None:
+        """(génération des chunks visibles, génération du KG, époque de l'index) pour une requête.
+
+        Une requête restreinte à une série ne dépend que des chunks de cette série ;
+        l'expansion KG n'est pas filtrée par série, d'où le total "kg" ; une bascule
+        d'index concerne toutes les requêtes, d'où l'époque "index".
+        Lié à Neo4j : valeurs partagées (None si la lecture échoue — ne pas mettre en cache).
+        """
+        if self.driver is not None:
+            try:
+                with self.driver.session(database=self.db) as s:
+                    rows = s.run(self._READ_Q, scopes=self._token_scopes(series)).data()
+            except Exception as e:
+                print(f"Générations : lecture partagée en échec ({e})")
+                return None
+            return self._shared(rows, series)
+        return self._local(series)
+
+    async def atoken(self, series: str | None = None) -> Tuple[int, int, int] | None:
+        """Version asynchrone de :meth:`token` (driver asynchrone lié, sinon le driver synchrone)."""
+        if self.async_driver is None:
+            return self.token(series)
+        try:
+            rows = await run_read(self.async_driver, self.db, self._READ_Q, scopes=self._token_scopes(series))
+        except Exception as e:
+            print(f"Générations : lecture partagée en échec ({e})")
+            return None
+        return self._shared(rows, series)
+
+    @staticmethod
+    def _token_scopes(series: str | None) -> List[str]:
+        return ["chunks" if series is None else f"chunks:{series}", "kg", "index"]
+
+    def _shared(self, rows: List[Dict], series: str | None) -> Tuple[int, int, int]:
+        n = {r["scope"]: r["n"] for r in rows}
+        return tuple(n.get(scope, 0) for scope in self._token_scopes(series))
+
+    def _local(self, series: str | None) -> Tuple[int, int, int]:
+        with self._lock:
+            chunks = self._totals["chunks"] if series is None else self._series.get(("chunks", series), 0)
+            return chunks, self._totals["kg"], self._totals["index"]
+
+
+generations = GenerationCounter()
@@ -4,7 +4,7 @@ from typing import Literal
 
 @dataclass
 class EmbeddingConfig:
-    provider: Literal["openai", "gemini", "huggingface"]
+    provider: Literal["openai", "gemini", "huggingface", "hash"]
     model: str | None = None
     api_key: str | None = None
     api_base: str | None = None   # Azure
@@ -0,0 +1,408 @@
+"""Miroir en mémoire de l'index vectoriel des chunks (ANN IVF sur NumPy).
+
+Pour les corpus « chauds » et majoritairement en lecture : la recherche se fait
+dans le processus (aucun aller-retour Bolt), sur des vecteurs float32 normalisés
+(similarité cosinus = produit scalaire).
+
+- IVF : k-means grossier (``nlist`` centroïdes) + listes inversées ; une requête
+  ne parcourt que les ``nprobe`` listes les plus proches. En dessous de
+  ``nlist * 8`` vecteurs, recherche exacte (brute force).
+- Persistance : instantané ``vectors.<gen>.npy`` / ``assign.<gen>.npy`` /
+  ``centroids.<gen>.npy`` + ids et textes (``ids.<gen>.npy`` / ``texts.<gen>.npy`` : UTF-8
+  concaténé, et leurs offsets ``*_off.<gen>.npy``) + ``meta.json`` (pointeur vers la
+  génération courante) dans un dossier ; tout est rechargé en mémoire mappée au redémarrage.
+  Un instantané n'écrase jamais un fichier existant (Windows refuse de remplacer un fichier
+  mappé) : il écrit une nouvelle génération puis bascule le pointeur ; la génération
+  précédente est conservée pour les lecteurs qui ne l'ont pas encore quittée.
+- Un seul écrivain par dossier (``writer=True``, ``ANN_CFG["writer"]``) : lui seul écrit
+  instantanés et journal. Les autres workers sont lecteurs : ils rechargent l'instantané
+  publié, ou rejouent la fin du journal, au plus toutes les ``refresh_s`` secondes. Les
+  ingestions et reconstructions bleu / vert passent donc par le worker écrivain ; un
+  lecteur garde ses propres ajouts en mémoire seulement.
+- Synchronisation incrémentale : ``add`` (upsert par id) après chaque écriture de
+  ``run_from_series`` ; les vecteurs ajoutés sont rangés dans la liste de leur centroïde.
+  ``flush`` n'ajoute que ces lignes au journal ``delta.<gen>.jsonl`` (rejoué par ``load``) ;
+  l'instantané n'est réécrit que lorsque le journal dépasse ``compact_ratio`` de l'index.
+"""
+from __future__ import annotations
+import json, os, threading, time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:          # dépendance optionnelle : l'index ANN est alors indisponible
+    np = None
+
+
+class _Strings:
+    """Chaînes d'un instantané (UTF-8 concaténé + offsets, mappés en lecture) et, par-dessus,
+    les ajouts / remplacements faits en mémoire depuis."""
+
+    def __init__(self, blob=None, offsets=None):
+        self._blob = blob if blob is not None else np.zeros(0, dtype=np.uint8)
+        self._off = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._base = len(self._off) - 1
+        self._extra: List[str] = []
+        self._changed: Dict[int, str] = {}
+
+    def __len__(self) -> int:
+        return self._base + len(self._extra)
+
+    def __getitem__(self, i: int) -> str:
+        i = int(i)
+        if i >= self._base:
+            return self._extra[i - self._base]
+        if i in self._changed:
+            return self._changed[i]
+        return bytes(self._blob[self._off[i]:self._off[i + 1]]).decode("utf-8")
+
+    def __setitem__(self, i: int, value: str) -> None:
+        i = int(i)
+        if i >= self._base:
+            self._extra[i - self._base] = value
+        else:
+            self._changed[i] = value
+
+    def __iadd__(self, items: Iterable[str]) -> "_Strings":
+        self._extra += list(items)
+        return self
+
+    def __iter__(self) -> Iterator[str]:
+        return (self[i] for i in range(len(self)))
+
+    def save(self, blob_file: Path, off_file: Path) -> None:
+        parts = [t.encode("utf-8") for t in self]
+        offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in parts], dtype=np.int64)
+        for f, arr in ((blob_file, np.frombuffer(b"".join(parts), dtype=np.uint8)), (off_file, offsets)):
+            with open(f, "wb") as fh:
+                np.save(fh, arr)
+
+    @classmethod
+    def load(cls, blob_file: Path, off_file: Path) -> "_Strings":
+        return cls(np.load(blob_file, mmap_mode="r"), np.load(off_file, mmap_mode="r"))
+
+
+class IVFIndex:
+    def __init__(self, dim: int, *, nlist: int = 64, nprobe: int = 8, path: str | os.PathLike | None = None,
+                 seed: int = 0, compact_ratio: float = 0.1, compact_min: int = 1024,
+                 writer: bool = True, refresh_s: float = 5.0):
+        if np is None:
+            raise RuntimeError("numpy est requis pour l'index ANN en mémoire")
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.path = Path(path) if path else None
+        self.seed = seed
+        self.compact_ratio = compact_ratio      # journal > ratio × taille (et > compact_min) → instantané
+        self.compact_min = compact_min
+        self.writer = writer                    # seul l'écrivain persiste ; un lecteur recharge
+        self.refresh_s = refresh_s              # lecteur : intervalle minimal entre deux relectures
+        self.generation = 0                     # génération de l'instantané sur disque
+        self._logged = 0                        # lignes déjà dans le journal de cette génération
+        self._delta_pos = 0                     # lecteur : octets du journal déjà rejoués
+        self._next_check = 0.0
+        self._pending: Dict[str, None] = {}     # ids ajoutés / modifiés depuis le dernier flush
+        self.ids = _Strings()
+        self.texts = _Strings()
+        self._row: Dict[str, int] = {}
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        self._assign = np.zeros(0, dtype=np.int32)
+        self._centroids: "np.ndarray | None" = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    # ---------------------- construction ----------------------
+    @staticmethod
+    def _normalize(vecs) -> "np.ndarray":
+        vecs = np.asarray(vecs, dtype=np.float32)
+        if vecs.ndim == 1:
+            vecs = vecs[None, :]
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vecs / norms
+
+    def _kmeans(self, vecs: "np.ndarray", n_iter: int = 10) -> "np.ndarray":
+        rng = np.random.default_rng(self.seed)
+        centroids = vecs[rng.choice(len(vecs), self.nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = np.argmax(vecs @ centroids.T, axis=1)
+            for c in range(self.nlist):
+                members = vecs[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = self._normalize(centroids)
+        return centroids
+
+    def _assign_rows(self, vecs: "np.ndarray") -> "np.ndarray":
+        if self._centroids is None:
+            return np.zeros(len(vecs), dtype=np.int32)
+        return np.argmax(vecs @ self._centroids.T, axis=1).astype(np.int32)
+
+    def train(self) -> None:
+        """(Re)calcule les centroïdes sur les vecteurs courants ; brute force si trop peu de données."""
+        with self._lock:
+            vecs = np.asarray(self._vectors)
+            self._centroids = self._kmeans(vecs) if len(vecs) >= self.nlist * 8 else None
+            self._assign = self._assign_rows(vecs)
+
+    def add(self, ids: Sequence[str], vectors, texts: Sequence[str] | None = None) -> int:
+        """Upsert par id ; retourne le nombre de nouveaux vecteurs."""
+        vecs = self._normalize(vectors)
+        texts = list(texts) if texts is not None else [""] * len(ids)
+        new_ids, new_texts, new_vecs = [], [], []
+        with self._lock:
+            for cid, txt, vec in zip(ids, texts, vecs):
+                row = self._row.get(cid)
+                if row is None:
+                    new_ids.append(cid); new_texts.append(txt); new_vecs.append(vec)
+                    continue
+                if not self._vectors.flags.writeable:
+                    self._vectors = np.array(self._vectors)
+                    self._assign = np.array(self._assign)
+                self._vectors[row] = vec
+                self._assign[row] = self._assign_rows(vec[None, :])[0]
+                self.texts[row] = txt
+                self._pending[cid] = None
+            if new_ids:
+                block = np.stack(new_vecs).astype(np.float32)
+                start = len(self.ids)
+                self._vectors = np.concatenate([self._vectors, block])
+                self._assign = np.concatenate([self._assign, self._assign_rows(block)])
+                self.ids += new_ids
+                self.texts += new_texts
+                self._row.update({cid: start + i for i, cid in enumerate(new_ids)})
+                self._pending.update(dict.fromkeys(new_ids))
+        return len(new_ids)
+
+    # ---------------------- recherche ----------------------
+    def search(self, embedding: Sequence[float], k: int = 5) -> List[Dict]:
+        q = self._normalize(embedding)[0]
+        if not self.writer:
+            self._maybe_refresh()
+        with self._lock:
+            vecs, assign = self._vectors, self._assign
+            if not len(self.ids):
+                return []
+            if self._centroids is not None:
+                probe = np.argsort(-(self._centroids @ q))[:self.nprobe]
+                rows = np.nonzero(np.isin(assign, probe))[0]
+            else:
+                rows = np.arange(len(self.ids))
+            if not len(rows):
+                return []
+            scores = np.asarray(vecs[rows]) @ q
+            top = np.argsort(-scores)[:k] if len(rows) <= k else np.argpartition(-scores, k)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [{"id": self.ids[rows[i]], "score": float(scores[i]), "text": self.texts[rows[i]]} for i in top]
+
+    # ---------------------- persistance ----------------------
+    @staticmethod
+    def _file(d: Path, name: str, gen: int) -> Path:
+        return d / (f"{name}.{gen}.npy" if gen else f"{name}.npy")     # gen 0 : ancien format
+
+    @staticmethod
+    def _generation_of(f: Path) -> int:
+        parts = f.name.split(".")
+        return int(parts[1]) if len(parts) == 3 and parts[1].isdigit() else 0
+
+    @staticmethod
+    def _disk_generation(d: Path) -> int:
+        meta = d / "meta.json"
+        return json.loads(meta.read_text(encoding="utf-8")).get("generation", 0) if meta.exists() else 0
+
+    def _dir(self, path) -> Path:
+        d = Path(path) if path else self.path
+        if d is None:
+            raise ValueError("Aucun dossier de persistance pour l'index ANN")
+        d.mkdir(parents=True, exist_ok=True)
+        return d
+
+    def save(self, path: str | os.PathLike | None = None) -> Path:
+        """Écrit un instantané dans une nouvelle génération de fichiers puis bascule
+        ``meta.json`` (remplacement atomique) ; seules la génération courante et la
+        précédente (encore mappée par les lecteurs pas encore rechargés) sont gardées."""
+        if not self.writer:
+            raise RuntimeError("Index ANN en lecture seule : seul le worker écrivain (ANN_WRITER) persiste")
+        d = self._dir(path)
+        with self._lock:
+            # génération suivante de ce dossier (un autre index, ex. reconstruit, a pu y écrire)
+            previous = self._disk_generation(d)
+            gen = max(self.generation, previous) + 1
+            arrays = {"vectors": np.asarray(self._vectors), "assign": np.asarray(self._assign)}
+            if self._centroids is not None:
+                arrays["centroids"] = self._centroids
+            for name, arr in arrays.items():
+                with open(self._file(d, name, gen), "wb") as f:
+                    np.save(f, arr)
+            self.ids.save(self._file(d, "ids", gen), self._file(d, "ids_off", gen))
+            self.texts.save(self._file(d, "texts", gen), self._file(d, "texts_off", gen))
+            meta = {"dim": self.dim, "nlist": self.nlist, "nprobe": self.nprobe, "generation": gen,
+                    "centroids": self._centroids is not None, "count": len(self.ids)}
+            (d / "meta.json.tmp").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+            os.replace(d / "meta.json.tmp", d / "meta.json")
+            # l'instantané courant est remappé : l'ancien mmap est libéré avant la suppression
+            self._map(d, gen)
+            self.generation, self._logged, self._pending = gen, 0, {}
+            self.path = d
+            self._cleanup(d, keep={gen, previous})
+        return d
+
+    def _map(self, d: Path, gen: int) -> None:
+        """Vecteurs, affectations, ids et textes de la génération *gen* en mémoire mappée."""
+        # copy-on-write : les upserts modifient la mémoire, jamais le fichier
+        self._vectors = np.load(self._file(d, "vectors", gen), mmap_mode="c")
+        self._assign = np.load(self._file(d, "assign", gen), mmap_mode="c")
+        self.ids = _Strings.load(self._file(d, "ids", gen), self._file(d, "ids_off", gen))
+        self.texts = _Strings.load(self._file(d, "texts", gen), self._file(d, "texts_off", gen))
+
+    def _cleanup(self, d: Path, keep: set) -> None:
+        """Supprime les fichiers des générations hors de *keep* (un fichier encore mappé
+        ailleurs sous Windows est laissé : retenté au prochain instantané)."""
+        for f in [*d.glob("*.npy"), *d.glob("delta.*.jsonl"), *d.glob("*.tmp")]:
+            if f.suffix == ".tmp" or self._generation_of(f) not in keep:
+                try:
+                    f.unlink()
+                except OSError:
+                    pass
+
+    def flush(self, path: str | os.PathLike | None = None) -> Path:
+        """Persiste les lignes ajoutées / modifiées depuis le dernier flush : ajout au journal
+        de la génération courante, ou nouvel instantané si le journal devient trop long.
+        Sans effet sur un lecteur (ses ajouts restent en mémoire)."""
+        if not self.writer:
+            return Path(path) if path else self.path
+        d = self._dir(path)
+        with self._lock:
+            if not self.generation or d != self.path:
+                return self.save(d)
+            if not self._pending:
+                return d
+            if self._logged + len(self._pending) > max(self.compact_min, self.compact_ratio * len(self.ids)):
+                return self.save(d)
+            with open(d / f"delta.{self.generation}.jsonl", "a", encoding="utf-8") as f:
+                for cid in self._pending:
+                    row = self._row[cid]
+                    f.write(json.dumps({"id": cid, "text": self.texts[row],
+                                        "vec": np.asarray(self._vectors[row]).tolist()}, ensure_ascii=False) + "\n")
+            self._logged += len(self._pending)
+            self._pending = {}
+        return d
+
+    def _replay(self, d: Path) -> int:
+        """Rejoue les lignes complètes du journal écrites depuis la dernière lecture."""
+        delta = d / f"delta.{self.generation}.jsonl"
+        if not self.generation or not delta.exists():
+            return 0
+        with open(delta, "rb") as f:
+            f.seek(self._delta_pos)
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1]              # ligne en cours d'écriture : plus tard
+        lines = [json.loads(l) for l in data.decode("utf-8").splitlines() if l.strip()]
+        if lines:
+            self.add([l["id"] for l in lines], [l["vec"] for l in lines], [l["text"] for l in lines])
+            for l in lines:
+                self._pending.pop(l["id"], None)
+        self._delta_pos += len(data)
+        self._logged += len(lines)
+        return len(lines)
+
+    def refresh(self) -> bool:
+        """Lecteur : recharge l'instantané si l'écrivain en a publié un nouveau, sinon rejoue
+        la fin du journal. Retourne True si l'index a changé."""
+        d = self.path
+        if d is None or not (d / "meta.json").exists():
+            return False
+        with self._lock:
+            if self._disk_generation(d) > self.generation:
+                fresh = self.load(d, nprobe=self.nprobe, writer=self.writer, refresh_s=self.refresh_s)
+                lock, self.__dict__ = self._lock, dict(fresh.__dict__)
+                self._lock = lock
+                return True
+            return self._replay(d) > 0
+
+    def _maybe_refresh(self) -> None:
+        if self.path is None or time.monotonic() < self._next_check:
+            return
+        self._next_check = time.monotonic() + self.refresh_s
+        try:
+            self.refresh()
+        except (OSError, ValueError) as e:         # instantané en cours de bascule : prochain appel
+            print(f"Index ANN : rechargement en échec ({e})")
+
+    @classmethod
+    def load(cls, path: str | os.PathLike, *, nprobe: int | None = None, writer: bool = True,
+             refresh_s: float = 5.0) -> "IVFIndex":
+        d = Path(path)
+        meta = json.loads((d / "meta.json").read_text(encoding="utf-8"))
+        gen = meta.get("generation", 0)
+        idx = cls(meta["dim"], nlist=meta["nlist"], nprobe=nprobe or meta["nprobe"], path=d,
+                  writer=writer, refresh_s=refresh_s)
+        if "ids" in meta:                                  # ancien format : ids / textes dans meta.json
+            idx._vectors = np.load(cls._file(d, "vectors", gen), mmap_mode="c")
+            idx._assign = np.load(cls._file(d, "assign", gen), mmap_mode="c")
+            idx.ids += meta["ids"]
+            idx.texts += meta["texts"]
+        else:
+            idx._map(d, gen)
+        if meta.get("centroids", gen == 0) and cls._file(d, "centroids", gen).exists():
+            idx._centroids = np.load(cls._file(d, "centroids", gen))
+        idx._row = {cid: i for i, cid in enumerate(idx.ids)}
+        idx.generation = gen
+        idx._replay(d)
+        idx._next_check = time.monotonic() + refresh_s
+        return idx
+
+    @classmethod
+    def build_from_neo4j(cls, store, *, nlist: int = 64, nprobe: int = 8, path=None,
+                         page_size: int = 5000, writer: bool = True, refresh_s: float = 5.0) -> "IVFIndex":
+        """Charge tous les chunks (id, texte, vecteur) par pages ordonnées sur l'id (index unique)."""
+        prop = store.active()["embed_prop"]
+        q = (f"MATCH (c:{store.node_label}) WHERE c.id > $after AND c.`{prop}` IS NOT NULL "
+             f"RETURN c.id AS id, c.`{store.text_prop}` AS text, c.`{prop}` AS vec "
+             f"ORDER BY c.id LIMIT $n")
+        idx, after = None, ""
+        with store.driver.session(database=store.db) as s:
+            while True:
+                rows = s.run(q, after=after, n=page_size).data()
+                if not rows:
+                    break
+                if idx is None:
+                    idx = cls(len(rows[0]["vec"]), nlist=nlist, nprobe=nprobe, path=path,
+                              writer=writer, refresh_s=refresh_s)
+                idx.add([r["id"] for r in rows], [r["vec"] for r in rows], [r["text"] or "" for r in rows])
+                after = rows[-1]["id"]
+        if idx is None:
+            raise RuntimeError("Aucun chunk vectorisé dans Neo4j : index ANN vide")
+        idx.train()
+        return idx
+
+
+# ---------------------- instance partagée ----------------------
+_ann_index: IVFIndex | None = None
+
+
+def get_ann_index() -> IVFIndex | None:
+    """Index ANN actif (None si désactivé ou pas encore chargé)."""
+    return _ann_index
+
+
+def set_ann_index(index: IVFIndex | None) -> None:
+    global _ann_index
+    _ann_index = index
+
+
+def load_or_build(store, cfg: Dict) -> IVFIndex:
+    """Démarrage : recharge le dossier persistant s'il existe, sinon reconstruit depuis Neo4j
+    (instantané écrit par l'écrivain seulement ; un lecteur le rechargera une fois publié)."""
+    path = Path(cfg["path"])
+    if (path / "meta.json").exists():
+        return IVFIndex.load(path, nprobe=cfg["nprobe"], writer=cfg["writer"], refresh_s=cfg["refresh_s"])
+    idx = IVFIndex.build_from_neo4j(store, nlist=cfg["nlist"], nprobe=cfg["nprobe"], path=path,
+                                    writer=cfg["writer"], refresh_s=cfg["refresh_s"])
+    if idx.writer:
+        idx.save()
+    return idx
@@ -0,0 +1,106 @@
+"""Écriture des nœuds Chunk par lots : transactions gérées, retry, sessions parallèles.
+
+Chaque lot est un ``UNWIND $rows`` exécuté dans une transaction d'écriture gérée
+(``session.execute_write``) : le driver rejoue déjà les erreurs transitoires pendant
+``max_transaction_retry_time`` ; on ajoute un retry au niveau du lot (backoff
+exponentiel) pour les erreurs encore « retryables » après ce délai.
+Les liens NEXT_CHUNK sont créés dans la même passe (chaque ligne porte l'id du
+chunk précédent) : plus de second UNWIND avec deux MATCH par ligne.
+"""
+from __future__ import annotations
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from settings import INGEST_CFG
+from .vector_storage import check_mode, hash_prop, set_vector_clause
+
+
+def is_retryable(exc: Exception) -> bool:
+    """True pour les erreurs que le driver Neo4j considère comme transitoires
+    (TransientError, ServiceUnavailable, SessionExpired…)."""
+    check = getattr(exc, "is_retryable", None)
+    return bool(check()) if callable(check) else False
+
+
+class ChunkBatchWriter:
+    def __init__(self, driver, database: str | None = None, *, node_label: str = "Chunk",
+                 embed_prop: str = "embedding", batch_size: int | None = None,
+                 parallel: int | None = None, max_retries: int | None = None, backoff: float = 0.5,
+                 vector_storage: str = "list"):
+        self.driver = driver
+        self.db = database
+        self.node_label = node_label
+        self.embed_prop = embed_prop
+        self.batch_size = max(1, batch_size or INGEST_CFG["write_batch_size"])
+        self.parallel = max(1, parallel or INGEST_CFG["write_parallelism"])
+        self.max_retries = INGEST_CFG["write_max_retries"] if max_retries is None else max_retries
+        self.backoff = backoff
+        self.vector_storage = check_mode(vector_storage)
+
+    # ------------------------------------------------------------------
+    @property
+    def cypher(self) -> str:
+        return f"""
+        UNWIND $rows AS row
+        MERGE (c:{self.node_label} {{id: row.cid}})
+        SET c.ingest_ts = coalesce(c.ingest_ts, row.ingest_ts),
+            c.text = row.text,
+            c.series = row.series,
+            c.content_hash = row.hash,
+            c.`{hash_prop(self.embed_prop)}` = row.hash,
+            c.embed_model = row.model
+        {set_vector_clause(self.vector_storage, "c", self.embed_prop, "row.vec")}
+        WITH c, row WHERE row.prev IS NOT NULL
+        MERGE (p:{self.node_label} {{id: row.prev}})
+        MERGE (p)-[:NEXT_CHUNK]->(c)
+        """
+
+    def _write_tx(self, tx, rows: List[Dict[str, Any]]) -> None:
+        tx.run(self.cypher, rows=rows).consume()
+
+    def _write_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """Écrit un lot ; retourne le nombre de tentatives supplémentaires effectuées."""
+        attempt = 0
+        while True:
+            try:
+                with self.driver.session(database=self.db) as s:
+                    s.execute_write(self._write_tx, rows)
+                return attempt
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                print(f"Lot de {len(rows)} chunks : erreur transitoire ({e}), tentative {attempt}/{self.max_retries}")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+    # ------------------------------------------------------------------
+    def batches(self, rows: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        return [rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size)]
+
+    def write(self, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Écrit toutes les lignes ; retourne les statistiques (lots, retries, lignes/s).
+
+        Lignes attendues : {"cid", "text", "vec", "series", "ingest_ts", "hash", "model", "prev"}.
+        En mode parallèle, deux lots peuvent MERGE le même id : la contrainte
+        d'unicité sur Chunk.id garantit qu'aucun doublon n'est créé. Un lot peut aussi
+        créer en premier le chunk frontière (stub via ``row.prev``) : ``ingest_ts`` est
+        donc posé par ``coalesce`` et non par ``ON CREATE``.
+        """
+        batches = self.batches(rows)
+        t0 = time.perf_counter()
+        if self.parallel > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.parallel) as pool:
+                retries = sum(pool.map(self._write_batch, batches))
+        else:
+            retries = sum(self._write_batch(b) for b in batches)
+        elapsed = time.perf_counter() - t0
+        return {
+            "rows": len(rows),
+            "batches": len(batches),
+            "batch_size": self.batch_size,
+            "parallel": self.parallel,
+            "retries": retries,
+            "seconds": round(elapsed, 3),
+            "rows_per_sec": round(len(rows) / elapsed, 1) if elapsed else None,
+        }
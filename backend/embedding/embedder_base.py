@@ -118,4 +118,54 @@ class GeminiEmbedder(EmbedderInterface):
 
     def batch_embed(self, texts: List[str]) -> List[List[float]]:
         resp = self.client.embeddings.generate(model=self.model, texts=texts)
-        return [e.values for e in resp.embeddings]
\ No newline at end of file
+        return [e.values for e in resp.embeddings]
+
+# --------------------------- Hash (local) ---------------------------
+class HashEmbedder(EmbedderInterface):
+    """Embedder local et déterministe (hashing trick sur mots + n-grammes de caractères).
+
+    Aucun modèle à télécharger, aucun appel réseau : le même texte donne toujours
+    le même vecteur, d'un processus à l'autre. Sert aux benchmarks et aux tests des
+    chemins d'écriture / recherche Neo4j ; la qualité sémantique reste rudimentaire.
+    """
+    def __init__(self, *, dim: int = 384, ngram: int = 3, normalize_embeddings: bool = True, **_):
+        if dim <= 0:
+            raise ValueError("dim doit être > 0")
+        self.dim = dim
+        self.ngram = ngram
+        self.normalize = normalize_embeddings
+
+    @property
+    def dimension(self) -> int:
+        return self.dim
+
+    # ------------------------------------------------------------------
+    def _features(self, text: str) -> List[str]:
+        import re
+        words = re.findall(r"\w+", text.lower())
+        feats = [f"w:{w}" for w in words]
+        for w in words:
+            padded = f"<{w}>"
+            feats += [f"c:{padded[i:i + self.ngram]}" for i in range(max(1, len(padded) - self.ngram + 1))]
+        return feats
+
+    def embed(self, text: str) -> List[float]:
+        import hashlib, math
+        vec = [0.0] * self.dim
+        for feat in self._features(text):
+            h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        if self.normalize:
+            norm = math.sqrt(sum(x * x for x in vec))
+            if norm:
+                vec = [x / norm for x in vec]
+        return vec
+
+    def batch_embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed(t) for t in texts]
+
+    def dummy_vector(self) -> List[float]:
+        return [0.0] * self.dim
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(dim={self.dim})"
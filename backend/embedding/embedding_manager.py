@@ -1,11 +1,15 @@
 """Factory + validation des embedders."""
-from .embedder_base import HuggingFaceEmbedder, OpenAIEmbedder, GeminiEmbedder
+import json
+from typing import Dict
+
+from .embedder_base import HuggingFaceEmbedder, OpenAIEmbedder, GeminiEmbedder, HashEmbedder
 
 class EmbeddingManager:
     _registry = {
         "huggingface": HuggingFaceEmbedder,
         "openai": OpenAIEmbedder,
         "gemini": GeminiEmbedder,
+        "hash": HashEmbedder,         # local, déterministe (benchmarks / tests hors-ligne)
     }
 
     def __init__(self, provider: str, **kwargs):
@@ -16,6 +20,16 @@ class EmbeddingManager:
         self.kwargs = kwargs
         self._embedder = None
 
+    @classmethod
+    def from_cfg(cls, cfg: Dict) -> "EmbeddingManager":
+        """{"provider", "params": {...}} (``.embedder_cfg.json``, EMBED_CFG) ou {"provider", **kwargs}."""
+        params = cfg["params"] if "params" in cfg else {k: v for k, v in cfg.items() if k != "provider"}
+        return cls(cfg["provider"], **(params or {}))
+
+    def to_cfg(self) -> Dict:
+        """Configuration sérialisable (écrite sur l'alias vectoriel par le reindexer)."""
+        return {"provider": self.provider, "params": dict(self.kwargs)}
+
     # ------------------------------------------------------------------
     def get_embedder(self):
         if self._embedder is None:
@@ -48,6 +62,49 @@ class EmbeddingManager:
     def embed_texts(self, texts):
         return self.get_embedder().batch_embed(texts)
 
+    @property
+    def model_id(self) -> str:
+        """Identifiant stable du modèle (stocké sur les chunks : un changement de modèle force le ré-embedding)."""
+        name = self.kwargs.get("model_name") or self.kwargs.get("model") or self.kwargs.get("dim") or "default"
+        return f"{self.provider}:{name}"
+
     # ------------------------------------------------------------------
     def __str__(self):
-        return f"EmbeddingManager(provider={self.provider})"
\ No newline at end of file
+        return f"EmbeddingManager(provider={self.provider})"
+
+
+class IndexEmbeddingManager:
+    """Embedder de la génération servie par l'alias vectoriel de *store*.
+
+    Après une reconstruction bleu / vert, l'alias porte la configuration du nouvel
+    embedder (``embed_cfg``) : questions et ingestions l'utilisent dès la bascule
+    (relecture toutes les ``alias_ttl`` secondes). Sans ``embed_cfg`` : *default_cfg*,
+    refusé s'il ne produit pas le modèle déclaré par l'alias (``model``).
+    """
+
+    def __init__(self, store, default_cfg: Dict):
+        self.store = store
+        self.default_cfg = default_cfg
+        self._managers: Dict[str, EmbeddingManager] = {}   # un modèle chargé une seule fois
+
+    def resolve(self) -> EmbeddingManager:
+        target = self.store.active()
+        cfg = json.loads(target["embed_cfg"]) if target.get("embed_cfg") else self.default_cfg
+        key = json.dumps(cfg, sort_keys=True, default=str)
+        mgr = self._managers.get(key)
+        if mgr is None:
+            mgr = self._managers[key] = EmbeddingManager.from_cfg(cfg)
+        if target.get("model") and mgr.model_id != target["model"]:
+            raise ValueError(f"L'index {target['index']} attend l'embedder {target['model']} "
+                             f"(configuré : {mgr.model_id})")
+        return mgr
+
+    def embed_texts(self, texts):
+        return self.resolve().embed_texts(texts)
+
+    @property
+    def model_id(self) -> str:
+        return self.resolve().model_id
+
+    def __str__(self):
+        return f"IndexEmbeddingManager(index={self.store.index_name})"
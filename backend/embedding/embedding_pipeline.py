@@ -7,13 +7,20 @@ from datetime import datetime
 
 from .embedding_manager import EmbeddingManager
 from .vector_store import Neo4jVectorManager
+from .batch_writer import ChunkBatchWriter
+from .ann_index import get_ann_index
+from knowledge.schema_manager import SchemaBootstrap
+from db.generations import generations
 
 class EmbeddingPipeline:
     def __init__(self, *, embedder: EmbeddingManager, vector_store: Neo4jVectorManager,
-                 data_root: Path = Path("data/chunks")):
+                 data_root: Path = Path("data/chunks"), batch_size: int | None = None,
+                 parallel: int | None = None):
         self.embedder = embedder
         self.vector_store = vector_store
         self.data_root = data_root
+        self.batch_size = batch_size      # None → INGEST_CFG
+        self.parallel = parallel
 
     # ------------------------------------------------------------------
     def _load_series_texts(self, series_version: str) -> List[str]:
@@ -27,15 +34,46 @@ class EmbeddingPipeline:
         return [p.read_text(encoding="utf-8") for p in files]
 
     # ------------------------------------------------------------------
-    def run(self, chunks: List[Dict], *, version: str | None = None):
-        """Ingère une liste de dictionnaires : {"text": …}."""
-        texts = [c["text"] for c in chunks]
+    def _ensure_schema(self) -> None:
+        """Contraintes / index des clés de MERGE (no-op après le premier appel)."""
+        SchemaBootstrap.for_store(self.vector_store).ensure()
+
+    def _check_model(self, model: str) -> None:
+        """Refuse d'écrire des vecteurs d'un autre modèle que celui de la génération servie :
+        sinon chaque chunk paraît « modifié » et tout le corpus est ré-embeddé dans le
+        mauvais espace (voir IndexEmbeddingManager)."""
+        expected = self.vector_store.active().get("model")
+        if expected and expected != model:
+            raise ValueError(f"L'index servi attend l'embedder {expected}, pas {model}")
+
+    # ------------------------------------------------------------------
+    def run(self, chunks: List[Dict], *, version: str | None = None, mode: str = "upsert") -> Dict[str, int]:
+        """Ingère une liste de dictionnaires : {"text": …}.
+
+        En mode "upsert", seuls les textes nouveaux (ou embeddés par un autre modèle)
+        passent par l'embedder ; une ré-ingestion identique n'écrit rien.
+        """
+        store, model = self.vector_store, self.embedder.model_id
+        self._check_model(model)
+        texts, duplicates = [c["text"] for c in chunks], 0
+        if mode == "upsert":
+            by_hash = {store.content_hash(t): t for t in texts}     # doublons du lot : le dernier gagne
+            duplicates = len(texts) - len(by_hash)
+            known = store.existing_hashes(list(by_hash), version)
+            texts = [t for h, t in by_hash.items() if known.get(h, "") != model]
+        skipped = len(chunks) - duplicates - len(texts)
+        if not texts:
+            return {"inserted": 0, "updated": 0, "unchanged": skipped, "duplicates": duplicates}
         embeddings = self.embedder.embed_texts(texts)
-        if not self.vector_store.check_index_exists():
+        self._ensure_schema()
+        if not store.check_index_exists():
             dim = len(embeddings[0])
-            self.vector_store.create_index(dim=dim)
-        self.vector_store.save(texts=texts, embeddings=embeddings, version=version)
-        return len(chunks)
+            store.create_index(dim=dim)
+        counts = store.save(texts=texts, embeddings=embeddings, version=version, mode=mode, model=model)
+        counts["unchanged"] += skipped
+        counts["duplicates"] += duplicates
+        generations.bump()                  # chunks sans série : seules les requêtes non filtrées
+        return counts
 
     def get_chunks_text(self, series_version: str) -> List[str]:
         """Retourne les textes des chunks d’une série."""
@@ -51,7 +89,7 @@ class EmbeddingPipeline:
     #     return self.run(dicts, version=version or series_version)
     # ------------------------------------------------------------------
 
-    def run_from_series(self, texts: List[str], series_version: str, *, similarity: str = "cosine") -> int:
+    def run_from_series(self, texts: List[str], series_version: str, *, similarity: str = "cosine") -> Dict[str, Any]:
         """
         Ingeste une série (texte → chunks → embeddings → Neo4j).
 
@@ -59,68 +97,66 @@ class EmbeddingPipeline:
         ----------
         series_version : str
             Identifiant de la série (ex. "110625-022017").
-        version : str, optional
-            Tag stocké dans le nœud ; défaut = series_version.
         similarity : str, optional
             Fonction de similarité de l’index vectoriel
             ("cosine", "euclidean", "dotproduct").
         Returns
         -------
-        int
-            Nombre de chunks réellement indexés.
+        dict
+            Nombre de chunks indexés + statistiques d'écriture (lots, retries, lignes/s).
         """
 
-        # 1. Préparer les données ------------------------------------------------
-        embeddings: List[List[float]] = self.embedder.embed_texts(texts)
-        dim: int = len(embeddings[0])
-        
-        # 2. Créer l’index vectoriel (une seule fois) ----------------------------
-        if not self.vector_store.check_index_exists():
-            self.vector_store.create_index(dim=dim, similarity=similarity)
-        
-        # 3. Transformer en lignes batch ----------------------------------------
+        # 1. Ne ré-embedder que les chunks nouveaux ou modifiés -------------------
+        store, model = self.vector_store, self.embedder.model_id
+        self._check_model(model)
+        ids = [f"{series_version}-{i:06d}" for i in range(1, len(texts) + 1)]
+        hashes = [store.content_hash(t) for t in texts]
+        states = store.chunk_states(ids)
+        todo = [i for i, (cid, h) in enumerate(zip(ids, hashes)) if states.get(cid) != (h, model)]
+        embeddings: List[List[float]] = self.embedder.embed_texts([texts[i] for i in todo]) if todo else []
+
+        # 2. Contraintes + index vectoriel (une seule fois) ----------------------
+        self._ensure_schema()
+        if embeddings and not store.check_index_exists():
+            store.create_index(dim=len(embeddings[0]), similarity=similarity)
+
+        # 3. Transformer en lignes batch (chaque ligne connaît son prédécesseur) --
         stamp = datetime.now().isoformat(timespec="seconds")
         rows: List[Dict[str, Any]] = [
             {
-                "cid": f"{series_version}-{i:06d}",
-                "text": txt,
+                "cid": ids[i],
+                "text": texts[i],
                 "vec":  vec,
                 "series": series_version,
                 "ingest_ts": stamp,
+                "hash": hashes[i],
+                "model": model,
+                "prev": ids[i - 1] if i > 0 else None,
             }
-            for i, (txt, vec) in enumerate(zip(texts, embeddings), 1)
+            for i, vec in zip(todo, embeddings)
         ]
 
-        # 4. Insérer / mettre à jour les nœuds Chunk + vecteur -------------------
-        cypher_chunks = """
-            UNWIND $rows AS row
-            MERGE (c:Chunk {id: row.cid})
-            ON CREATE SET
-                    c.text        = row.text,   
-                    c.embedding   = row.vec,
-                    c.series      = row.series,
-                    c.ingest_ts   = row.ingest_ts
-            ON MATCH SET
-                    c.text        = row.text,
-                    c.embedding   = row.vec,
-                    c.series      = row.series
-            """
-        
-        with self.vector_store.driver.session(database=self.vector_store.db) as s:
-            s.run(cypher_chunks, rows=rows)
-            
-            # 5. Relations NEXT_CHUNK (séquencement) ---------------------------
-            rels = [
-                {"from": rows[i]["cid"], "to": rows[i + 1]["cid"]}
-                for i in range(len(rows) - 1)
-            ]
-            if rels:
-                cypher_rels = """
-                UNWIND $rels AS rel
-                MATCH (c1:Chunk {id: rel.from})
-                MATCH (c2:Chunk {id: rel.to})
-                MERGE (c1)-[:NEXT_CHUNK]->(c2)
-                """
-                s.run(cypher_rels, rels=rels)
-
-        return len(rows)
\ No newline at end of file
+        # 4. Nœuds Chunk + vecteur + NEXT_CHUNK, par lots transactionnels --------
+        writer = ChunkBatchWriter(
+            self.vector_store.driver, self.vector_store.db,
+            node_label=self.vector_store.node_label, embed_prop=self.vector_store.active()["embed_prop"],
+            batch_size=self.batch_size, parallel=self.parallel,
+            vector_storage=self.vector_store.vector_storage,
+        )
+        stats = writer.write(rows)
+
+        if rows:
+            generations.bump(series_version)   # invalide les résultats de retrieval en cache
+
+        # 5. Miroir ANN en mémoire (si activé) : upsert des lignes écrites --------
+        ann = get_ann_index()
+        if ann is not None:
+            ann.add([r["cid"] for r in rows], [r["vec"] for r in rows], [r["text"] for r in rows])
+            if ann.path is not None:
+                try:
+                    ann.flush()               # journal des lignes écrites, pas la matrice entière
+                except OSError as e:          # le miroir se reconstruit depuis Neo4j : l'ingestion reste valide
+                    print(f"Index ANN : persistance en échec ({e})")
+        print(f"Série {series_version} : {stats['rows']} chunks en {stats['batches']} lots "
+              f"({stats['rows_per_sec']} lignes/s)")
+        return {"chunks_indexed": len(rows), "unchanged": len(texts) - len(rows), **stats}
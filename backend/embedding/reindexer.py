@@ -0,0 +1,206 @@
+"""Reconstruction bleu / vert de l'index vectoriel des chunks.
+
+Chaque génération possède sa propriété (``embedding_g<N>``) et son index physique
+(``<index>_g<N>``) ; le nœud ``(:VectorIndexAlias {name: <index logique>})`` désigne la
+génération servie. Pendant le ré-embedding, l'ancienne génération continue de
+répondre ; la bascule est une seule écriture de l'alias (atomique), puis l'ancienne
+génération est nettoyée par lots.
+
+Étapes de :meth:`BlueGreenReindexer.run` :
+    1. index vectoriel de la nouvelle génération (dimension / similarité du nouvel embedder) ;
+    2. remplissage par lots des chunks sans vecteur de la nouvelle génération, ou dont le
+       vecteur a été calculé sur un texte modifié depuis (``<prop>_hash`` ≠ ``content_hash`` :
+       chunk réingéré pendant le remplissage) — un seul parcours du label, puis lots lus
+       par elementId ;
+    3. attente de l'état ONLINE, puis rattrapage des chunks ingérés entre-temps ;
+    4. bascule de l'alias — qui enregistre aussi la configuration du nouvel embedder
+       (``embed_cfg``) : questions et ingestions l'utilisent ensuite
+       (``IndexEmbeddingManager``) ;
+    5. second rattrapage (chunks écrits sur l'ancienne propriété juste avant la bascule) ;
+    6. après un délai de grâce (TTL du cache d'alias des autres processus) : suppression
+       de l'ancien index puis de l'ancienne propriété par lots.
+"""
+from __future__ import annotations
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List
+
+from db.generations import generations
+from .ann_index import IVFIndex, get_ann_index, set_ann_index
+from .vector_storage import hash_prop, set_vector_clause, storage_prop
+
+
+class BlueGreenReindexer:
+    def __init__(self, store, embedder, *, similarity: str = "cosine", batch_size: int = 256,
+                 cleanup_batch: int = 5000, online_timeout: float = 3600, grace: float | None = None):
+        self.store = store                # Neo4jVectorManager (alias activé)
+        self.embedder = embedder          # EmbeddingManager de la nouvelle génération (to_cfg → alias)
+        self.similarity = similarity
+        self.batch_size = max(1, batch_size)
+        self.cleanup_batch = max(1, cleanup_batch)
+        self.online_timeout = online_timeout
+        self.grace = store.alias_ttl if grace is None else grace
+        self.job_id = uuid.uuid4().hex[:12]
+        self.state: Dict[str, Any] = {"job_id": self.job_id, "status": "pending", "phase": None,
+                                      "embedded": 0, "cleaned": 0, "error": None}
+
+    # ------------------------------------------------------------------
+    def _set(self, **kw) -> None:
+        self.state.update(kw)
+
+    def _session(self):
+        return self.store.driver.session(database=self.store.db)
+
+    def next_target(self, current: Dict) -> Dict:
+        gen = int(current.get("generation") or 0) + 1
+        base_index = self.store._sanitize(self.store.index_name)
+        base_prop = self.store._sanitize(self.store.embed_prop)
+        return {"index": f"{base_index}_g{gen}", "embed_prop": f"{base_prop}_g{gen}",
+                "generation": gen, "model": self.embedder.model_id}
+
+    # ------------------------------------------------------------------
+    def _fill(self, prop: str) -> int:
+        """Embeddings de la nouvelle génération pour tous les chunks qui n'en ont pas encore,
+        ou dont le texte a changé depuis (empreinte gardée avec le vecteur, ``hash_prop``).
+
+        Un seul parcours du label relève les elementId à traiter (pas de ``LIMIT`` rejoué
+        à chaque lot, qui reparcourrait le label : O(N²/lot)) ; chaque lot relit ensuite
+        ses textes par elementId."""
+        label, text, h = self.store.node_label, self.store.text_prop, hash_prop(prop)
+        todo = f"(c.`{prop}` IS NULL OR c.`{h}` <> c.content_hash)"
+        scan = (f"MATCH (c:{label}) WHERE c.`{text}` IS NOT NULL AND {todo} "
+                f"RETURN elementId(c) AS eid")
+        pick = (f"UNWIND $eids AS eid MATCH (c) WHERE elementId(c) = eid AND {todo} "
+                f"RETURN eid, c.`{text}` AS text, c.content_hash AS hash")
+        write = (f"UNWIND $rows AS row MATCH (c) WHERE elementId(c) = row.eid SET c.`{h}` = row.hash "
+                 + set_vector_clause(self.store.vector_storage, "c", prop, "row.vec"))
+        with self._session() as s:
+            eids = [r["eid"] for r in s.run(scan)]
+        total = 0
+        for i in range(0, len(eids), self.batch_size):
+            with self._session() as s:
+                rows = s.run(pick, eids=eids[i:i + self.batch_size]).data()
+            if not rows:
+                continue
+            vecs = self.embedder.embed_texts([r["text"] for r in rows])
+            batch = [{"eid": r["eid"], "vec": v, "hash": r["hash"]} for r, v in zip(rows, vecs)]
+            with self._session() as s:
+                s.execute_write(lambda tx: tx.run(write, rows=batch).consume())
+            total += len(batch)
+            self._set(embedded=self.state["embedded"] + len(batch))
+        return total
+
+    def _await_online(self, index: str) -> None:
+        q = "SHOW INDEXES YIELD name, state, populationPercent WHERE name = $name RETURN state, populationPercent"
+        deadline = time.monotonic() + self.online_timeout
+        while True:
+            with self._session() as s:
+                row = s.run(q, name=index).single()
+            if row is None:
+                raise RuntimeError(f"Index {index} introuvable")
+            if row["state"] == "ONLINE":
+                return
+            if row["state"] == "FAILED" or time.monotonic() > deadline:
+                raise RuntimeError(f"Index {index} : {row['state']} ({row['populationPercent']} %)")
+            self._set(population=row["populationPercent"])
+            time.sleep(2)
+
+    def _switch(self, old: Dict, new: Dict, dim: int) -> None:
+        """Une seule transaction : toutes les lectures suivantes voient la nouvelle génération."""
+        q = (f"MERGE (a:{self.store.ALIAS_LABEL} {{name: $name}}) "
+             "SET a.index = $index, a.embed_prop = $prop, a.generation = $generation, a.model = $model, "
+             "a.embed_cfg = $embed_cfg, a.dim = $dim, a.similarity = $similarity, a.previous_index = $old_index, "
+             "a.previous_prop = $old_prop, a.switched_ts = $ts")
+        with self._session() as s:
+            s.execute_write(lambda tx: tx.run(
+                q, name=self.store.index_name, index=new["index"], prop=new["embed_prop"],
+                generation=new["generation"], model=new["model"],
+                embed_cfg=json.dumps(self.embedder.to_cfg(), ensure_ascii=False, default=str), dim=dim, similarity=self.similarity,
+                old_index=old["index"], old_prop=old["embed_prop"],
+                ts=datetime.now().isoformat(timespec="seconds")).consume())
+        self.store.invalidate_alias()
+        generations.bump(kind="index")    # toutes les clés du cache de retrieval changent (séries comprises)
+
+    def _cleanup(self, old: Dict, new: Dict) -> None:
+        """Supprime l'ancien index puis l'ancienne propriété, lot par lot (transactions courtes).
+        Seuls les chunks dotés d'un vecteur à jour de la nouvelle génération sont touchés."""
+        with self._session() as s:
+            s.run(f"DROP INDEX `{old['index']}` IF EXISTS").consume()
+        h = hash_prop(new["embed_prop"])
+        q = (f"MATCH (c:{self.store.node_label}) WHERE c.`{old['embed_prop']}` IS NOT NULL "
+             f"AND c.`{new['embed_prop']}` IS NOT NULL AND coalesce(c.`{h}` = c.content_hash, true) "
+             f"WITH c LIMIT $n REMOVE c.`{old['embed_prop']}`, c.`{hash_prop(old['embed_prop'])}`, "
+             f"c.`{storage_prop(old['embed_prop'])}` "
+             f"SET c.embed_model = $model "
+             f"RETURN count(c) AS n")
+        while True:
+            with self._session() as s:
+                n = s.execute_write(lambda tx: tx.run(q, n=self.cleanup_batch, model=new["model"]).single()["n"])
+            if not n:
+                return
+            self._set(cleaned=self.state["cleaned"] + n)
+
+    def _refresh_ann(self) -> None:
+        """Le miroir ANN en mémoire contient les vecteurs de l'ancienne génération : reconstruit.
+        Sur un worker lecteur, le nouveau miroir reste en mémoire (sans dossier : il ne recharge
+        plus l'instantané de l'écrivain, qui porte encore l'ancienne génération)."""
+        ann = get_ann_index()
+        if ann is None:
+            return
+        new = IVFIndex.build_from_neo4j(self.store, nlist=ann.nlist, nprobe=ann.nprobe,
+                                        path=ann.path if ann.writer else None,
+                                        writer=ann.writer, refresh_s=ann.refresh_s)
+        if new.path is not None:
+            new.save()
+        set_ann_index(new)
+
+    # ------------------------------------------------------------------
+    def run(self) -> Dict[str, Any]:
+        if not self.store.use_alias:
+            raise ValueError("Reconstruction bleu / vert : le vector store doit résoudre l'alias (use_alias=True)")
+        self.store.invalidate_alias()
+        old = self.store.active()
+        new = self.next_target(old)
+        self._set(status="running", started=datetime.now().isoformat(timespec="seconds"),
+                  old=old, new=new)
+        try:
+            dim = len(self.embedder.embed_texts(["dimension"])[0])
+            self._set(phase="create_index")
+            self.store.create_index(dim=dim, similarity=self.similarity, name=new["index"], prop=new["embed_prop"])
+            self._set(phase="embed")
+            self._fill(new["embed_prop"])
+            self._set(phase="await_online")
+            self._await_online(new["index"])
+            self._fill(new["embed_prop"])         # rattrapage des chunks ingérés entre-temps
+            self._set(phase="switch")
+            self._switch(old, new, dim)
+            self._fill(new["embed_prop"])         # écrits sur l'ancienne propriété juste avant la bascule
+            self._refresh_ann()
+            self._set(phase="grace")
+            time.sleep(self.grace)                # les autres processus relisent l'alias
+            self._set(phase="cleanup")
+            self._cleanup(old, new)
+            self._set(status="done", phase=None, finished=datetime.now().isoformat(timespec="seconds"))
+        except Exception as e:
+            self._set(status="failed", error=str(e))
+            print(f"Reindex {self.job_id} : échec en phase {self.state['phase']} ({e})")
+        return self.state
+
+
+# ---------------------- jobs en cours (process) ----------------------
+_jobs: Dict[str, BlueGreenReindexer] = {}
+
+
+def register_job(job: BlueGreenReindexer) -> BlueGreenReindexer:
+    _jobs[job.job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> BlueGreenReindexer | None:
+    return _jobs.get(job_id)
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    return [j.state for j in _jobs.values()]
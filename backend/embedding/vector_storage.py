@@ -0,0 +1,143 @@
+"""Stockage des embeddings : liste Cypher (float64) ou propriété vectorielle native (float32).
+
+- mode "list"   : ``SET c.embedding = row.vec`` — une LIST<FLOAT> Cypher, 8 octets / dimension ;
+- mode "native" : ``CALL db.create.setNodeVectorProperty(c, 'embedding', row.vec)`` (Neo4j ≥ 5.11),
+  tableau float32 : 4 octets / dimension, format attendu par l'index vectoriel.
+
+``VectorStorageMigrator`` convertit une fois pour toutes les Chunk existants (par lots
+``CALL {…} IN TRANSACTIONS``) et produit un rapport de taille avant / après. Il travaille sur
+la propriété de la génération servie par l'alias (``store.active()["embed_prop"]``) ; le
+marqueur de mode (``storage_prop``) est propre à chaque propriété vectorielle.
+
+Usage :
+    python -m embedding.vector_storage --report
+    python -m embedding.vector_storage --migrate --store-path /var/lib/neo4j/data/databases/neo4j
+"""
+from __future__ import annotations
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict
+
+VECTOR_STORAGE_MODES = ("list", "native")
+BYTES_PER_DIM = {"list": 8, "native": 4}
+
+
+def check_mode(mode: str) -> str:
+    if mode not in VECTOR_STORAGE_MODES:
+        raise ValueError(f"vector_storage inconnu : {mode} (attendu : {', '.join(VECTOR_STORAGE_MODES)})")
+    return mode
+
+
+def hash_prop(prop: str) -> str:
+    """Propriété qui garde le ``content_hash`` du texte embeddé dans *prop* : un vecteur dont
+    l'empreinte diffère du ``content_hash`` courant a été calculé sur un ancien texte."""
+    return f"{prop}_hash"
+
+
+def storage_prop(prop: str) -> str:
+    """Marqueur du mode de stockage de *prop* (``'native'`` ; absent = liste) : une génération
+    blue-green peut être native alors que l'autre est encore en liste."""
+    return f"{prop}_storage"
+
+
+def set_vector_clause(mode: str, node: str, prop: str, expr: str) -> str:
+    """Fragment Cypher qui écrit le vecteur *expr* sur *node* selon le mode de stockage."""
+    flag = storage_prop(prop)
+    if check_mode(mode) == "native":
+        return (f"WITH * CALL db.create.setNodeVectorProperty({node}, '{prop}', {expr}) "
+                f"SET {node}.`{flag}` = 'native'")
+    return f"SET {node}.`{prop}` = {expr} REMOVE {node}.`{flag}`"
+
+
+class VectorStorageMigrator:
+    def __init__(self, driver, database: str | None = None, *, node_label: str = "Chunk",
+                 embed_prop: str = "embedding", batch_size: int = 1000):
+        self.driver = driver
+        self.db = database
+        self.node_label = node_label
+        self.embed_prop = embed_prop
+        self.batch_size = max(1, int(batch_size))
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def disk_size(store_path: str | Path) -> int:
+        """Taille sur disque (octets) d'un répertoire de base Neo4j local."""
+        return sum(p.stat().st_size for p in Path(store_path).rglob("*") if p.is_file())
+
+    def report(self, *, store_path: str | Path | None = None) -> Dict:
+        """Nombre de vecteurs par mode + taille estimée (dim × octets) ; taille disque si *store_path*."""
+        q = (f"MATCH (c:{self.node_label}) WHERE c.`{self.embed_prop}` IS NOT NULL "
+             f"RETURN coalesce(c.`{storage_prop(self.embed_prop)}`, 'list') AS mode, count(*) AS n, "
+             f"max(size(c.`{self.embed_prop}`)) AS dim")
+        with self.driver.session(database=self.db) as s:
+            rows = [dict(r) for r in s.run(q)]
+        by_mode = {m: {"vectors": 0, "dim": 0, "estimated_bytes": 0} for m in VECTOR_STORAGE_MODES}
+        for r in rows:
+            mode = r["mode"] if r["mode"] in by_mode else "list"
+            dim = int(r["dim"] or 0)
+            by_mode[mode]["vectors"] += r["n"]
+            by_mode[mode]["dim"] = max(by_mode[mode]["dim"], dim)
+            by_mode[mode]["estimated_bytes"] += r["n"] * dim * BYTES_PER_DIM[mode]
+        out = {"by_mode": by_mode,
+               "estimated_bytes": sum(m["estimated_bytes"] for m in by_mode.values())}
+        if store_path is not None:
+            out["disk_bytes"] = self.disk_size(store_path)
+        return out
+
+    # ------------------------------------------------------------------
+    def migrate(self) -> Dict:
+        """Réécrit en float32 chaque vecteur encore stocké en liste ; reprenable (marqueur ``storage_prop``)."""
+        flag = storage_prop(self.embed_prop)
+        q = (f"MATCH (c:{self.node_label}) "
+             f"WHERE c.`{self.embed_prop}` IS NOT NULL AND coalesce(c.`{flag}`, 'list') <> 'native' "
+             f"CALL {{ WITH c "
+             f"CALL db.create.setNodeVectorProperty(c, '{self.embed_prop}', c.`{self.embed_prop}`) "
+             f"SET c.`{flag}` = 'native' "
+             f"}} IN TRANSACTIONS OF {self.batch_size} ROWS")
+        t0 = time.perf_counter()
+        # CALL {…} IN TRANSACTIONS exige une transaction implicite (session.run, pas execute_write)
+        with self.driver.session(database=self.db) as s:
+            counters = s.run(q).consume().counters
+        return {"properties_set": counters.properties_set,
+                "seconds": round(time.perf_counter() - t0, 3)}
+
+    def run(self, *, store_path: str | Path | None = None) -> Dict:
+        """Rapport avant → migration → rapport après."""
+        before = self.report(store_path=store_path)
+        stats = self.migrate()
+        after = self.report(store_path=store_path)
+        print(f"Vecteurs : {before['estimated_bytes']} → {after['estimated_bytes']} octets estimés")
+        return {"before": before, "migration": stats, "after": after}
+
+
+# ----------------------------------------------------------------------
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description="Migration des embeddings Chunk vers le stockage vectoriel natif")
+    ap.add_argument("--migrate", action="store_true", help="convertir les vecteurs liste → float32")
+    ap.add_argument("--report", action="store_true", help="rapport de taille uniquement")
+    ap.add_argument("--store-path", default=None, help="répertoire local de la base (taille disque réelle)")
+    ap.add_argument("--batch-size", type=int, default=1000)
+    args = ap.parse_args(argv)
+
+    from settings import NEO4J_CFG
+    from db.driver_registry import driver_registry
+    from .vector_store import Neo4jVectorManager
+    driver = driver_registry.from_cfg(NEO4J_CFG)
+    try:
+        # propriété de la génération servie par l'alias, pas celle de la configuration
+        prop = Neo4jVectorManager(**NEO4J_CFG, driver=driver).active()["embed_prop"]
+        migrator = VectorStorageMigrator(driver, NEO4J_CFG["database"], node_label=NEO4J_CFG["node_label"],
+                                         embed_prop=prop, batch_size=args.batch_size)
+        if args.migrate:
+            out = migrator.run(store_path=args.store_path)
+        else:
+            out = migrator.report(store_path=args.store_path)
+    finally:
+        driver_registry.close_all()
+    print(json.dumps(out, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
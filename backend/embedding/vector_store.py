@@ -1,30 +1,115 @@
 """Driver Neo4j 5 – vector index (cosine)."""
 from typing import List, Dict
-from neo4j import GraphDatabase
+import hashlib
 import os
+import re
+import time
+
+from db.driver_registry import driver_registry
+from db.async_session import run_read
+from .vector_storage import check_mode, set_vector_clause, storage_prop
 
 class Neo4jVectorManager:
     def __init__(self, *, url: str, username: str, password: str, database: str | None = None,#, neo4j_cfg: dict
                  index_name: str = "chunkVector", node_label: str = "Chunk",
-                 text_prop: str = "text", embed_prop: str = "embedding", version_prop: str = "version"):
-        self.driver     = GraphDatabase.driver(url, auth=(username, password))
-        # self.driver     = GraphDatabase.driver(
-        #     neo4j_cfg["url"], auth=(neo4j_cfg["username"], neo4j_cfg["password"], neo4j_cfg["database"])
-        # )
+                 text_prop: str = "text", embed_prop: str = "embedding", version_prop: str = "version",
+                 vector_storage: str = "list", fulltext_index: str = "chunk_text_ft",
+                 use_alias: bool = False, alias_ttl: float = 30.0,
+                 driver=None, async_driver=None):
+        # Driver injecté (lifespan) ou, à défaut, driver partagé du registre : jamais un pool par instance
+        self._driver    = driver
+        self._async_driver = async_driver
+        self._url       = url
+        self._auth      = (username, password)
         self.db         =  database # or os.getenv("NEO4J_DATABASE", "neo4j") # neo4j_cfg["database"]
         self.index_name = index_name
         self.node_label = node_label
         self.text_prop  = text_prop
         self.embed_prop = embed_prop
         self.version_prop = version_prop
+        self.vector_storage = check_mode(vector_storage)
+        self.fulltext_index = fulltext_index
+        # index_name = alias logique ; l'index physique servi est lu sur (:VectorIndexAlias)
+        self.use_alias  = use_alias
+        self.alias_ttl  = alias_ttl
     
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._driver = driver_registry.get(self._url, *self._auth)
+        return self._driver
+
+    @driver.setter
+    def driver(self, value):
+        self._driver = value
+
+    @property
+    def async_driver(self):
+        if self._async_driver is None:
+            self._async_driver = driver_registry.get_async(self._url, *self._auth)
+        return self._async_driver
+
+    @async_driver.setter
+    def async_driver(self, value):
+        self._async_driver = value
+
     # ---------------------- utils ----------------------
     @staticmethod
     def _sanitize(name: str) -> str:
         """Remplace les caractères non autorisés pour un identifiant Neo4j."""
-        import re
         return re.sub(r"[^A-Za-z0-9_]", "_", name)
 
+    # ---------------------- alias (index bleu / vert) ----------------------
+    ALIAS_LABEL = "VectorIndexAlias"
+    # partagé entre instances (un store par requête FastAPI) : {(url, db, alias): (expiration, cible)}
+    _alias_cache: Dict[tuple, tuple] = {}
+    _ALIAS_Q = ("MATCH (a:VectorIndexAlias {name: $name}) "
+                "RETURN a.index AS index, a.embed_prop AS embed_prop, a.generation AS generation, a.model AS model, "
+                "a.embed_cfg AS embed_cfg")
+
+    def _default_target(self) -> Dict:
+        return {"index": self._sanitize(self.index_name), "embed_prop": self.embed_prop,
+                "generation": 0, "model": None, "embed_cfg": None}
+
+    @property
+    def _alias_key(self) -> tuple:
+        return self._url, self.db, self.index_name
+
+    def _cached_target(self) -> Dict | None:
+        item = self._alias_cache.get(self._alias_key)
+        return item[1] if item is not None and item[0] > time.monotonic() else None
+
+    def _cache_target(self, rows: List[Dict]) -> Dict:
+        target = {**self._default_target(), **rows[0]} if rows else self._default_target()
+        self._alias_cache[self._alias_key] = (time.monotonic() + self.alias_ttl, target)
+        return target
+
+    def active(self) -> Dict:
+        """Cible servie par l'alias *index_name* : {index, embed_prop, generation, model, embed_cfg}.
+
+        Sans nœud alias (ou use_alias=False) : l'index / la propriété configurés.
+        Résultat mis en cache ``alias_ttl`` secondes : une bascule est vue par tous les
+        processus au plus tard après ce délai.
+        """
+        if not self.use_alias:
+            return self._default_target()
+        if (target := self._cached_target()) is not None:
+            return target
+        with self.driver.session(database=self.db) as s:
+            rows = s.run(self._ALIAS_Q, name=self.index_name).data()
+        return self._cache_target(rows)
+
+    async def aactive(self) -> Dict:
+        """Version asynchrone de :meth:`active`."""
+        if not self.use_alias:
+            return self._default_target()
+        if (target := self._cached_target()) is not None:
+            return target
+        return self._cache_target(await run_read(self.async_driver, self.db, self._ALIAS_Q, name=self.index_name))
+
+    def invalidate_alias(self) -> None:
+        self._alias_cache.pop(self._alias_key, None)
+
     # ---------------------- meta ----------------------
     def test_connection(self) -> bool:
         with self.driver.session(database=self.db) as s:
@@ -33,46 +118,267 @@ class Neo4jVectorManager:
     def check_index_exists(self) -> bool:
         q = "SHOW INDEXES YIELD name WHERE name = $name RETURN count(*) AS c"
         with self.driver.session(database=self.db) as s:
-            return s.run(q, name=self._sanitize(self.index_name)).single()["c"] > 0
+            return s.run(q, name=self.active()["index"]).single()["c"] > 0
 
-    def create_index(self, dim: int = 768, similarity: str = "cosine"):
+    # ---------------------- meta (async) ----------------------
+    async def atest_connection(self) -> bool:
+        rows = await run_read(self.async_driver, self.db, "RETURN 1 AS ok")
+        return bool(rows and rows[0]["ok"])
+
+    async def acheck_index_exists(self) -> bool:
+        q = "SHOW INDEXES YIELD name WHERE name = $name RETURN count(*) AS c"
+        rows = await run_read(self.async_driver, self.db, q, name=(await self.aactive())["index"])
+        return rows[0]["c"] > 0
+
+    async def ashow_indexes(self, *, vector_only: bool = False) -> List[Dict]:
+        q = ("SHOW INDEXES YIELD name, type, entityType, labelsOrTypes, properties, state "
+             "RETURN name, type, entityType, labelsOrTypes, properties, state")
+        rows = await run_read(self.async_driver, self.db, q)
+        return [r for r in rows if r["type"].upper().startswith("VECTOR")] if vector_only else rows
+
+    def create_index(self, dim: int = 768, similarity: str = "cosine", *,
+                     name: str | None = None, prop: str | None = None):
         """Crée un vector index (Neo4j 5) en neutralisant les caractères invalides.
         Exemple de requête générée :
         CREATE VECTOR INDEX `index_110625_022017` IF NOT EXISTS
         FOR (c:Chunk) ON (c.embedding)
         OPTIONS { indexConfig: { `vector.dimensions`: 768, `vector.similarity_function`: 'cosine' } }
         """
-        safe_name = self._sanitize(self.index_name)
+        # name / prop : par défaut la cible active de l'alias (sinon une nouvelle génération)
+        target = self.active()
+        safe_name = self._sanitize(name or target["index"])
+        prop = self._sanitize(prop or target["embed_prop"])
         q = (
             f"CREATE VECTOR INDEX `{safe_name}` IF NOT EXISTS "
-            f"FOR (c:{self.node_label}) ON (c.{self.embed_prop}) "
+            f"FOR (c:{self.node_label}) ON (c.`{prop}`) "
             f"OPTIONS {{ indexConfig: {{ `vector.dimensions`: {dim}, "
             f"`vector.similarity_function`: '{similarity}' }} }}"
         )
         with self.driver.session(database=self.db) as s:
             s.run(q)
+        self.create_fulltext_index()
+
+    def create_fulltext_index(self):
+        """Index Lucene sur le texte des chunks (noms de projets, téléphones, références exactes)."""
+        q = (f"CREATE FULLTEXT INDEX `{self._sanitize(self.fulltext_index)}` IF NOT EXISTS "
+             f"FOR (c:{self.node_label}) ON EACH [c.`{self.text_prop}`]")
+        with self.driver.session(database=self.db) as s:
+            s.run(q)
 
     # ---------------------- CRUD ----------------------
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """Empreinte sha256 du texte (espaces de bord ignorés) : clé d'idempotence des chunks."""
+        return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+
+    def existing_hashes(self, hashes: List[str], version: str | None = None) -> Dict[str, str | None]:
+        """{content_hash: embed_model} des chunks déjà présents pour cette version."""
+        if not hashes:
+            return {}
+        q = (f"UNWIND $hashes AS h "
+             f"MATCH (c:{self.node_label} {{content_hash: h, `{self.version_prop}`: $version}}) "
+             f"RETURN h, c.embed_model AS model")
+        with self.driver.session(database=self.db) as s:
+            return {r["h"]: r["model"] for r in s.run(q, hashes=sorted(set(hashes)), version=version or "")}
+
+    def chunk_states(self, ids: List[str]) -> Dict[str, tuple]:
+        """{id: (content_hash, embed_model)} des chunks déjà écrits (ingestion par série)."""
+        q = (f"MATCH (c:{self.node_label}) WHERE c.id IN $ids "
+             f"RETURN c.id AS id, c.content_hash AS h, c.embed_model AS model")
+        with self.driver.session(database=self.db) as s:
+            return {r["id"]: (r["h"], r["model"]) for r in s.run(q, ids=list(ids))}
+
     def save(self, *, texts: List[str], embeddings: List[List[float]], version: str | None = None,
-             metadatas: List[Dict] | None = None):
+             metadatas: List[Dict] | None = None, mode: str = "create",
+             model: str | None = None) -> Dict[str, int]:
+        """Écrit les chunks.
+
+        mode="create" : un nœud par texte, sans contrôle (comportement historique).
+        mode="upsert" : MERGE sur (content_hash, version) ; un texte déjà présent avec le
+        même modèle d'embedding n'est pas réécrit. Retourne {inserted, updated, unchanged,
+        duplicates} — *duplicates* : textes répétés dans le lot (seul le dernier est écrit).
+        """
+        if mode not in ("create", "upsert"):
+            raise ValueError(f"mode inconnu : {mode}")
+        prop = self.active()["embed_prop"]          # génération servie par l'alias
         rows = []
         for i, (t, e) in enumerate(zip(texts, embeddings)):
-            row = {self.text_prop: t, self.embed_prop: e}
+            row = {self.text_prop: t, prop: e}
             if version:
                 row[self.version_prop] = version
             if metadatas and i < len(metadatas):
                 row.update(metadatas[i])
             rows.append(row)
-        query = (
-            f"UNWIND $rows AS r CREATE (c:{self.node_label}) SET c = r"
-        )
+        if mode == "create":
+            self._write_rows(f"CREATE (c:{self.node_label})", "=", rows, prop)
+            return {"inserted": len(rows), "updated": 0, "unchanged": 0, "duplicates": 0}
+
+        # upsert : la clé de MERGE ne peut pas être nulle → version "" par défaut
+        version = version or ""
+        by_hash: Dict[str, Dict] = {}
+        for row in rows:
+            row[self.version_prop] = version
+            row["content_hash"] = self.content_hash(row[self.text_prop])
+            row["embed_model"] = model
+            by_hash[row["content_hash"]] = row          # doublons du lot : le dernier gagne
+        known = self.existing_hashes(list(by_hash), version)
+        todo = [r for h, r in by_hash.items() if h not in known or known[h] != model]
+        counts = {
+            "inserted": sum(1 for r in todo if r["content_hash"] not in known),
+            "updated":  sum(1 for r in todo if r["content_hash"] in known),
+            "unchanged": len(by_hash) - len(todo),
+            "duplicates": len(rows) - len(by_hash),
+        }
+        if todo:
+            self._write_rows(
+                f"MERGE (c:{self.node_label} {{content_hash: {{src}}.content_hash, "
+                f"`{self.version_prop}`: {{src}}.`{self.version_prop}`}})", "+=", todo, prop)
+        return counts
+
+    def _write_rows(self, head: str, op: str, rows: List[Dict], prop: str) -> None:
+        """UNWIND des lignes ; en stockage "native", le vecteur *prop* est écrit en float32 à part.
+
+        *head* crée / retrouve ``c`` ; ``{src}`` y désigne la map des propriétés de la ligne.
+        """
+        if self.vector_storage == "list":
+            query = (f"UNWIND $rows AS r {head.replace('{src}', 'r')} SET c {op} r "
+                     f"REMOVE c.`{storage_prop(prop)}`")
+        else:
+            rows = [{"props": {k: v for k, v in r.items() if k != prop},
+                     "vec": r[prop]} for r in rows]
+            query = (f"UNWIND $rows AS r {head.replace('{src}', 'r.props')} SET c {op} r.props "
+                     + set_vector_clause("native", "c", prop, "r.vec"))
         with self.driver.session(database=self.db) as s:
             s.run(query, rows=rows)
 
-    def search_similar(self, embedding: List[float], k: int = 5):
-        q = (
-            f"CALL db.index.vector.queryNodes('{self.index_name}', $k, $vec) "
-            "YIELD node, score RETURN node, score"
-        )
+    # ---------------------- search ----------------------
+    # Filtres de métadonnées reconnus → prédicat Cypher (les autres clés = égalité sur la propriété) ;
+    # {version_prop} est remplacé par la propriété de version de l'instance
+    _FILTERS = {
+        "series":      "node.series = $f_series",
+        "version":     "node.`{version_prop}` = $f_version",
+        "source_doc":  "node.source_doc = $f_source_doc",
+        "ingest_from": "node.ingest_ts >= $f_ingest_from",
+        "ingest_to":   "node.ingest_ts <= $f_ingest_to",
+    }
+
+    _SOURCES = {
+        "vector":   "CALL db.index.vector.queryNodes($index, $fetch, $vec) YIELD node, score\n",
+        "fulltext": "CALL db.index.fulltext.queryNodes($index, $lucene, {limit: $fetch}) YIELD node, score\n",
+    }
+
+    def _search_query(self, *, properties: List[str], filters: Dict | None = None,
+                      with_neighbours: bool = False, source: str = "vector") -> tuple[str, Dict]:
+        """Construit la requête projetée : seules les propriétés demandées (+ id, score)
+        transitent par Bolt, jamais la liste ``embedding``."""
+        where, params = [], {}
+        for i, (key, value) in enumerate((filters or {}).items()):
+            if value is None:
+                continue
+            if key in self._FILTERS:
+                where.append(self._FILTERS[key].format(version_prop=self.version_prop))
+                params[f"f_{key}"] = value
+            else:
+                where.append(f"node[$fk{i}] = $fv{i}")
+                params[f"fk{i}"], params[f"fv{i}"] = key, value
+        proj = ", ".join(f".`{self._sanitize(p)}`" for p in properties)
+        q = self._SOURCES[source]
+        if where:
+            q += "WHERE " + " AND ".join(where) + "\n"
+        q += "WITH node, score ORDER BY score DESC LIMIT $k\n"
+        if with_neighbours:
+            q += (f"OPTIONAL MATCH (prev:{self.node_label})-[:NEXT_CHUNK]->(node)\n"
+                  f"OPTIONAL MATCH (node)-[:NEXT_CHUNK]->(next:{self.node_label})\n"
+                  f"RETURN node.id AS id, score, node {{{proj}}} AS props, "
+                  f"prev {{.id, {proj}}} AS prev, next {{.id, {proj}}} AS next")
+        else:
+            q += f"RETURN node.id AS id, score, node {{{proj}}} AS props"
+        return q, params
+
+    @staticmethod
+    def _format_hit(record) -> Dict:
+        hit = {"id": record["id"], "score": record["score"], **(record["props"] or {})}
+        if "prev" in record.keys():
+            hit["prev"], hit["next"] = record["prev"], record["next"]
+        return hit
+
+    def _run_search(self, q: str, params: Dict, k: int, overfetch: int, max_fetch: int, **args) -> List[Dict]:
+        """Exécute *q* ; avec filtres, double la sur-extraction tant que le top-k n'est pas plein."""
+        filtered = bool(params)
+        fetch = min(max_fetch, k * overfetch) if filtered else k
         with self.driver.session(database=self.db) as s:
-            return [{"score": r["score"], "text": r["node"][self.text_prop]} for r in s.run(q, k=k, vec=embedding)]
\ No newline at end of file
+            while True:
+                hits = [self._format_hit(r) for r in s.run(q, fetch=max(fetch, k), k=k, **args, **params)]
+                if len(hits) >= k or not filtered or fetch >= max_fetch:
+                    return hits
+                fetch = min(max_fetch, fetch * 2)
+
+    async def _arun_search(self, q: str, params: Dict, k: int, overfetch: int, max_fetch: int, **args) -> List[Dict]:
+        filtered = bool(params)
+        fetch = min(max_fetch, k * overfetch) if filtered else k
+        while True:
+            rows = await run_read(self.async_driver, self.db, q, fetch=max(fetch, k), k=k, **args, **params)
+            hits = [self._format_hit(r) for r in rows]
+            if len(hits) >= k or not filtered or fetch >= max_fetch:
+                return hits
+            fetch = min(max_fetch, fetch * 2)
+
+    def search(self, embedding: List[float], k: int = 5, *, properties: List[str] | None = None,
+               filters: Dict | None = None, with_neighbours: bool = False,
+               overfetch: int = 4, max_fetch: int = 1000) -> List[Dict]:
+        """Recherche vectorielle projetée et filtrée.
+
+        filters : {"series", "version", "source_doc", "ingest_from", "ingest_to", <prop>: valeur}.
+        Avec filtres, l'index renvoie ``k * overfetch`` candidats avant filtrage ; si moins de
+        ``k`` survivent, on double la sur-extraction (jusqu'à ``max_fetch``) pour garder un top-k exact.
+        with_neighbours : ajoute les chunks NEXT_CHUNK précédent / suivant dans le même aller-retour.
+        """
+        properties = properties or [self.text_prop]
+        q, params = self._search_query(properties=properties, filters=filters, with_neighbours=with_neighbours)
+        return self._run_search(q, params, k, overfetch, max_fetch,
+                                index=self.active()["index"], vec=embedding)
+
+    async def asearch(self, embedding: List[float], k: int = 5, *, properties: List[str] | None = None,
+                      filters: Dict | None = None, with_neighbours: bool = False,
+                      overfetch: int = 4, max_fetch: int = 1000) -> List[Dict]:
+        """Version asynchrone de :meth:`search` (même requête, driver asynchrone)."""
+        properties = properties or [self.text_prop]
+        q, params = self._search_query(properties=properties, filters=filters, with_neighbours=with_neighbours)
+        return await self._arun_search(q, params, k, overfetch, max_fetch,
+                                       index=(await self.aactive())["index"], vec=embedding)
+
+    # ---------------------- full-text ----------------------
+    _LUCENE_SPECIAL = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+
+    @classmethod
+    def lucene_query(cls, text: str) -> str:
+        """Question libre → requête Lucene sûre : chaque terme échappé, combinés en OR."""
+        terms = [cls._LUCENE_SPECIAL.sub(r"\\\1", t) for t in text.split()]
+        terms = [t for t in terms if any(ch.isalnum() for ch in t)]
+        return " ".join(terms)
+
+    def search_fulltext(self, text: str, k: int = 5, *, properties: List[str] | None = None,
+                        filters: Dict | None = None, overfetch: int = 4, max_fetch: int = 1000) -> List[Dict]:
+        """Recherche Lucene (BM25) sur le texte des chunks ; mêmes filtres / format que :meth:`search`."""
+        lucene = self.lucene_query(text)
+        if not lucene:
+            return []
+        q, params = self._search_query(properties=properties or [self.text_prop], filters=filters, source="fulltext")
+        return self._run_search(q, params, k, overfetch, max_fetch,
+                                index=self._sanitize(self.fulltext_index), lucene=lucene)
+
+    async def asearch_fulltext(self, text: str, k: int = 5, *, properties: List[str] | None = None,
+                               filters: Dict | None = None, overfetch: int = 4, max_fetch: int = 1000) -> List[Dict]:
+        """Version asynchrone de :meth:`search_fulltext`."""
+        lucene = self.lucene_query(text)
+        if not lucene:
+            return []
+        q, params = self._search_query(properties=properties or [self.text_prop], filters=filters, source="fulltext")
+        return await self._arun_search(q, params, k, overfetch, max_fetch,
+                                       index=self._sanitize(self.fulltext_index), lucene=lucene)
+
+    async def asearch_similar(self, embedding: List[float], k: int = 5):
+        return [{"score": h["score"], "text": h.get(self.text_prop)} for h in await self.asearch(embedding, k=k)]
+
+    def search_similar(self, embedding: List[float], k: int = 5):
+        return [{"score": h["score"], "text": h.get(self.text_prop)} for h in self.search(embedding, k=k)]
@@ -55,17 +55,14 @@ class DataInfoManager:
             return None
         try:
             from embedding.vector_store import Neo4jVectorManager
-            manager = Neo4jVectorManager(**neo4j_config)
+            manager = Neo4jVectorManager(**neo4j_config)   # driver partagé du registre, pas de pool dédié
             # On suppose que chaque chunk/document indexé a une propriété 'version' ou similaire
-            from neo4j import GraphDatabase
-            driver = GraphDatabase.driver(manager.url, auth=(manager.username, manager.password))
-            with driver.session(database=manager.database) as session:
+            with manager.driver.session(database=manager.db) as session:
                 # Adaptez la requête Cypher selon votre modèle de noeud/indexation
                 result = session.run(f"""
                     MATCH (n:{manager.node_label}) WHERE n.version = $version RETURN count(n) as count
                 """, {"version": version})
                 count = result.single()["count"]
-            driver.close()
             return count > 0
         except Exception as e:
             print(f"Neo4j check failed: {e}")
@@ -0,0 +1,283 @@
+"""Import direct d'inventaires tabulaires (CSV / XLSX) dans Neo4j, sans LLM.
+
+Un mapping déclaratif décrit, pour chaque ligne du tableur, les nœuds à fusionner
+(label, colonnes clés, propriétés typées) et les relations entre eux :
+
+    {
+      "nodes": [
+        {"alias": "p", "label": "Project", "key": {"name": "Projet"},
+         "props": {"standing": "Standing"}},
+        {"alias": "u", "label": "Unit", "key": {"ref": "Référence"},
+         "props": {"rooms": {"column": "Pièces", "type": "int"},
+                   "price_mad": {"column": "Prix", "type": "float"},
+                   "surface_m2": {"column": "Surface", "type": "float", "decimal": ","}}},
+        {"alias": "c", "label": "City", "key": {"name": "Ville"}}
+      ],
+      "relationships": [
+        {"type": "HAS_UNIT", "from": "p", "to": "u"},
+        {"type": "LOCATED_IN", "from": "p", "to": "c", "props": {"since": "Livraison"}}
+      ]
+    }
+
+« decimal » fixe le séparateur décimal d'une colonne numérique ; sans lui, un séparateur
+unique suivi de trois chiffres est lu comme séparateur de milliers (« 250.000 » → 250000).
+
+Les lignes sont lues en flux (``csv`` / ``openpyxl`` en ``read_only``) et écrites par
+lots : une transaction par lot, une requête ``UNWIND`` par nœud / relation du mapping.
+La mémoire reste bornée par la taille du lot, quel que soit le nombre de lignes.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import itertools
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from db.generations import generations
+
+_IDENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,63}$")
+TYPES = ("str", "int", "float", "bool")
+
+
+def _ident(name: str, what: str) -> str:
+    """Labels / types / propriétés sont insérés dans la requête : identifiants stricts."""
+    if not isinstance(name, str) or not _IDENT.match(name):
+        raise ValueError(f"{what} invalide : {name!r}")
+    return name
+
+
+def to_number(value: Any, *, decimal: str | None = None) -> float | None:
+    """« 1 250 000 », « 65,5 », « 1.250.000,00 », « 250.000 » → float ; None si illisible.
+
+    Sans *decimal*, un séparateur unique suivi d'exactement trois chiffres est un séparateur
+    de milliers (« 250.000 » / « 250,000 » → 250000, comme ``numeric_normalizer``) ; *decimal*
+    (« , » ou « . ») impose le séparateur décimal, l'autre est alors un séparateur de milliers."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    s = re.sub(r"[\s  ]", "", str(value or ""))
+    if not s:
+        return None
+    if decimal is not None:
+        s = s.replace("." if decimal == "," else ",", "").replace(decimal, ".")
+    elif "," in s and "." in s:                   # le dernier séparateur est le décimal
+        s = s.replace(".", "").replace(",", ".") if s.rfind(",") > s.rfind(".") else s.replace(",", "")
+    elif s.count(".") > 1 or s.count(",") > 1 or re.fullmatch(r"[-+]?\d{1,3}[.,]\d{3}", s):
+        s = s.replace(".", "").replace(",", "")   # séparateurs de milliers uniquement
+    else:
+        s = s.replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+class ColumnMapping:
+    """Mapping validé + préparation des lignes (paramètres des requêtes)."""
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.nodes: List[Dict[str, Any]] = []
+        aliases = {}
+        for i, n in enumerate(spec.get("nodes") or []):
+            alias = n.get("alias") or f"n{i}"
+            if alias in aliases:
+                raise ValueError(f"alias en double : {alias}")
+            key = {_ident(p, "propriété"): self._column(c) for p, c in (n.get("key") or {}).items()}
+            if not key:
+                raise ValueError(f"nœud {alias} : clé de MERGE manquante")
+            node = {"alias": alias, "param": f"n{i}", "label": _ident(n.get("label"), "label"), "key": key,
+                    "props": {_ident(p, "propriété"): self._column(c) for p, c in (n.get("props") or {}).items()}}
+            aliases[alias] = node
+            self.nodes.append(node)
+        if not self.nodes:
+            raise ValueError("mapping sans nœud")
+        self.rels: List[Dict[str, Any]] = []
+        for i, r in enumerate(spec.get("relationships") or []):
+            if r.get("from") not in aliases or r.get("to") not in aliases:
+                raise ValueError(f"relation {r.get('type')} : alias inconnu")
+            self.rels.append({"param": f"r{i}", "type": _ident(r.get("type"), "type de relation"),
+                              "from": aliases[r["from"]], "to": aliases[r["to"]],
+                              "props": {_ident(p, "propriété"): self._column(c)
+                                        for p, c in (r.get("props") or {}).items()}})
+
+    @staticmethod
+    def _column(spec: Any) -> Dict[str, Any]:
+        col = {"column": spec, "type": "str"} if isinstance(spec, str) else dict(spec)
+        if not col.get("column") or col.get("type", "str") not in TYPES or \
+                col.get("decimal") not in (None, ",", "."):
+            raise ValueError(f"colonne invalide : {spec!r}")
+        col.setdefault("type", "str")
+        return col
+
+    def columns(self) -> set:
+        cols = [c for n in self.nodes for c in (*n["key"].values(), *n["props"].values())]
+        cols += [c for r in self.rels for c in r["props"].values()]
+        return {c["column"] for c in cols}
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _value(row: Dict[str, Any], col: Dict[str, Any], stats: Dict[str, int]) -> Any:
+        raw = row.get(col["column"])
+        if raw is None or (isinstance(raw, str) and not raw.strip()):
+            return col.get("default")
+        if col["type"] == "str":
+            return str(raw).strip()
+        if col["type"] == "bool":
+            return str(raw).strip().lower() in {"1", "true", "oui", "yes", "x", "vrai"}
+        num = to_number(raw, decimal=col.get("decimal"))
+        if num is None:
+            stats["invalid_values"] += 1
+            return col.get("default")
+        return int(num) if col["type"] == "int" else num
+
+    def _props(self, row, cols: Dict[str, Dict], stats) -> Dict[str, Any]:
+        out = {p: self._value(row, c, stats) for p, c in cols.items()}
+        return {p: v for p, v in out.items() if v is not None}
+
+    def prepare(self, row: Dict[str, Any], stats: Dict[str, int]) -> Dict[str, Any] | None:
+        """Ligne brute → paramètres ; un nœud dont une colonne clé est vide est ignoré."""
+        out: Dict[str, Any] = {}
+        for n in self.nodes:
+            key = self._props(row, n["key"], stats)
+            if len(key) == len(n["key"]):
+                out[n["param"]] = {"key": key, "props": self._props(row, n["props"], stats)}
+        if not out:
+            return None
+        for r in self.rels:
+            if r["from"]["param"] in out and r["to"]["param"] in out:
+                out[r["param"]] = self._props(row, r["props"], stats)
+        return out
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _match(var: str, node: Dict[str, Any]) -> str:
+        keys = ", ".join(f"`{p}`: row.{node['param']}.key.`{p}`" for p in node["key"])
+        return f"({var}:`{node['label']}` {{{keys}}})"
+
+    def queries(self) -> List[str]:
+        """Une requête par nœud puis par relation ; les lignes sans l'élément sont filtrées."""
+        qs = [f"UNWIND $rows AS row WITH row WHERE row.{n['param']} IS NOT NULL "
+              f"MERGE {self._match('n', n)} SET n += row.{n['param']}.props" for n in self.nodes]
+        qs += [f"UNWIND $rows AS row WITH row WHERE row.{r['param']} IS NOT NULL "
+               f"MATCH {self._match('a', r['from'])} MATCH {self._match('b', r['to'])} "
+               f"MERGE (a)-[rel:`{r['type']}`]->(b) SET rel += row.{r['param']}" for r in self.rels]
+        return qs
+
+    def constraints(self) -> List[str]:
+        """Unicité des clés de MERGE (sinon chaque MERGE parcourt le label)."""
+        out = []
+        for n in self.nodes:
+            props = sorted(n["key"])
+            name = f"{n['label']}_{'_'.join(props)}_key".lower()
+            req = ", ".join(f"n.`{p}`" for p in props)
+            out.append(f"CREATE CONSTRAINT {name} IF NOT EXISTS FOR (n:`{n['label']}`) "
+                       f"REQUIRE ({req}) IS UNIQUE")
+        return out
+
+
+# ----------------------------------------------------------------------
+def iter_rows(path: str | Path, *, sheet: str | None = None, delimiter: str | None = None) -> Iterator[Dict[str, Any]]:
+    """Lignes d'un CSV ou d'une feuille XLSX, en flux (aucun chargement complet)."""
+    path = Path(path)
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        from openpyxl import load_workbook      # dépendance chargée à la demande
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            ws = wb[sheet] if sheet else wb.active
+            rows = ws.iter_rows(values_only=True)
+            header = [str(h).strip() if h is not None else "" for h in next(rows, [])]
+            for values in rows:
+                if any(v is not None for v in values):
+                    yield dict(zip(header, values))
+        finally:
+            wb.close()
+        return
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if delimiter is None:
+            try:
+                delimiter = csv.Sniffer().sniff(f.readline(), delimiters=",;\t|").delimiter
+            except csv.Error:
+                delimiter = ","
+            f.seek(0)
+        yield from csv.DictReader(f, delimiter=delimiter)
+
+
+class TabularImporter:
+    def __init__(self, driver, database: str | None = None, *, batch_size: int = 5000):
+        self.driver = driver
+        self.db = database
+        self.batch_size = max(1, batch_size)
+
+    def _write_tx(self, tx, queries: List[str], rows: List[Dict]) -> Dict[str, int]:
+        counts = {"nodes_created": 0, "relationships_created": 0, "properties_set": 0}
+        for q in queries:
+            c = tx.run(q, rows=rows).consume().counters
+            for k in counts:
+                counts[k] += getattr(c, k, 0)
+        return counts
+
+    def run(self, path: str | Path, mapping: Dict[str, Any] | ColumnMapping, *, sheet: str | None = None,
+            ensure_constraints: bool = True) -> Dict[str, Any]:
+        mapping = mapping if isinstance(mapping, ColumnMapping) else ColumnMapping(mapping)
+        queries = mapping.queries()
+        if ensure_constraints:
+            with self.driver.session(database=self.db) as s:
+                for ddl in mapping.constraints():
+                    s.run(ddl).consume()
+        stats = {"rows": 0, "skipped_rows": 0, "invalid_values": 0, "batches": 0,
+                 "nodes_created": 0, "relationships_created": 0, "properties_set": 0}
+        rows = iter_rows(path, sheet=sheet)
+        first = next(rows, None)
+        if first is None:
+            return stats
+        missing = mapping.columns() - set(first)
+        if missing:
+            raise ValueError(f"colonnes absentes du fichier : {sorted(missing)}")
+        rows = itertools.chain([first], rows)
+        while batch := list(itertools.islice(rows, self.batch_size)):
+            params = []
+            for row in batch:
+                p = mapping.prepare(row, stats)
+                if p is None:
+                    stats["skipped_rows"] += 1
+                else:
+                    params.append(p)
+            stats["rows"] += len(batch)
+            if params:
+                with self.driver.session(database=self.db) as s:
+                    counts = s.execute_write(self._write_tx, queries, params)
+                for k, v in counts.items():
+                    stats[k] += v
+            stats["batches"] += 1
+            print(f"Import tabulaire : {stats['rows']} lignes")
+        if stats["nodes_created"] or stats["relationships_created"] or stats["properties_set"]:
+            generations.bump(kind="kg")           # invalide les résultats de retrieval en cache
+        return stats
+
+
+# ----------------------------------------------------------------------
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Import CSV / XLSX → Neo4j selon un mapping JSON")
+    ap.add_argument("path")
+    ap.add_argument("--mapping", required=True, help="fichier JSON du mapping")
+    ap.add_argument("--sheet")
+    ap.add_argument("--batch-size", type=int, default=5000)
+    args = ap.parse_args(argv)
+    mapping = json.loads(Path(args.mapping).read_text(encoding="utf-8"))
+
+    from settings import NEO4J_CFG
+    from db.driver_registry import driver_registry
+    driver = driver_registry.from_cfg(NEO4J_CFG)
+    generations.bind(driver, NEO4J_CFG["database"])    # invalide aussi le cache des workers de l'API
+    try:
+        stats = TabularImporter(driver, NEO4J_CFG["database"],
+                                batch_size=args.batch_size).run(args.path, mapping, sheet=args.sheet)
+    finally:
+        driver_registry.close_all()
+    print(json.dumps(stats, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,277 @@
+"""Mode « bulk load » : fichiers CSV pour ``neo4j-admin database import full``.
+
+Pour un premier chargement (base vide, millions de lignes), passer par
+``UNWIND … MERGE`` prend des heures ; l'import hors-ligne écrit directement les
+fichiers du store. Ce module produit, en streaming depuis le stock de chunks
+(``data/chunks/chunks_<serie>/*.txt``) et une source de triplets :
+
+- ``chunks_header.csv`` / ``chunks.csv``         : nœuds Chunk (+ ``content_hash``, vecteur
+  ``float[]`` sur ``embed_prop`` et ``embed_model``)
+- ``next_chunk_header.csv`` / ``next_chunk.csv`` : relations NEXT_CHUNK
+- ``entities_header.csv`` / ``entities.csv``     : nœuds Entity (une ligne par clé)
+- ``relations_header.csv`` / ``relations.csv``   : relations typées des triplets (+ ``chunks``)
+- ``mentions_header.csv`` / ``mentions.csv``     : relations (:Chunk)-[:MENTIONS]->(:Entity)
+- ``import.sh``           : commande neo4j-admin correspondante
+- ``post_import.cypher``  : contraintes + index vectoriel (+ nœud alias) à créer après l'import
+
+Les ids de chunks suivent ceux de ``EmbeddingPipeline.run_from_series``
+(``<serie>-000001``…) et portent le même ``content_hash``
+(``Neo4jVectorManager.content_hash``) et le même ``embed_model``
+(``EmbeddingManager.model_id``) : après l'import, une ingestion incrémentale ne
+ré-embedde que les chunks réellement modifiés.
+
+Avec le cache d'extraction (``--from-extraction-cache``), les triplets de chaque chunk
+sont lus par empreinte de son texte : MENTIONS, ``r.chunks`` et l'état KG du chunk
+(``kg_hash`` / ``kg_prompt`` / ``kg_status``, voir ``kg_state``) sont exportés comme les
+écrirait ``KGBuilder`` avec ``ExtractionRouter`` : une construction incrémentale après
+l'import ne réextrait que les chunks absents du cache, et le retrait de provenance d'un
+chunk modifié fonctionne.
+"""
+from __future__ import annotations
+import argparse, csv, hashlib, json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from embedding.vector_store import Neo4jVectorManager
+from knowledge.entity_resolver import EntityResolver
+from knowledge.extraction_cache import ExtractionCache
+from knowledge.kg_writer import normalize_rel_type
+from knowledge.rule_extractor import extraction_version
+from knowledge.schema_manager import SchemaBootstrap
+from settings import NEO4J_CFG
+
+class AdminImportExporter:
+    def __init__(self, out_dir: str | Path, *, chunks_root: str | Path | None = None, embedder=None,
+                 embed_batch: int = 64, array_delimiter: str = ";", chunk_label: str = "Chunk",
+                 entity_label: str = "Entity", embed_prop: str | None = None,
+                 cache: ExtractionCache | None = None, prompt_hash: str | None = None):
+        """embedder : objet exposant ``embed_texts(list[str])`` et ``model_id`` (EmbeddingManager) ;
+        None = pas d'embedding. embed_prop : propriété du vecteur (défaut NEO4J_CFG).
+        cache : cache d'extraction LLM, source des triplets de chaque chunk (provenance et état
+        KG) ; prompt_hash : n'en lire qu'une version de prompt (défaut : la plus récente)."""
+        self.out = Path(out_dir)
+        self.chunks_root = Path(chunks_root) if chunks_root else Path(__file__).resolve().parent.parent / "data" / "chunks"
+        self.embedder = embedder
+        self.embed_batch = embed_batch
+        self.delim = array_delimiter
+        self.chunk_label = chunk_label
+        self.entity_label = entity_label
+        self.embed_prop = Neo4jVectorManager._sanitize(embed_prop or NEO4J_CFG["embed_prop"])
+        self.model = getattr(embedder, "model_id", None) if embedder is not None else None
+        self.cache = cache
+        self.prompt_hash = prompt_hash
+        self.dim: int | None = None
+
+    # ------------------------------------------------------------------
+    def iter_series_chunks(self, series: str) -> Iterator[Tuple[str, str]]:
+        """(chunk_id, texte) dans l'ordre de run_from_series, un fichier à la fois."""
+        d = self.chunks_root / f"chunks_{series}"
+        if not d.exists():
+            raise FileNotFoundError(f"Répertoire introuvable : {d}")
+        for i, p in enumerate(sorted(d.glob("*.txt")), 1):
+            yield f"{series}-{i:06d}", p.read_text(encoding="utf-8")
+
+    def _writer(self, name: str, header: List[str]):
+        with open(self.out / f"{name}_header.csv", "w", encoding="utf-8", newline="") as h:
+            csv.writer(h).writerow(header)
+        f = open(self.out / f"{name}.csv", "w", encoding="utf-8", newline="")
+        return f, csv.writer(f)
+
+    # ------------------------------------------------------------------
+    def _write_chunks(self, series_list: List[str], stamp: str, sink: "_TripletSink") -> Dict[str, int]:
+        chunk_cols = [f"id:ID({self.chunk_label})", "text", "series", "ingest_ts", "content_hash", ":LABEL"]
+        if self.embedder is not None:
+            chunk_cols[5:5] = [f"{self.embed_prop}:float[]", "embed_model"]
+        if self.cache is not None:
+            chunk_cols[-1:-1] = ["kg_hash", "kg_prompt", "kg_status", "kg_ts"]
+        fc, wc = self._writer("chunks", chunk_cols)
+        fn, wn = self._writer("next_chunk", [f":START_ID({self.chunk_label})", f":END_ID({self.chunk_label})", ":TYPE"])
+        counts = {"chunks": 0, "next_chunk": 0, "chunks_extracted": 0}
+        try:
+            for series in series_list:
+                prev, batch = None, []
+                for cid, text in self.iter_series_chunks(series):
+                    batch.append((cid, text))
+                    if len(batch) >= self.embed_batch:
+                        prev = self._flush_chunks(batch, series, stamp, prev, wc, wn, counts, sink)
+                        batch = []
+                if batch:
+                    self._flush_chunks(batch, series, stamp, prev, wc, wn, counts, sink)
+        finally:
+            fc.close(); fn.close()
+        return counts
+
+    def _flush_chunks(self, batch, series, stamp, prev, wc, wn, counts, sink) -> str:
+        vecs = self.embedder.embed_texts([t for _, t in batch]) if self.embedder is not None else [None] * len(batch)
+        for (cid, text), vec in zip(batch, vecs):
+            h = Neo4jVectorManager.content_hash(text)
+            row = [cid, text, series, stamp, h]
+            if vec is not None:
+                self.dim = self.dim or len(vec)
+                row += [self.delim.join(repr(float(x)) for x in vec), self.model or ""]
+            if self.cache is not None:
+                # triplets du cache d'extraction (par chunk) : provenance + état KG du chunk,
+                # une construction incrémentale après l'import ne le réextrait pas
+                hit = self.cache.latest(text, prompt_hash=self.prompt_hash) if text.strip() else None
+                if hit is not None:
+                    for t in hit[0]:
+                        sink.add(t, cid=cid)
+                    counts["chunks_extracted"] += 1
+                row += [h, extraction_version(hit[1]), "done", stamp] if hit is not None else ["", "", "", ""]
+            wc.writerow(row + [self.chunk_label])
+            counts["chunks"] += 1
+            if prev is not None:
+                wn.writerow([prev, cid, "NEXT_CHUNK"])
+                counts["next_chunk"] += 1
+            prev = cid
+        return prev
+
+    # ------------------------------------------------------------------
+    def _write_scripts(self, database: str, index_name: str, similarity: str) -> None:
+        files = lambda n: f"{n}_header.csv,{n}.csv"
+        cmd = (
+            f"neo4j-admin database import full {database} \\\n"
+            f"  --nodes={files('chunks')} \\\n"
+            f"  --nodes={files('entities')} \\\n"
+            f"  --relationships={files('next_chunk')} \\\n"
+            f"  --relationships={files('relations')} \\\n"
+            f"  --relationships={files('mentions')} \\\n"
+            f"  --array-delimiter='{self.delim}' --multiline-fields=true \\\n"
+            f"  --skip-duplicate-nodes=true --overwrite-destination=true\n"
+        )
+        (self.out / "import.sh").write_text("#!/bin/sh\n# Base arrêtée ; lancer depuis ce dossier.\n" + cmd, encoding="utf-8")
+        ddl = list(SchemaBootstrap(None, chunk_label=self.chunk_label, entity_label=self.entity_label).statements().values())
+        if self.dim:
+            index = Neo4jVectorManager._sanitize(index_name)
+            ddl.append(
+                f"CREATE VECTOR INDEX `{index}` IF NOT EXISTS FOR (c:{self.chunk_label}) ON (c.`{self.embed_prop}`) "
+                f"OPTIONS {{ indexConfig: {{ `vector.dimensions`: {self.dim}, `vector.similarity_function`: '{similarity}' }} }}"
+            )
+            # génération 0 servie par l'alias logique (même forme que BlueGreenReindexer._switch)
+            ddl.append(
+                f"MERGE (a:{Neo4jVectorManager.ALIAS_LABEL} {{name: {json.dumps(index_name)}}}) "
+                f"SET a.index = {json.dumps(index)}, a.embed_prop = {json.dumps(self.embed_prop)}, "
+                f"a.generation = 0, a.model = {json.dumps(self.model)}, a.dim = {self.dim}, "
+                f"a.similarity = {json.dumps(similarity)}"
+            )
+        ddl.append("CALL db.awaitIndexes(3600)")
+        (self.out / "post_import.cypher").write_text(";\n".join(ddl) + ";\n", encoding="utf-8")
+
+    def export(self, series_list: List[str], *, triplets: Iterable[Dict] = (), database: str = "neo4j",
+               index_name: str | None = None, similarity: str = "cosine", ingest_ts: str | None = None) -> Dict:
+        """Écrit tous les fichiers ; retourne un manifeste (comptes, dimension, fichiers)."""
+        from datetime import datetime
+        self.out.mkdir(parents=True, exist_ok=True)
+        stamp = ingest_ts or datetime.now().isoformat(timespec="seconds")
+        sink = _TripletSink(self)
+        try:
+            chunk_counts = self._write_chunks(series_list, stamp, sink)
+            for t in triplets:                  # triplets sans chunk d'origine (JSONL)
+                sink.add(t)
+        finally:
+            triplet_counts = sink.close()
+        manifest = {"series": series_list, **chunk_counts, **triplet_counts}
+        self._write_scripts(database, index_name or NEO4J_CFG["index_name"], similarity)
+        manifest.update({"dimension": self.dim, "embed_prop": self.embed_prop, "embed_model": self.model,
+                         "out_dir": str(self.out),
+                         "files": sorted(p.name for p in self.out.iterdir())})
+        (self.out / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+        return manifest
+
+
+# ------------------------------------------------------------------
+class _TripletSink:
+    """Entités (une ligne par clé), MENTIONS (chunk → entité) et relations typées portant la
+    liste ``chunks`` de leurs chunks sources, comme ``KGWriteBuffer``. Entités et MENTIONS
+    sont écrites au fil de l'eau ; les relations sont agrégées (empreinte 8 octets → chunks)
+    puis écrites à la fermeture."""
+
+    def __init__(self, exporter: AdminImportExporter):
+        self.x = exporter
+        self.resolver = EntityResolver()        # mêmes clés canoniques que KGWriteBuffer
+        self.fe, self.we = exporter._writer("entities", [f"key:ID({exporter.entity_label})", "name", ":LABEL"])
+        self.fm, self.wm = exporter._writer("mentions", [f":START_ID({exporter.chunk_label})",
+                                                         f":END_ID({exporter.entity_label})", ":TYPE"])
+        self.entities: set = set()
+        self.mentions: set = set()              # (chunk, clé) du chunk courant
+        self.current: str | None = None
+        self.rels: Dict[bytes, list] = {}
+        self.counts = {"entities": 0, "relations": 0, "mentions": 0, "rejected": 0}
+
+    def _entity(self, key: str, name: str, cid: str | None) -> None:
+        if key not in self.entities:
+            self.entities.add(key)
+            self.we.writerow([key, name, self.x.entity_label])
+            self.counts["entities"] += 1
+        if cid is not None and (cid, key) not in self.mentions:
+            self.mentions.add((cid, key))
+            self.wm.writerow([cid, key, "MENTIONS"])
+            self.counts["mentions"] += 1
+
+    def add(self, t: Dict, *, cid: str | None = None) -> None:
+        if cid != self.current:                 # triplets d'un chunk : reçus à la suite
+            self.current, self.mentions = cid, set()
+        (sk, s), (ok, o) = (self.resolver.resolve(str(t["subject"])),
+                            self.resolver.resolve(str(t.get("object", t.get("object_", "")))))
+        rel = normalize_rel_type(t["relation"])     # mêmes types que KGWriteBuffer
+        if not sk or not ok or rel is None:
+            self.counts["rejected"] += 1
+            return
+        self._entity(sk, s, cid)
+        self._entity(ok, o, cid)
+        key = hashlib.blake2b(f"{sk}\x1f{rel}\x1f{ok}".encode("utf-8"), digest_size=8).digest()
+        row = self.rels.setdefault(key, [sk, ok, rel, []])
+        if cid is not None and cid not in row[3]:
+            row[3].append(cid)
+
+    def close(self) -> Dict[str, int]:
+        self.fe.close(); self.fm.close()
+        fr, wr = self.x._writer("relations", [f":START_ID({self.x.entity_label})", f":END_ID({self.x.entity_label})",
+                                              ":TYPE", "chunks:string[]"])
+        try:
+            for sk, ok, rel, cids in self.rels.values():
+                wr.writerow([sk, ok, rel, self.x.delim.join(cids)])
+        finally:
+            fr.close()
+        self.counts["relations"] = len(self.rels)
+        return self.counts
+
+
+def _iter_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Export CSV pour neo4j-admin database import")
+    ap.add_argument("--series", nargs="+", required=True, help="suffixes de séries (ex. 110625-022017)")
+    ap.add_argument("--out", default="data/import")
+    ap.add_argument("--embedder", default=None, help="provider EmbeddingManager (ex. huggingface, hash)")
+    ap.add_argument("--embed-prop", default=None, help="propriété du vecteur (défaut NEO4J_EMBED_PROP)")
+    ap.add_argument("--triplets", default=None, help="JSONL {subject, relation, object}")
+    ap.add_argument("--from-extraction-cache", action="store_true",
+                    help="triplets, provenance et état KG de chaque chunk depuis le cache d'extraction LLM")
+    ap.add_argument("--prompt-hash", default=None, help="avec --from-extraction-cache : une seule version du prompt")
+    ap.add_argument("--database", default="neo4j")
+    args = ap.parse_args(argv)
+
+    embedder = None
+    if args.embedder:
+        from embedding.embedding_manager import EmbeddingManager
+        embedder = EmbeddingManager(args.embedder)
+    triplets = _iter_jsonl(args.triplets) if args.triplets else ()
+    cache = None
+    if args.from_extraction_cache:
+        from settings import EXTRACTION_CACHE_CFG
+        cache = ExtractionCache(EXTRACTION_CACHE_CFG["path"])
+    exporter = AdminImportExporter(args.out, embedder=embedder, embed_prop=args.embed_prop,
+                                   cache=cache, prompt_hash=args.prompt_hash)
+    manifest = exporter.export(args.series, triplets=triplets, database=args.database)
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
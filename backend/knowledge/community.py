@@ -0,0 +1,262 @@
+"""Communautés d'entités et résumés précalculés (questions « globales »).
+
+Job hors ligne, en quatre étapes :
+
+1. export de l'adjacence ``Entity``–``Entity`` (une requête, arêtes pondérées par le
+   nombre de relations) ;
+2. détection des communautés en mémoire par propagation de labels (ordre de visite et
+   départage des égalités tirés d'une graine fixe : résultat reproductible). Les hubs
+   (villes, équipements courants… degré > ``hub_degree``) ne propagent pas leur label —
+   sinon tout le graphe fusionne autour d'eux — et rejoignent ensuite la communauté
+   majoritaire de leurs voisins ;
+3. un résumé LLM par communauté (au moins ``min_size`` entités), à partir de ses faits ;
+4. écriture : ``(:Community {id, title, summary, size, embedding})``, arêtes
+   ``(:Entity)-[:IN_COMMUNITY]->(:Community)`` et index vectoriel sur les résumés.
+
+L'id d'une communauté est l'empreinte de ses membres : une communauté inchangée garde
+son id et son résumé (aucun appel LLM) tant que le prompt n'a pas changé. Le vecteur du
+résumé porte ``embed_model`` : après un changement d'embedder (reconstruction bleu / vert
+vers un autre modèle), les résumés réutilisés sont ré-embeddés et l'index recréé si la
+dimension a changé. Le mode de retrieval ``global`` interroge ces résumés : coût par
+question constant, quelle que soit la taille du graphe.
+"""
+from __future__ import annotations
+import asyncio
+import random
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from db.generations import generations
+from knowledge.extraction_cache import sha256
+from settings import COMMUNITY_CFG
+
+_SUMMARY_PROMPT = """Tu analyses une communauté d'entités d'un graphe de connaissances immobilier
+(promoteur, projets, villes, types de biens, prix, standing, équipements).
+
+FAITS (sujet RELATION objet) :
+{facts}
+
+Rédige en français :
+- première ligne : un titre court (10 mots au plus), sans ponctuation finale ;
+- ensuite : un résumé factuel de 4 à 8 phrases (ce que regroupe la communauté, lieux,
+  gammes de prix et de surfaces, standings, points communs). N'invente rien.
+"""
+
+PROMPT_VERSION = sha256(_SUMMARY_PROMPT)[:16]
+
+
+def label_propagation(edges: Iterable[Tuple[str, str, float]], *, max_iter: int = 20, seed: int = 0,
+                      hub_degree: int | None = None) -> Dict[str, str]:
+    """{nœud: label} — propagation de labels pondérée, reproductible."""
+    adj: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for a, b, w in edges:
+        if a != b:
+            adj[a][b] += w
+            adj[b][a] += w
+    hubs = {n for n, nb in adj.items() if hub_degree is not None and len(nb) > hub_degree}
+    labels = {n: n for n in adj}
+    order = sorted(n for n in adj if n not in hubs)
+    rng = random.Random(seed)
+
+    def vote(n: str) -> str:
+        scores: Dict[str, float] = defaultdict(float)
+        for m, w in adj[n].items():
+            if m not in hubs:
+                scores[labels[m]] += w
+        if not scores:
+            return labels[n]
+        best = max(scores.values())
+        cands = sorted(lbl for lbl, s in scores.items() if s == best)
+        return labels[n] if labels[n] in cands else rng.choice(cands)
+
+    for _ in range(max_iter):
+        rng.shuffle(order)
+        changed = 0
+        for n in order:
+            new = vote(n)
+            if new != labels[n]:
+                labels[n] = new
+                changed += 1
+        if not changed:
+            break
+    for n in sorted(hubs):                      # les hubs suivent leurs voisins, sans les influencer
+        labels[n] = vote(n)
+    return labels
+
+
+def communities(labels: Dict[str, str], *, min_size: int = 1) -> List[List[str]]:
+    """Groupes de membres (triés), du plus grand au plus petit."""
+    groups: Dict[str, List[str]] = defaultdict(list)
+    for n, lbl in labels.items():
+        groups[lbl].append(n)
+    out = [sorted(g) for g in groups.values() if len(g) >= min_size]
+    return sorted(out, key=lambda g: (-len(g), g[0]))
+
+
+def community_id(keys: List[str]) -> str:
+    return sha256("\x1f".join(sorted(keys)))[:16]
+
+
+# ----------------------------------------------------------------------
+class CommunityJob:
+    def __init__(self, driver, database: str | None = None, *, llm=None, embedder=None,
+                 entity_label: str = "Entity", min_size: int | None = None, max_facts: int | None = None,
+                 concurrency: int | None = None, force: bool = False):
+        self.driver = driver
+        self.db = database
+        self._llm = llm
+        self.embedder = embedder          # EmbeddingManager : vecteurs des résumés (mode global)
+        self.entity_label = entity_label
+        self.min_size = COMMUNITY_CFG["min_size"] if min_size is None else min_size
+        self.max_facts = max_facts or COMMUNITY_CFG["max_facts"]
+        self.concurrency = max(1, concurrency or COMMUNITY_CFG["concurrency"])
+        self.force = force                # True : tous les résumés sont régénérés
+        self.job_id = uuid.uuid4().hex[:12]
+        self.state: Dict[str, Any] = {"job_id": self.job_id, "status": "pending", "phase": None,
+                                      "entities": 0, "communities": 0, "summarized": 0, "reused": 0,
+                                      "failed": 0, "error": None}
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            from langchain_google_genai import ChatGoogleGenerativeAI   # dépendance chargée à la demande
+            self._llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
+        return self._llm
+
+    # ------------------------------------------------------------------
+    def export(self) -> List[Tuple[str, str, float]]:
+        e = self.entity_label
+        with self.driver.session(database=self.db) as s:
+            rows = s.run(f"MATCH (a:{e})-[r]->(b:{e}) WHERE a.key IS NOT NULL AND b.key IS NOT NULL "
+                         f"RETURN a.key AS a, b.key AS b, count(r) AS w").data()
+        return [(r["a"], r["b"], float(r["w"])) for r in rows]
+
+    def detect(self, edges: List[Tuple[str, str, float]]) -> Dict[str, List[str]]:
+        labels = label_propagation(edges, max_iter=COMMUNITY_CFG["max_iter"],
+                                   hub_degree=COMMUNITY_CFG["hub_degree"])
+        self.state["entities"] = len(labels)
+        return {community_id(g): g for g in communities(labels, min_size=self.min_size)}
+
+    def _existing(self) -> Dict[str, Dict[str, Any]]:
+        """{id: {prompt, embed_model, title, summary}} des communautés déjà résumées."""
+        with self.driver.session(database=self.db) as s:
+            rows = s.run("MATCH (c:Community) WHERE c.summary IS NOT NULL RETURN c.id AS id, c.prompt AS prompt, "
+                         "c.embed_model AS embed_model, c.title AS title, c.summary AS summary").data()
+        return {r["id"]: r for r in rows}
+
+    def _facts(self, keys: List[str]) -> List[str]:
+        """Faits sortants des membres (entités les plus connectées d'abord)."""
+        e = self.entity_label
+        q = (f"UNWIND $keys AS k MATCH (a:{e} {{key: k}})-[r]->(b:{e}) "
+             f"WITH a, r, b, COUNT {{ (a)--() }} AS deg ORDER BY deg DESC, a.name LIMIT $n "
+             f"RETURN a.name AS s, type(r) AS rel, b.name AS o")
+        with self.driver.session(database=self.db) as s:
+            return [f"{r['s']} {r['rel']} {r['o']}" for r in s.run(q, keys=keys, n=self.max_facts).data()]
+
+    @staticmethod
+    def _parse(text: str) -> Tuple[str, str]:
+        lines = [l.strip() for l in text.strip().splitlines() if l.strip()]
+        if not lines:
+            return "", ""
+        return lines[0].strip("#*: "), " ".join(lines[1:]) or lines[0]
+
+    async def _summarize(self, cid: str, keys: List[str], sem: asyncio.Semaphore) -> Dict[str, Any] | None:
+        async with sem:
+            facts = await asyncio.to_thread(self._facts, keys)
+            try:
+                ans = await self.llm.ainvoke(_SUMMARY_PROMPT.format(facts="\n".join(facts)))
+            except Exception as e:                    # une communauté en échec n'arrête pas le job
+                self.state["failed"] += 1
+                print(f"Communauté {cid} : résumé en échec ({e})")
+                return None
+        title, summary = self._parse(ans.content if hasattr(ans, "content") else str(ans))
+        self.state["summarized"] += 1
+        return {"id": cid, "keys": keys, "size": len(keys), "title": title, "summary": summary,
+                "prompt": PROMPT_VERSION}
+
+    # ------------------------------------------------------------------
+    def _ensure_index(self, dim: int) -> None:
+        """Index vectoriel des résumés ; recréé si sa dimension n'est plus celle de l'embedder."""
+        name = COMMUNITY_CFG["index_name"]
+        with self.driver.session(database=self.db) as s:
+            row = s.run("SHOW VECTOR INDEXES YIELD name, options WHERE name = $name "
+                        "RETURN options.indexConfig['vector.dimensions'] AS dim", name=name).single()
+            if row is not None and row["dim"] != dim:
+                s.run(f"DROP INDEX `{name}` IF EXISTS").consume()
+            s.run(f"CREATE VECTOR INDEX `{name}` IF NOT EXISTS FOR (c:Community) ON (c.embedding) "
+                  f"OPTIONS {{ indexConfig: {{ `vector.dimensions`: {dim}, "
+                  f"`vector.similarity_function`: 'cosine' }} }}").consume()
+
+    def _write_tx(self, tx, rows: List[Dict[str, Any]], keep: List[str], ts: str) -> None:
+        """Une transaction : communautés disparues supprimées, nouvelles écrites et reliées."""
+        e = self.entity_label
+        tx.run("MATCH (c:Community) WHERE NOT c.id IN $keep DETACH DELETE c", keep=keep).consume()
+        tx.run("UNWIND $rows AS r MERGE (c:Community {id: r.id}) "
+               "SET c.title = r.title, c.summary = r.summary, c.size = r.size, c.prompt = r.prompt, "
+               "c.embedding = r.embedding, c.ts = $ts", rows=rows, ts=ts).consume()
+        tx.run(f"UNWIND $rows AS r MATCH (c:Community {{id: r.id}}) "
+               f"WITH c, r UNWIND r.keys AS k MATCH (n:{e} {{key: k}}) MERGE (n)-[:IN_COMMUNITY]->(c)",
+               rows=rows).consume()
+
+    def write(self, rows: List[Dict[str, Any]], keep: List[str], ts: str) -> None:
+        with self.driver.session(database=self.db) as s:
+            s.execute_write(self._write_tx, rows, keep, ts)
+
+    async def run(self) -> Dict[str, Any]:
+        try:
+            self.state.update(status="running", phase="export")
+            edges = await asyncio.to_thread(self.export)
+            self.state["phase"] = "detect"
+            found = self.detect(edges)
+            existing = {} if self.force else await asyncio.to_thread(self._existing)
+            todo = {cid: keys for cid, keys in found.items() if existing.get(cid, {}).get("prompt") != PROMPT_VERSION}
+            self.state.update(communities=len(found), reused=len(found) - len(todo), phase="summarize")
+            sem = asyncio.Semaphore(self.concurrency)
+            rows = [r for r in await asyncio.gather(*(self._summarize(c, k, sem) for c, k in todo.items())) if r]
+            model = getattr(self.embedder, "model_id", None)
+            if self.embedder is not None:
+                # résumés réutilisés mais embeddés par un autre modèle : ré-embeddés, sans LLM
+                stale = [{"id": cid, "keys": keys, "size": len(keys), "title": existing[cid]["title"],
+                          "summary": existing[cid]["summary"], "prompt": PROMPT_VERSION}
+                         for cid, keys in found.items()
+                         if cid not in todo and existing[cid].get("embed_model") != model]
+                self.state["reembedded"] = len(stale)
+                rows += stale
+            if rows and self.embedder is not None:
+                self.state["phase"] = "embed"
+                vecs = await asyncio.to_thread(self.embedder.embed_texts,
+                                               [f"{r['title']}\n{r['summary']}" for r in rows])
+                for r, v in zip(rows, vecs):
+                    r["embedding"], r["embed_model"] = [float(x) for x in v], model
+                await asyncio.to_thread(self._ensure_index, len(rows[0]["embedding"]))
+            self.state["phase"] = "write"
+            # communautés en échec : l'ancien résumé (s'il existe) est gardé jusqu'au prochain passage
+            keep = sorted(set(found) - set(todo) | {r["id"] for r in rows} |
+                          {c for c in todo if c in existing})
+            ts = datetime.now().isoformat(timespec="seconds")
+            await asyncio.to_thread(self.write, rows, keep, ts)
+            await asyncio.to_thread(generations.bump, kind="kg")   # invalide les résultats de retrieval en cache
+            self.state.update(status="done", phase=None, finished=ts)
+        except Exception as e:
+            self.state.update(status="failed", error=str(e))
+            print(f"Communautés {self.job_id} : échec en phase {self.state['phase']} ({e})")
+        return self.state
+
+
+# ---------------------- jobs en cours (process) ----------------------
+_jobs: Dict[str, CommunityJob] = {}
+
+
+def register_job(job: CommunityJob) -> CommunityJob:
+    _jobs[job.job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> CommunityJob | None:
+    return _jobs.get(job_id)
+
+
+def list_jobs() -> List[Dict[str, Any]]:
+    return [j.state for j in _jobs.values()]
@@ -0,0 +1,204 @@
+"""Résolution d'entités avant écriture : une clé canonique par entité réelle.
+
+« Casablanca », « casablanca », « CASABLANCA  », « Casa » et « الدار البيضاء » doivent
+aboutir au même nœud ``(:Entity {key: "casablanca"})``. Trois étapes :
+
+1. ``canonical_key`` : NFKD, suppression des accents / diacritiques arabes, variantes
+   d'alef / ya / ta marbouta, chiffres arabo-indiens, casse, ponctuation et espaces ;
+2. table d'alias (variantes connues FR / AR / EN des villes marocaines, extensible) ;
+3. rapprochement flou : les clés sont réparties en blocs (préfixe de 3 caractères) et
+   comparées par similarité de trigrammes (Jaccard) uniquement dans leur bloc. Deux clés
+   dont les nombres diffèrent (« Al Abrar 1 » / « Al Abrar 2 ») ne sont jamais fusionnées.
+
+Chaque résolution est mémorisée (carte d'alias en mémoire) : un nom déjà vu ne coûte
+qu'une recherche dans un dict, et l'écriture se réduit à un MERGE indexé sur ``key``.
+"""
+from __future__ import annotations
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from db.generations import generations
+from knowledge.numeric_normalizer import recompute
+from settings import KG_CFG
+
+_AR_MAP = str.maketrans({"ى": "ي", "ة": "ه", "ـ": None, "’": " ", "'": " "})
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+_DIGITS = re.compile(r"\d+")
+
+# variantes connues → forme de référence (comparées après canonical_key)
+DEFAULT_ALIASES: Dict[str, str] = {
+    "Casa": "Casablanca", "Dar El Beida": "Casablanca", "الدار البيضاء": "Casablanca", "كازا": "Casablanca",
+    "الرباط": "Rabat",
+    "Marrakesh": "Marrakech", "مراكش": "Marrakech",
+    "Fez": "Fès", "فاس": "Fès",
+    "Tangier": "Tanger", "Tangiers": "Tanger", "طنجة": "Tanger",
+    "أكادير": "Agadir",
+    "مكناس": "Meknès",
+    "القنيطرة": "Kénitra",
+    "المحمدية": "Mohammedia",
+    "مديونة": "Mediouna",
+    "تمارة": "Temara",
+    "سلا": "Salé",
+}
+
+
+def canonical_key(name: str) -> str:
+    """Clé de comparaison : « Fès » → « fes », « أكادير » → « اكادير », « CASA  blanca ! » → « casa blanca »."""
+    txt = unicodedata.normalize("NFKD", str(name or ""))
+    txt = "".join(c for c in txt if unicodedata.category(c) != "Mn")       # accents, harakat, hamza suscrite
+    txt = "".join(str(unicodedata.decimal(c)) if c.isdigit() else c for c in txt)   # ٣ → 3
+    txt = txt.translate(_AR_MAP).casefold()
+    return _NON_WORD.sub(" ", txt).strip()
+
+
+_DEFAULT_KEYS = {canonical_key(k): canonical_key(v) for k, v in DEFAULT_ALIASES.items()}
+
+
+def entity_key(name: str, aliases: Dict[str, str] | None = None) -> str:
+    """Clé canonique sans état (clé + alias connus, sans rapprochement flou) : requêtes de lecture."""
+    key = canonical_key(name)
+    return (aliases if aliases is not None else _DEFAULT_KEYS).get(key, key)
+
+
+def place_keys(text: str) -> List[str]:
+    """Villes connues (table d'alias, noms FR / AR / EN) citées dans un texte libre → clés canoniques."""
+    folded = f" {canonical_key(text)} "
+    return sorted({v for k, v in _DEFAULT_KEYS.items() if f" {k} " in folded or f" {v} " in folded})
+
+
+def _trigrams(key: str) -> set:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityResolver:
+    def __init__(self, *, aliases: Dict[str, str] | None = None, threshold: float | None = None,
+                 block_size: int = 3):
+        self.threshold = KG_CFG["entity_similarity"] if threshold is None else threshold
+        self.block_size = block_size
+        merged = {**DEFAULT_ALIASES, **(aliases or {})}
+        self.aliases = {canonical_key(k): canonical_key(v) for k, v in merged.items()}
+        self._labels = {canonical_key(v): v for v in merged.values()}   # libellé de la forme de référence
+        self._names: Dict[str, str] = {}                  # clé → libellé affiché (premier vu)
+        self._grams: Dict[str, set] = {}
+        self._blocks: Dict[str, set] = defaultdict(set)
+        self._resolved: Dict[str, str] = {}               # clé brute → clé retenue (carte d'alias)
+        self.stats = {"exact": 0, "alias": 0, "fuzzy": 0, "new": 0}
+
+    # ------------------------------------------------------------------
+    def _block(self, key: str) -> str:
+        return key.replace(" ", "")[: self.block_size]
+
+    def _register(self, key: str, name: str) -> None:
+        if key in self._names:
+            return
+        self._names[key] = name
+        self._grams[key] = _trigrams(key)
+        self._blocks[self._block(key)].add(key)
+
+    def _fuzzy(self, key: str) -> str | None:
+        grams, digits = _trigrams(key), _DIGITS.findall(key)
+        best, best_score = None, self.threshold
+        for cand in self._blocks.get(self._block(key), ()):
+            if _DIGITS.findall(cand) != digits:
+                continue
+            other = self._grams[cand]
+            score = len(grams & other) / len(grams | other)
+            if score >= best_score:
+                best, best_score = cand, score
+        return best
+
+    # ------------------------------------------------------------------
+    def load(self, entities: Iterable[Tuple[str | None, str]]) -> None:
+        """Entités existantes (key, name) ; sans clé (données antérieures), la clé est recalculée."""
+        for key, name in entities:
+            if name:
+                self._register(key or canonical_key(name), name)
+
+    def resolve(self, name: str) -> Tuple[str, str]:
+        """→ (clé canonique, libellé du nœud). Clé vide si le nom n'a aucun caractère utile."""
+        raw = canonical_key(name)
+        if not raw:
+            return "", ""
+        if raw in self._resolved:
+            key = self._resolved[raw]
+            self.stats["exact"] += 1
+            return key, self._names[key]
+        key = self.aliases.get(raw, raw)
+        if key != raw:
+            self.stats["alias"] += 1
+        elif key not in self._names and (match := self._fuzzy(key)) is not None:
+            key = match
+            self.stats["fuzzy"] += 1
+        elif key in self._names:
+            self.stats["exact"] += 1
+        else:
+            self.stats["new"] += 1
+        if key not in self._names:
+            self._register(key, self._labels.get(key) or str(name).strip())
+        self._resolved[raw] = key
+        return key, self._names[key]
+
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_neo4j(cls, driver, database: str | None = None, *, label: str = "Entity", **kwargs) -> "EntityResolver":
+        resolver = cls(**kwargs)
+        with driver.session(database=database) as s:
+            rows = s.run(f"MATCH (e:{label}) RETURN e.key AS key, e.name AS name").data()
+        resolver.load((r["key"], r["name"]) for r in rows)
+        return resolver
+
+    @staticmethod
+    def _merge_into_tx(tx, keep: str, dups: List[str], key: str, name: str) -> None:
+        """Une transaction : relations des doublons recréées sur le nœud conservé — propriétés
+        copiées (celles du conservé priment), ``chunks`` (provenance) fusionnés — puis
+        doublons supprimés, propriétés numériques recalculées et clé posée."""
+        for dup in dups:
+            rels = tx.run("MATCH (d)-[r]-(m) WHERE elementId(d) = $d "
+                          "RETURN type(r) AS type, elementId(m) AS m, startNode(r) = d AS out, "
+                          "properties(r) AS props", d=dup).data()
+            by_type: Dict[Tuple[str, bool], List[Dict]] = defaultdict(list)
+            for rel in rels:
+                props = dict(rel["props"] or {})
+                chunks = props.pop("chunks", None)
+                by_type[(re.sub(r"[^A-Za-z0-9_]", "_", rel["type"]), rel["out"])].append(
+                    {"m": keep if rel["m"] == dup else rel["m"], "props": props, "chunks": chunks})
+            for (rtype, out), rows in by_type.items():
+                pattern = f"(k)-[x:`{rtype}`]->(m)" if out else f"(m)-[x:`{rtype}`]->(k)"
+                tx.run(f"UNWIND $rows AS r MATCH (k), (m) WHERE elementId(k) = $k AND elementId(m) = r.m "
+                       f"MERGE {pattern} "
+                       f"WITH x, r, properties(x) AS old SET x += r.props SET x += old "
+                       f"SET x.chunks = CASE WHEN r.chunks IS NULL THEN x.chunks ELSE "
+                       f"reduce(acc = coalesce(x.chunks, []), c IN r.chunks | "
+                       f"CASE WHEN c IN acc THEN acc ELSE acc + c END) END",
+                       rows=rows, k=keep).consume()
+            tx.run("MATCH (d) WHERE elementId(d) = $d DETACH DELETE d", d=dup).consume()
+        tx.run(f"MATCH (k) WHERE elementId(k) = $k SET k.key = $key, k.name = $name {recompute('k')}",
+               k=keep, key=key, name=name).consume()
+
+    def backfill(self, driver, database: str | None = None, *, label: str = "Entity") -> Dict[str, int]:
+        """Migration : pose ``key`` sur les entités existantes et fusionne les doublons.
+
+        Une transaction gérée par clé (``_merge_into_tx``) : les relations d'un doublon
+        sont recréées sur le nœud conservé avec leurs propriétés (une requête par type :
+        un type ne se paramètre pas en Cypher) avant sa suppression.
+        """
+        with driver.session(database=database) as s:
+            rows = s.run(f"MATCH (e:{label}) RETURN elementId(e) AS eid, e.name AS name, "
+                         f"COUNT {{ (e)--() }} AS degree ORDER BY degree DESC").data()
+        groups: Dict[str, List[str]] = defaultdict(list)
+        for r in rows:                                 # le plus connecté devient le nœud conservé
+            key, _ = self.resolve(r["name"] or "")
+            if key:
+                groups[key].append(r["eid"])
+        stats = {"keyed": 0, "merged": 0}
+        with driver.session(database=database) as s:
+            for key, eids in groups.items():
+                s.execute_write(self._merge_into_tx, eids[0], eids[1:], key, self._names[key])
+                stats["merged"] += len(eids) - 1
+                stats["keyed"] += 1
+        if stats["keyed"]:
+            generations.bump(kind="kg")           # invalide les résultats de retrieval en cache
+        return stats
@@ -0,0 +1,133 @@
+"""Cache persistant (SQLite) des triplets extraits par le LLM.
+
+Clé : (hash du chunk, hash du template de prompt, modèle, température). Les triplets
+d'un groupe de chunks sont rangés chunk par chunk (``GraphBuilder.aextract_chunks``) :
+une reconstruction du KG sur des chunks inchangés ne rappelle donc pas le LLM, même si
+le regroupement a changé ; modifier
+``GraphBuilder._PROMPT`` change le hash du prompt, les anciennes entrées ne sont plus
+lues (``purge_stale`` les supprime).
+"""
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from settings import EXTRACTION_CACHE_CFG
+
+
+def sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS extraction (
+        key          TEXT PRIMARY KEY,
+        text_hash    TEXT NOT NULL,
+        prompt_hash  TEXT NOT NULL,
+        model        TEXT NOT NULL,
+        temperature  REAL,
+        triplets     TEXT NOT NULL,
+        created      TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS extraction_prompt ON extraction (prompt_hash);
+    CREATE INDEX IF NOT EXISTS extraction_text ON extraction (text_hash);
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # une connexion partagée (extractions concurrentes via threads / boucle async) + verrou
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self._SCHEMA)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def key(text: str, *, prompt_hash: str, model: str, temperature: float | None) -> str:
+        return sha256("\x1f".join([sha256(text), prompt_hash, model, repr(temperature)]))
+
+    def get(self, text: str, *, prompt_hash: str, model: str, temperature: float | None) -> List[Dict] | None:
+        k = self.key(text, prompt_hash=prompt_hash, model=model, temperature=temperature)
+        with self._lock:
+            row = self._conn.execute("SELECT triplets FROM extraction WHERE key = ?", (k,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest(self, text: str, *, prompt_hash: str | None = None) -> Tuple[List[Dict], str] | None:
+        """(triplets, prompt_hash) de l'extraction la plus récente du chunk, tous modèles confondus."""
+        q, args = "SELECT triplets, prompt_hash FROM extraction WHERE text_hash = ?", [sha256(text)]
+        if prompt_hash is not None:
+            q += " AND prompt_hash = ?"; args.append(prompt_hash)
+        with self._lock:
+            row = self._conn.execute(q + " ORDER BY created DESC LIMIT 1", args).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def put(self, text: str, triplets: List[Dict], *, prompt_hash: str, model: str,
+            temperature: float | None) -> None:
+        k = self.key(text, prompt_hash=prompt_hash, model=model, temperature=temperature)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extraction VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (k, sha256(text), prompt_hash, model, temperature,
+                 json.dumps(triplets, ensure_ascii=False), datetime.now().isoformat(timespec="seconds")))
+
+    # ------------------------------------------------------------------
+    def invalidate(self, *, prompt_hash: str | None = None, model: str | None = None) -> int:
+        """Supprime les entrées d'un prompt et/ou d'un modèle (tout si aucun critère)."""
+        where, args = [], []
+        if prompt_hash is not None:
+            where.append("prompt_hash = ?"); args.append(prompt_hash)
+        if model is not None:
+            where.append("model = ?"); args.append(model)
+        q = "DELETE FROM extraction" + (" WHERE " + " AND ".join(where) if where else "")
+        with self._lock, self._conn:
+            return self._conn.execute(q, args).rowcount
+
+    def purge_stale(self, prompt_hash: str) -> int:
+        """Supprime les entrées produites par d'autres versions du prompt."""
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM extraction WHERE prompt_hash <> ?", (prompt_hash,)).rowcount
+
+    def iter_triplets(self, *, prompt_hash: str | None = None, batch: int = 1000) -> Iterator[Dict]:
+        """Tous les triplets en cache (d'une version de prompt) : source pour l'export bulk.
+
+        Lecture en flux par paquets de *batch* lignes sur une connexion dédiée (WAL : lecteurs
+        concurrents), sans bloquer les extractions qui partagent la connexion principale."""
+        q, args = "SELECT triplets FROM extraction", ()
+        if prompt_hash is not None:
+            q, args = q + " WHERE prompt_hash = ?", (prompt_hash,)
+        conn = sqlite3.connect(self.path)
+        try:
+            cur = conn.execute(q, args)
+            while rows := cur.fetchmany(batch):
+                for (payload,) in rows:
+                    yield from json.loads(payload)
+        finally:
+            conn.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT prompt_hash, model, count(*) FROM extraction GROUP BY prompt_hash, model").fetchall()
+        return {"entries": sum(r[2] for r in rows),
+                "by_prompt": [{"prompt_hash": p, "model": m, "entries": n} for p, m, n in rows]}
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+# ----------------------------------------------------------------------
+_cache: ExtractionCache | None = None
+
+
+def get_extraction_cache() -> ExtractionCache | None:
+    """Cache partagé du processus (None si désactivé dans EXTRACTION_CACHE_CFG)."""
+    global _cache
+    if _cache is None and EXTRACTION_CACHE_CFG["enabled"]:
+        _cache = ExtractionCache(EXTRACTION_CACHE_CFG["path"])
+    return _cache
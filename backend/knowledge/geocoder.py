@@ -0,0 +1,143 @@
+"""Géocodage hors ligne des lieux et projets du KG (gazetteer embarqué, aucun appel réseau).
+
+1. Lieux : une entité dont la clé canonique est le nom (ou un alias FR / AR / EN) d'une
+   ville ou d'un quartier du gazetteer (``gazetteer_ma.json``) reçoit ``location`` (point
+   WGS-84), ``geo_kind`` (city / district), ``geo_place`` et ``geo_source = "gazetteer"`` ;
+2. Projets / biens : une entité reliée par ``LOCATED_IN`` (un ou deux sauts) à un lieu
+   géocodé hérite de son point — le quartier prime sur la ville — avec
+   ``geo_source = "located_in"``. Une entité qui n'a plus de tel lien perd son point.
+
+L'index POINT ``entity_location`` (``SchemaBootstrap``) sert les recherches par rayon et
+les « N plus proches » du ``Retriever`` (``point.distance``). ``proximity`` lit ces
+demandes dans une question (« près de Mediouna », « à moins de 10 km de Bouskoura »).
+"""
+from __future__ import annotations
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List
+
+from db.generations import generations
+from knowledge.entity_resolver import canonical_key
+from knowledge.numeric_normalizer import fold
+from settings import GEO_CFG
+
+
+class Gazetteer:
+    def __init__(self, places: List[Dict[str, Any]]):
+        self.places = places
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        for p in places:
+            for name in (p["name"], *p.get("aliases", ())):
+                key = canonical_key(name)
+                # un quartier n'écrase pas une ville homonyme
+                if key and (key not in self._keys or self._keys[key]["kind"] == "district"):
+                    self._keys[key] = p
+        self._max_words = max((len(k.split()) for k in self._keys), default=1)
+
+    @classmethod
+    def load(cls, path: str | Path | None = None) -> "Gazetteer":
+        data = json.loads(Path(path or GEO_CFG["gazetteer"]).read_text(encoding="utf-8"))
+        return cls(data["places"])
+
+    def lookup(self, name: str) -> Dict[str, Any] | None:
+        """Lieu dont le nom (ou un alias) a exactement cette clé canonique."""
+        return self._keys.get(canonical_key(name))
+
+    def find(self, text: str) -> List[Dict[str, Any]]:
+        """Lieux cités dans un texte libre, dans l'ordre du texte ; le nom le plus long
+        l'emporte (« Casa Anfa » n'est pas aussi « Casa »)."""
+        words = canonical_key(text).split()
+        taken, found = set(), {}
+        for n in range(min(self._max_words, len(words)), 0, -1):
+            for i in range(len(words) - n + 1):
+                span = set(range(i, i + n))
+                p = self._keys.get(" ".join(words[i:i + n]))
+                if p is not None and not span & taken:
+                    taken |= span
+                    found.setdefault(id(p), (i, p))
+        return [p for _, p in sorted(found.values(), key=lambda x: x[0])]
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Une ligne par clé (alias inclus) : paramètres de l'écriture des lieux."""
+        return [{"key": k, "name": p["name"], "kind": p["kind"], "lat": p["lat"], "lon": p["lon"]}
+                for k, p in sorted(self._keys.items())]
+
+
+_gazetteer: Gazetteer | None = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """Gazetteer partagé (GEO_CFG), chargé au premier usage."""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.load()
+    return _gazetteer
+
+
+# ----------------------------------------------------------------------
+class Geocoder:
+    def __init__(self, driver, database: str | None = None, *, gazetteer: Gazetteer | None = None,
+                 entity_label: str = "Entity"):
+        self.driver = driver
+        self.db = database
+        self.gazetteer = gazetteer or get_gazetteer()
+        self.entity_label = entity_label
+
+    def _run_tx(self, tx, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        e = self.entity_label
+        places = tx.run(f"UNWIND $rows AS r MATCH (n:{e} {{key: r.key}}) "
+                        f"SET n.location = point({{latitude: r.lat, longitude: r.lon}}), n.geo_kind = r.kind, "
+                        f"n.geo_place = r.name, n.geo_source = 'gazetteer' RETURN count(n) AS n", rows=rows).single()
+        # lien LOCATED_IN retiré depuis le dernier passage : point hérité supprimé
+        tx.run(f"MATCH (p:{e}) WHERE p.geo_source = 'located_in' "
+               f"AND NOT EXISTS {{ (p)-[:LOCATED_IN*1..2]->(:{e} {{geo_source: 'gazetteer'}}) }} "
+               f"REMOVE p.location, p.geo_place, p.geo_source").consume()
+        located = tx.run(f"MATCH path = (p:{e})-[:LOCATED_IN*1..2]->(l:{e} {{geo_source: 'gazetteer'}}) "
+                         f"WHERE coalesce(p.geo_source, 'located_in') = 'located_in' "
+                         f"WITH p, l ORDER BY length(path), CASE l.geo_kind WHEN 'district' THEN 0 ELSE 1 END "
+                         f"WITH p, collect(l)[0] AS l "
+                         f"SET p.location = l.location, p.geo_place = l.geo_place, p.geo_source = 'located_in' "
+                         f"RETURN count(p) AS n").single()
+        return {"places": places["n"], "located": located["n"]}
+
+    def run(self) -> Dict[str, int]:
+        """Géocode les lieux connus puis propage leur point le long de LOCATED_IN (idempotent)."""
+        with self.driver.session(database=self.db) as s:
+            stats = s.execute_write(self._run_tx, self.gazetteer.rows())
+        if stats["places"] or stats["located"]:
+            generations.bump(kind="kg")           # invalide les résultats de retrieval en cache
+        return stats
+
+
+# ----------------------------------------------------------------------
+# Lecture : demandes de proximité dans une question
+# ----------------------------------------------------------------------
+_NEAR = re.compile(r"(?<!\w)(?:pres d|proche d|a proximite d|autour d|aux alentours d|du cote d|"
+                   r"near|close to|around|nearby|بالقرب من|قريب من|قرب|بجوار)(.+)")
+_RADIUS = re.compile(r"(?<!\w)(?:a moins de|dans un rayon de|within|في حدود|على بعد)\s*(\d+(?:[.,]\d+)?)\s*"
+                     r"(?:km|kilometres?|كلم|كم)(?!\w)(.+)")
+_NEAREST = re.compile(r"(?<!\w)(\d{1,2})\s+(?:\S+\s+){0,3}?(?:les |the )?(?:plus proches?|nearest|closest|الاقرب)")
+
+
+def proximity(question: str, gazetteer: Gazetteer | None = None) -> Dict[str, Any] | None:
+    """{place, radius_km, limit} — « projets près de Mediouna » → rayon GEO_CFG autour de
+    Mediouna ; « à moins de 10 km de Bouskoura » → 10 km ; « les 5 projets les plus proches
+    de Temara » → 5 résultats dans GEO_CFG["max_radius_km"]. None sans lieu reconnu."""
+    q = fold(question)
+    nearest = _NEAREST.search(q)
+    m = _RADIUS.search(q)
+    if m:
+        radius, tail = float(m.group(1).replace(",", ".")), m.group(2)
+    elif (m := _NEAR.search(q)) is not None:
+        radius, tail = GEO_CFG["radius_km"], m.group(1)
+    elif nearest is not None:
+        radius, tail = GEO_CFG["max_radius_km"], q[nearest.end():]
+    else:
+        return None
+    if nearest is not None and not _RADIUS.search(q):
+        radius = GEO_CFG["max_radius_km"]
+    places = (gazetteer or get_gazetteer()).find(tail)
+    if not places:
+        return None
+    return {"place": places[0], "radius_km": radius, "limit": int(nearest.group(1)) if nearest else None}
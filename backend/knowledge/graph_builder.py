@@ -3,19 +3,13 @@
 """
 from __future__ import annotations
 from typing import List, ClassVar, Pattern
-import json, os, re
+import asyncio, json, os, re
 from langchain.prompts import PromptTemplate
 from langchain.schema import BaseOutputParser
 
-# -------------------------------------------------------------------
-class _Triplet:
-    def __init__(self, subject: str, relation: str, object_: str):
-        self.subject = subject
-        self.relation = relation
-        self.object = object_
-
-    def __repr__(self):
-        return f"<_Triplet {self.subject}-{self.relation}->{self.object}>"
+from knowledge.entity_resolver import canonical_key
+from knowledge.extraction_cache import ExtractionCache, get_extraction_cache, sha256
+from knowledge.triplet import _Triplet
 
 # -------------------------------------------------------------------
 class _JSONTripletParser(BaseOutputParser):
@@ -172,9 +166,10 @@ class GraphBuilder:
     # )
 
 
-    def __init__(self, *, provider: str = "gemini", llm=None, **kwargs):
+    def __init__(self, *, provider: str = "gemini", llm=None, cache: ExtractionCache | None = None, **kwargs):
         """llm : objet LangChain LLM (ex. ChatOpenAI, ChatGoogleGenerativeAI…).
         S’il est None, on instancie ChatOpenAI avec OPENAI_API_KEY.
+        cache : cache persistant des triplets (défaut : cache partagé, EXTRACTION_CACHE_CFG).
         """
         if llm is None:
             from langchain_google_genai import ChatGoogleGenerativeAI
@@ -183,13 +178,84 @@ class GraphBuilder:
                                             temperature=kwargs.get("temperature", 0))
         self.llm = llm
         self.parser = _JSONTripletParser()
+        self.cache = cache if cache is not None else get_extraction_cache()
 
     # ------------------------------------------------------------------
-    def extract_relations(self, text: str) -> List[_Triplet]:
+    @classmethod
+    def prompt_hash(cls) -> str:
+        """Change dès que le template est modifié → les entrées du cache ne sont plus lues."""
+        return sha256(cls._PROMPT.template)[:16]
+
+    def _cache_args(self) -> dict:
+        model = getattr(self.llm, "model", None) or getattr(self.llm, "model_name", None) or type(self.llm).__name__
+        return {"prompt_hash": self.prompt_hash(), "model": str(model),
+                "temperature": getattr(self.llm, "temperature", None)}
+
+    def _cached(self, text: str) -> List[_Triplet] | None:
+        if self.cache is None:
+            return None
+        rows = self.cache.get(text, **self._cache_args())
+        return None if rows is None else [_Triplet(r["subject"], r["relation"], r["object"]) for r in rows]
+
+    def _remember(self, text: str, triplets: List[_Triplet]) -> None:
+        if self.cache is not None:
+            rows = [{"subject": t.subject, "relation": t.relation, "object": t.object} for t in triplets]
+            self.cache.put(text, rows, **self._cache_args())
+
+    @staticmethod
+    def split_by_chunk(chunks: List[str], triplets: List[_Triplet]) -> List[List[_Triplet]]:
+        """Triplets d'un groupe → triplets de chaque chunk : les chunks qui citent le sujet et
+        l'objet, à défaut le sujet, à défaut l'objet ; un triplet cité nulle part (nom reformulé)
+        va à tous les chunks du groupe, comme la provenance de ``KGWriteBuffer``."""
+        folded = [f" {canonical_key(c)} " for c in chunks]
+        parts: List[List[_Triplet]] = [[] for _ in chunks]
+        for t in triplets:
+            s, o = f" {canonical_key(t.subject)} ", f" {canonical_key(t.object)} "
+            cite_s = {i for i, text in enumerate(folded) if s.strip() and s in text}
+            cite_o = {i for i, text in enumerate(folded) if o.strip() and o in text}
+            for i in sorted((cite_s & cite_o) or cite_s or cite_o or range(len(chunks))):
+                parts[i].append(t)
+        return parts
+
+    # ------------------------------------------------------------------
+    def _invoke(self, text: str) -> List[_Triplet]:
         print(f"Texte envoyé au LLM : {text}")
         prompt = self._PROMPT.format(passage=text)
         print(f"Prompt généré : {prompt}")
         response = self.llm.invoke(prompt) if callable(getattr(self.llm, "invoke", None)) else self.llm(prompt)
         txt = response.content if hasattr(response, "content") else str(response)
         print(f"Réponse du LLM : {txt}")
-        return self.parser.parse(txt)
\ No newline at end of file
+        return self.parser.parse(txt)
+
+    async def _ainvoke(self, text: str) -> List[_Triplet]:
+        prompt = self._PROMPT.format(passage=text)
+        if callable(getattr(self.llm, "ainvoke", None)):
+            response = await self.llm.ainvoke(prompt)
+        else:                                   # LLM sans API async : thread dédié
+            response = await asyncio.to_thread(
+                lambda: self.llm.invoke(prompt) if callable(getattr(self.llm, "invoke", None)) else self.llm(prompt))
+        txt = response.content if hasattr(response, "content") else str(response)
+        print(f"Extraction LLM : {len(text)} caractères → {len(txt)} caractères de réponse")
+        return self.parser.parse(txt)
+
+    def extract_relations(self, text: str) -> List[_Triplet]:
+        if (cached := self._cached(text)) is not None:
+            return cached
+        triplets = self._invoke(text)
+        self._remember(text, triplets)
+        return triplets
+
+    async def aextract_relations(self, text: str) -> List[_Triplet]:
+        """Version asynchrone (``ainvoke``) : plusieurs extractions partagent la boucle d'événements."""
+        return await self.aextract_chunks([text])
+
+    async def aextract_chunks(self, chunks: List[str]) -> List[_Triplet]:
+        """Groupe de chunks (``KGBuilder``) : le cache est lu et alimenté chunk par chunk, seuls les
+        chunks absents partent au LLM, en un prompt. Un regroupement différent des mêmes chunks
+        (taille d'un chunk modifiée) ne rappelle donc pas le LLM."""
+        cached = [self._cached(c) for c in chunks]
+        missing = [c for c, hit in zip(chunks, cached) if hit is None]
+        fresh = await self._ainvoke("\n".join(missing)) if missing else []
+        for chunk, part in zip(missing, self.split_by_chunk(missing, fresh)):
+            self._remember(chunk, part)
+        return [t for hit in cached if hit for t in hit] + fresh
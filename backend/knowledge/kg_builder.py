@@ -1,19 +1,30 @@
 """Extraction rapide triplets (LLM) -> Neo4j."""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 from embedding.vector_store import Neo4jVectorManager
 from knowledge.graph_builder import GraphBuilder
-from knowledge.schema_manager import GraphSchemaManager
+from knowledge.schema_manager import GraphSchemaManager, SchemaBootstrap
+from knowledge.kg_writer import KGWriteBuffer
+from knowledge.entity_resolver import EntityResolver
+from knowledge.kg_state import KGBuildState
+from db.async_session import run_read
+from db.generations import generations
+from settings import KG_CFG
 from pathlib import Path
-from typing import List, Dict
+from typing import Callable, List, Dict
 import os
+import time
 
 class KGBuilder:
-    def __init__(self, *, driver, database: str, llm, schema_manager, extracted_dir=None):
+    def __init__(self, *, driver, database: str, llm, schema_manager, extracted_dir=None, async_driver=None):
         from pathlib import Path
         self.driver = driver
+        self.async_driver = async_driver      # requis pour les méthodes a* (routes FastAPI)
         self.db     = database                # <- mémoriser la base cible
         self.chain = llm
         self.schema_mgr = schema_manager
+        self._resolver: EntityResolver | None = None
         # self.extracted_dir = Path(extracted_dir)      # <-- changement majeur
         self.extracted_dir = extracted_dir or os.path.join(os.path.dirname(__file__), '..', 'data', 'chunks')
         # self.chunks_root: Path = Path("data/chunks")
@@ -32,20 +43,21 @@ class KGBuilder:
         return [p.read_text(encoding="utf-8") for p in files]
 
     # ------------------------------------------------------------------
+    def resolver(self) -> EntityResolver:
+        """Résolveur d'entités amorcé une fois avec les entités déjà présentes dans la base."""
+        if self._resolver is None:
+            self._resolver = EntityResolver.from_neo4j(self.driver, self.db)
+        return self._resolver
+
+    def write_buffer(self, **kwargs) -> KGWriteBuffer:
+        """Tampon d'écriture sur la base configurée (types de relation validés, entités résolues, lots, retry)."""
+        kwargs.setdefault("resolver", self.resolver())
+        return KGWriteBuffer(self.driver, self.db, **kwargs)
+
     def build_from_text(self, text: str) -> int:
         triplets = self.chain.extract_relations(text)
-        cypher_tmpl = """
-        UNWIND $rows AS r
-        MERGE (s:Entity {name:r.s})
-        MERGE (o:Entity {name:r.o})
-        MERGE (s)-[:`%s`]->(o)
-        """
-        rows = [{"s": t.subject, "o": t.object, "rel": t.relation} for t in triplets]
-        with self.driver.session() as s:
-            for rel in {r["rel"] for r in rows}:
-                s.run(cypher_tmpl % rel.upper(),
-                      rows=[r for r in rows if r["rel"] == rel])
-        return len(triplets)
+        with self.write_buffer() as buf:
+            return buf.add(triplets)
     
     # ------------------------------------------------------------------
     def build_from_series(self, series_version: str) -> dict:
@@ -53,7 +65,14 @@ class KGBuilder:
         Construit le KG à partir des chunks au lieu du fichier texte d'origine.
         """
         texts = self._load_series_texts(series_version)
-        return self.build_from_chunks(texts)
+        SchemaBootstrap(self.driver, self.db).ensure()    # MERGE sur Entity.key → index unique
+        return self.build_from_chunks(texts, series=series_version)
+
+    async def abuild_from_series(self, series_version: str, **kwargs) -> dict:
+        """Version asynchrone : lecture des chunks / bootstrap hors boucle, extraction concurrente."""
+        texts = await asyncio.to_thread(self._load_series_texts, series_version)
+        await asyncio.to_thread(SchemaBootstrap(self.driver, self.db).ensure)
+        return await self.abuild_from_chunks(texts, series=series_version, **kwargs)
     
     # def build_from_series(self, series_version: str) -> dict:
     #     series_version = f"serie_{series_version}"
@@ -75,30 +94,230 @@ class KGBuilder:
         # return {"triplets_created": triplets, "files_used": [p.name for p in txt_files]}
 
     # ------------------------------------------------------------------
-    def build_from_chunks(self, chunks: list[str]) -> dict:
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Approximation sans tokenizer : ~4 caractères par token."""
+        return len(text) // 4 + 1
+
+    @classmethod
+    def group_indices(cls, chunks: List[str], max_tokens: int) -> List[List[int]]:
+        """Regroupe les positions des chunks consécutifs tant que le groupe reste sous
+        *max_tokens* (un chunk plus gros que la limite forme son propre groupe)."""
+        groups, current, size = [], [], 0
+        for i, chunk in enumerate(chunks):
+            if not chunk.strip():
+                continue
+            n = cls.estimate_tokens(chunk)
+            if current and size + n > max_tokens:
+                groups.append(current)
+                current, size = [], 0
+            current.append(i)
+            size += n
+        if current:
+            groups.append(current)
+        return groups
+
+    @classmethod
+    def group_chunks(cls, chunks: List[str], max_tokens: int) -> List[List[str]]:
+        return [[chunks[i] for i in g] for g in cls.group_indices(chunks, max_tokens)]
+
+    @staticmethod
+    def chunk_ids(series: str, n: int) -> List[str]:
+        """Ids des chunks d'une série : mêmes ids que ``EmbeddingPipeline.run_from_series``."""
+        return [f"{series}-{i:06d}" for i in range(1, n + 1)]
+
+    def build_from_chunks(self, chunks: list[str], *, series: str | None = None, incremental: bool = True) -> dict:
         """
         Construit le KG à partir des chunks au lieu du fichier texte d'origine.
+        Pendant synchrone de :meth:`abuild_from_chunks`. Appelé depuis une boucle d'événements
+        active (handler FastAPI, notebook), la coroutine tourne dans un thread dédié — la
+        boucle appelante reste bloquée jusqu'à la fin : en code asynchrone, ``await
+        abuild_from_chunks(...)``.
         """
-        full_text = "\n".join(chunks)
-        if not full_text.strip():
-            raise ValueError("Input text for relation extraction is empty.")
-        
-        triplets = self.build_from_text(full_text)
-        return {"triplets_created": triplets, "chunks_used": len(chunks)}
-                
-    # ------------------------------------------------------------------
-    def check_kg_exists(self) -> bool:
+        coro = self.abuild_from_chunks(chunks, series=series, incremental=incremental)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:                    # pas de boucle : cas normal (script, thread de travail)
+            return asyncio.run(coro)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+
+    def _prompt_version(self) -> str:
+        """Version du prompt d'extraction (hash du template) : un changement invalide l'état des chunks."""
+        fn = getattr(self.chain, "prompt_hash", None)
+        return str(fn()) if callable(fn) else ""
+
+    async def _plan(self, chunks: List[str], ids: List[str], series: str) -> tuple:
+        """Delta incrémental → (positions à extraire, empreintes, ids déjà extraits à retirer, ids disparus)."""
+        state = KGBuildState(self.driver, self.db)
+        hashes = [Neo4jVectorManager.content_hash(t) for t in chunks]
+        prompt = self._prompt_version()
+        known = await asyncio.to_thread(state.load, ids)
+        todo = [i for i, t in enumerate(chunks)
+                if t.strip() and known.get(ids[i]) != (hashes[i], prompt, "done")]
+        gone = await asyncio.to_thread(state.stale_ids, series, ids)
+        # chunks modifiés (ou extraits avec un autre prompt) : provenance retirée avec leurs nouveaux triplets
+        changed = {ids[i] for i in todo if ids[i] in known}
+        return todo, hashes, changed, gone
+
+    def _apply_rules(self, chunks: List[str], todo: List[int], ids: List[str] | None, hashes: List[str] | None,
+                     changed: set, prompt: str, buf: KGWriteBuffer, marks: List[dict]) -> set:
+        """Chunks traités sans LLM (si la chaîne expose ``try_rules``) → positions traitées."""
+        try_rules = getattr(self.chain, "try_rules", None)
+        if not callable(try_rules):
+            return set()
+        ruled = set()
+        for i in todo:
+            if not chunks[i].strip() or (triplets := try_rules(chunks[i])) is None:
+                continue
+            if ids and ids[i] in changed:
+                buf.retract([ids[i]])
+            buf.add(triplets, chunks={ids[i]: chunks[i]} if ids else None)
+            ruled.add(i)
+            if ids and hashes is not None:
+                marks.append({"id": ids[i], "hash": hashes[i], "prompt": prompt, "status": "done"})
+        return ruled
+
+    async def abuild_from_chunks(self, chunks: list[str], *, series: str | None = None,
+                                 concurrency: int | None = None, max_tokens: int | None = None,
+                                 incremental: bool = True, token_budget: int | None = None,
+                                 cancel=None, on_progress: Callable[[dict], None] | None = None) -> dict:
         """
-        Retourne True si **au moins un nœud du KG** est présent
-        dans la base configurée.
+        Extraction par groupes de chunks bornés en tokens (jamais un prompt géant) :
+        les groupes partent en parallèle (sémaphore), les triplets sont dédupliqués
+        et écrits au fil des réponses. Avec *series*, chaque entité est reliée aux
+        chunks qui la citent (MENTIONS) et chaque relation porte ses chunks sources ;
+        en mode *incremental*, seuls les chunks nouveaux ou modifiés sont extraits.
+        Si la chaîne est un ``ExtractionRouter``, les chunks structurés sont extraits par
+        règles avant le regroupement : seul le texte libre part au LLM.
+
+        Tous les ``checkpoint_groups`` groupes terminés, le tampon est écrit et l'état des
+        chunks marqué : une reprise repart de là. L'ancienne provenance d'un chunk n'est
+        retirée qu'avec ses nouveaux triplets : un groupe en échec ou non lancé la garde. Au-delà de *token_budget* (tokens de
+        prompt estimés) ou après ``cancel.set()``, les groupes restants ne sont pas lancés.
+        *on_progress* reçoit un instantané à chaque point de reprise.
+
+        Avec *series*, les chunks doivent déjà être ingérés (``Chunk`` en base : état et
+        provenance y sont portés) ; sinon ``ValueError``.
         """
-        cypher = """
+        if not any(c.strip() for c in chunks):
+            raise ValueError("Input text for relation extraction is empty.")
+        ids = self.chunk_ids(series, len(chunks)) if series else None
+        if ids and (missing := await asyncio.to_thread(KGBuildState(self.driver, self.db).missing, ids)):
+            raise ValueError(f"Série {series} : {len(missing)} chunk(s) absent(s) de la base (ex. {missing[0]}) ; "
+                             f"ingérer la série (/create-idx) avant de construire le KG")
+        todo, hashes, changed, gone = list(range(len(chunks))), None, set(), []
+        if ids and incremental:
+            todo, hashes, changed, gone = await self._plan(chunks, ids, series)
+        elif ids:                               # passe complète : toute la provenance de la série est refaite
+            hashes = [Neo4jVectorManager.content_hash(t) for t in chunks]
+            state = KGBuildState(self.driver, self.db)
+            gone = await asyncio.to_thread(state.stale_ids, series, ids)
+            changed = set(ids)
+        pending = set(todo)
+        prompt = self._prompt_version()
+        buf = await asyncio.to_thread(self.write_buffer)    # amorçage du résolveur : lecture Neo4j
+        # chunks disparus (et, en passe complète, vidés) : rien à réextraire, retrait au premier flush
+        buf.retract(gone + [ids[i] for i in todo if not chunks[i].strip()] if ids else [], clear=gone)
+        marks: List[dict] = []
+        # voie rapide : chunks structurés (JSON, CSV, « clé : valeur ») extraits par règles, sans LLM
+        ruled = await asyncio.to_thread(self._apply_rules, chunks, todo, ids, hashes, changed, prompt, buf, marks)
+        work = [c if i in pending and i not in ruled else "" for i, c in enumerate(chunks)]   # positions (ids) conservées
+        groups = self.group_indices(work, max_tokens or KG_CFG["group_max_tokens"])
+        sem = asyncio.Semaphore(max(1, concurrency or KG_CFG["extract_concurrency"]))
+        per_chunk = getattr(self.chain, "aextract_chunks", None)
+        stats = {"tokens": 0, "chunks_done": len(ruled), "started": time.monotonic()}
+
+        async def extract(i: int, group: List[int]):
+            async with sem:
+                if (cancel is not None and cancel.is_set()) or \
+                        (token_budget is not None and stats["tokens"] >= token_budget):
+                    return i, None, None        # non lancé : repris au prochain passage
+                text = "\n".join(chunks[j] for j in group)
+                stats["tokens"] += self.estimate_tokens(text)
+                try:
+                    if callable(per_chunk):     # cache d'extraction par chunk (regroupement stable)
+                        return i, await per_chunk([chunks[j] for j in group]), None
+                    return i, await self.chain.aextract_relations(text), None
+                except Exception as e:          # un groupe en échec n'arrête pas la série
+                    return i, [], e
+
+        failed, skipped = [], []
+        state = KGBuildState(self.driver, self.db)
+
+        def snapshot() -> dict:
+            total = sum(map(len, groups)) + len(ruled)
+            elapsed = time.monotonic() - stats["started"]
+            rate = stats["chunks_done"] / elapsed if elapsed and stats["chunks_done"] else None
+            return {"chunks_total": total, "chunks_done": stats["chunks_done"],
+                    "triplets": buf.stats["written"], "tokens": stats["tokens"],
+                    "elapsed": round(elapsed, 1),
+                    "eta": round((total - stats["chunks_done"]) / rate, 1) if rate else None}
+
+        async def checkpoint() -> None:
+            # triplets d'abord, état des chunks ensuite : un chunk « done » est toujours en base
+            await asyncio.to_thread(buf.flush)
+            if hashes is not None and marks:
+                await asyncio.to_thread(state.mark, list(marks))
+            marks.clear()
+            if on_progress is not None:
+                on_progress(snapshot())
+
+        every = max(1, KG_CFG["checkpoint_groups"])
+        tasks = [asyncio.create_task(extract(i, g)) for i, g in enumerate(groups)]
+        for n, done in enumerate(asyncio.as_completed(tasks), 1):
+            i, triplets, err = await done
+            if triplets is None:
+                skipped.append(i)
+                continue
+            if err is not None:
+                failed.append(i)
+                print(f"KG : groupe {i + 1}/{len(groups)} en échec ({err})")
+            else:
+                if ids:                         # ancienne provenance retirée dans le flush des nouveaux triplets
+                    buf.retract([ids[j] for j in groups[i] if ids[j] in changed])
+                # dédoublonnage (clés canoniques) et provenance dans le tampon ;
+                # add() vide le tampon au-delà de write_batch_size : hors de la boucle d'événements
+                sources = {ids[j]: chunks[j] for j in groups[i]} if ids else None
+                await asyncio.to_thread(buf.add, triplets, chunks=sources)
+            stats["chunks_done"] += len(groups[i])
+            if ids:
+                marks.extend({"id": ids[j], "hash": hashes[j], "prompt": prompt,
+                              "status": "failed" if err is not None else "done"} for j in groups[i])
+            if n % every == 0:
+                await checkpoint()
+        await checkpoint()
+        written, retracted = buf.stats["written"], buf.stats["retracted"]
+        if written or retracted:
+            await asyncio.to_thread(generations.bump, series, kind="kg")   # invalide les résultats de retrieval en cache
+        return {"triplets_created": written, "chunks_used": len(chunks),
+                "chunks_extracted": stats["chunks_done"], "chunks_skipped": len(chunks) - len(pending),
+                "chunks_retracted": retracted, "tokens_spent": stats["tokens"],
+                "chunks_rules": len(ruled), "rule_fraction": round(len(ruled) / len(todo), 3) if todo else None,
+                "groups": len(groups), "failed_groups": sorted(failed), "deferred_groups": sorted(skipped),
+                "complete": not skipped,
+                "rejected": buf.stats["rejected"], "flushes": buf.stats["flushes"]}
+
+    # ------------------------------------------------------------------
+    _KG_EXISTS = """
         MATCH (n)
         WHERE any(lbl IN labels(n)            // Option : filtrer vos labels KG
                   WHERE lbl IN ['Chunk','Entity','Document'])
         RETURN COUNT(n) > 0 AS exists
         """
+
+    def check_kg_exists(self) -> bool:
+        """
+        Retourne True si **au moins un nœud du KG** est présent
+        dans la base configurée.
+        """
+        cypher = self._KG_EXISTS
         with self.driver.session(database=self.db) as s:   # <- session sur Addoha2
             return s.run(cypher).single()["exists"]
+
+    async def acheck_kg_exists(self) -> bool:
+        """Version asynchrone de :meth:`check_kg_exists`."""
+        rows = await run_read(self.async_driver, self.db, self._KG_EXISTS)
+        return rows[0]["exists"]
     
     
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""Jobs de construction du KG avec points de reprise.
+
+Un job = une série traitée par ``KGBuilder.abuild_from_series`` en mode incrémental.
+À chaque point de reprise, les triplets sont écrits puis l'état des chunks est marqué
+dans le graphe (``kg_state``) ; le fichier JSON du job (``KG_CFG["jobs_dir"]``, écrit de
+façon atomique) garde les paramètres et la progression cumulée. Une reprise — après un
+échec, un budget épuisé ou un redémarrage du processus — relance la même série : les
+chunks déjà marqués sont sautés, seul le reste est extrait.
+
+Un job terminé avec des groupes en échec finit en ``done_with_errors`` (pas ``done``) :
+ses chunks sont marqués ``failed`` et une reprise les réextrait.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+from settings import KG_CFG
+
+TERMINAL = {"done", "done_with_errors", "failed", "cancelled", "budget_exhausted"}
+
+
+class KGBuildJob:
+    def __init__(self, builder, series: str, *, concurrency: int | None = None,
+                 token_budget: int | None = None, job_dir: str | Path | None = None,
+                 job_id: str | None = None):
+        self.builder = builder            # KGBuilder (driver / LLM de la requête)
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.path = Path(job_dir or KG_CFG["jobs_dir"]) / f"{self.job_id}.json"
+        self.cancel_event = threading.Event()
+        self.state: Dict[str, Any] = {
+            "job_id": self.job_id, "series": series, "status": "pending",
+            "concurrency": concurrency, "token_budget": token_budget,
+            "chunks_total": None, "chunks_done": 0, "triplets": 0, "tokens": 0, "eta": None,
+            "runs": 0, "error": None, "created": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    # ------------------------------------------------------------------
+    def save(self) -> None:
+        """Écriture atomique : fichier temporaire puis ``os.replace`` (jamais de JSON tronqué)."""
+        self.state["updated"] = datetime.now().isoformat(timespec="seconds")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(self.state, ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def load(cls, builder, path: str | Path) -> "KGBuildJob":
+        path = Path(path)
+        state = json.loads(path.read_text(encoding="utf-8"))
+        job = cls(builder, state["series"], concurrency=state.get("concurrency"),
+                  token_budget=state.get("token_budget"), job_dir=path.parent, job_id=state["job_id"])
+        job.state.update(state)
+        if job.state["status"] == "running":        # processus arrêté en cours de job
+            job.state["status"] = "interrupted"
+        return job
+
+    # ------------------------------------------------------------------
+    def _on_progress(self, snap: Dict[str, Any], base: Dict[str, int]) -> None:
+        self.state.update(chunks_total=base["chunks_done"] + snap["chunks_total"],
+                          chunks_done=base["chunks_done"] + snap["chunks_done"],
+                          triplets=base["triplets"] + snap["triplets"],
+                          tokens=base["tokens"] + snap["tokens"], eta=snap["eta"])
+        self.save()
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    async def run(self, *, token_budget: int | None = None) -> Dict[str, Any]:
+        """Exécute (ou reprend) le job ; *token_budget* remplace le budget total enregistré."""
+        if token_budget is not None:
+            self.state["token_budget"] = token_budget
+        budget = self.state["token_budget"]
+        base = {k: self.state[k] for k in ("chunks_done", "triplets", "tokens")}
+        remaining = None if budget is None else max(0, budget - base["tokens"])
+        self.cancel_event.clear()
+        self.state.update(status="running", error=None, runs=self.state["runs"] + 1)
+        self.save()
+        try:
+            out = await self.builder.abuild_from_series(
+                self.state["series"], concurrency=self.state["concurrency"], token_budget=remaining,
+                cancel=self.cancel_event, on_progress=lambda snap: self._on_progress(snap, base))
+            if out["complete"]:
+                status = "done_with_errors" if out["failed_groups"] else "done"
+            else:
+                status = "cancelled" if self.cancel_event.is_set() else "budget_exhausted"
+            self.state.update(status=status, eta=None, failed_groups=len(out["failed_groups"]),
+                              chunks_rules=out.get("chunks_rules"), rule_fraction=out.get("rule_fraction"),
+                              chunks_skipped=out["chunks_skipped"], chunks_retracted=out["chunks_retracted"])
+        except Exception as e:
+            self.state.update(status="failed", error=str(e))
+            print(f"KG job {self.job_id} : échec ({e})")
+        self.save()
+        return self.state
+
+
+# ---------------------- jobs du processus ----------------------
+_jobs: Dict[str, KGBuildJob] = {}
+
+
+def register_job(job: KGBuildJob) -> KGBuildJob:
+    _jobs[job.job_id] = job
+    return job
+
+
+def get_job(job_id: str) -> KGBuildJob | None:
+    return _jobs.get(job_id)
+
+
+def list_jobs(job_dir: str | Path | None = None) -> List[Dict[str, Any]]:
+    """Jobs en mémoire + jobs connus seulement par leur fichier (processus précédent)."""
+    states = {j.job_id: j.state for j in _jobs.values()}
+    for path in sorted(Path(job_dir or KG_CFG["jobs_dir"]).glob("*.json")):
+        if path.stem not in states:
+            state = json.loads(path.read_text(encoding="utf-8"))
+            if state.get("status") == "running":     # interrompu par un redémarrage
+                state["status"] = "interrupted"
+            states[path.stem] = state
+    return list(states.values())
+
+
+def load_job(builder, job_id: str, job_dir: str | Path | None = None) -> KGBuildJob | None:
+    """Job du registre, sinon rechargé depuis son point de reprise (et réenregistré)."""
+    job = _jobs.get(job_id)
+    if job is not None:
+        job.builder = builder
+        return job
+    path = Path(job_dir or KG_CFG["jobs_dir"]) / f"{job_id}.json"
+    return register_job(KGBuildJob.load(builder, path)) if path.exists() else None
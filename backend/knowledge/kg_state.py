@@ -0,0 +1,90 @@
+"""État de construction du KG par chunk, porté par les nœuds ``Chunk``.
+
+Propriétés : ``kg_hash`` (empreinte du texte extrait), ``kg_prompt`` (version du prompt
+d'extraction), ``kg_status`` (done / failed) et ``kg_ts``. Un chunk dont l'empreinte et
+la version de prompt n'ont pas changé depuis une extraction réussie n'est pas retraité.
+
+Retrait de provenance (chunk modifié ou disparu) : ses MENTIONS sont supprimées, son id
+est retiré des listes ``r.chunks`` ; une relation qui n'est plus attestée par aucun chunk
+est supprimée, de même qu'une entité devenue isolée. Les propriétés numériques typées
+des entités touchées sont recalculées depuis les relations restantes. Pendant une
+construction, le retrait passe par ``KGWriteBuffer.retract`` : il est écrit dans la même
+transaction que les nouveaux triplets du chunk.
+
+L'état n'est posé que sur les chunks déjà ingérés (MATCH) : aucun nœud vide n'est créé.
+``KGBuilder`` refuse donc une série dont les chunks ne sont pas en base (``missing``) —
+sinon chaque construction « incrémentale » réextrairait silencieusement toute la série.
+"""
+from __future__ import annotations
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from knowledge.numeric_normalizer import recompute
+
+
+class KGBuildState:
+    def __init__(self, driver, database: str | None = None, *, chunk_label: str = "Chunk",
+                 entity_label: str = "Entity"):
+        self.driver = driver
+        self.db = database
+        self.chunk_label = chunk_label
+        self.entity_label = entity_label
+
+    # ------------------------------------------------------------------
+    def load(self, ids: List[str]) -> Dict[str, Tuple[str, str, str]]:
+        """{id: (kg_hash, kg_prompt, kg_status)} des chunks déjà traités."""
+        q = (f"UNWIND $ids AS cid MATCH (c:{self.chunk_label} {{id: cid}}) WHERE c.kg_hash IS NOT NULL "
+             f"RETURN c.id AS id, c.kg_hash AS hash, c.kg_prompt AS prompt, c.kg_status AS status")
+        with self.driver.session(database=self.db) as s:
+            rows = s.run(q, ids=ids).data()
+        return {r["id"]: (r["hash"], r["prompt"], r["status"]) for r in rows}
+
+    def missing(self, ids: List[str]) -> List[str]:
+        """Ids sans nœud ``Chunk`` (série non ingérée) : ni état ni provenance possibles."""
+        q = (f"UNWIND $ids AS cid OPTIONAL MATCH (c:{self.chunk_label} {{id: cid}}) "
+             f"WITH cid, c WHERE c IS NULL RETURN cid AS id")
+        with self.driver.session(database=self.db) as s:
+            return [r["id"] for r in s.run(q, ids=ids).data()]
+
+    def stale_ids(self, series: str, ids: List[str]) -> List[str]:
+        """Chunks de la série traités auparavant mais absents de la version courante."""
+        q = (f"MATCH (c:{self.chunk_label}) WHERE c.id STARTS WITH $prefix AND c.kg_hash IS NOT NULL "
+             f"AND NOT c.id IN $ids RETURN c.id AS id")
+        with self.driver.session(database=self.db) as s:
+            return [r["id"] for r in s.run(q, prefix=f"{series}-", ids=ids).data()]
+
+    # ------------------------------------------------------------------
+    def _retract_tx(self, tx, ids: List[str], clear: List[str]) -> None:
+        c, e = self.chunk_label, self.entity_label
+        tx.run(f"MATCH (c:{c})-[:MENTIONS]->(n:{e}) WHERE c.id IN $ids "
+               f"MATCH (n)-[r]-(:{e}) WHERE any(x IN coalesce(r.chunks, []) WHERE x IN $ids) "
+               f"WITH DISTINCT r SET r.chunks = [x IN r.chunks WHERE NOT x IN $ids] "
+               f"WITH r WHERE size(r.chunks) = 0 DELETE r", ids=ids).consume()
+        tx.run(f"MATCH (c:{c})-[:MENTIONS]->(n:{e}) WHERE c.id IN $ids WITH DISTINCT n {recompute('n')}",
+               ids=ids).consume()
+        # entité isolée (l'appartenance à une communauté ne compte pas) : supprimée
+        tx.run(f"MATCH (c:{c})-[m:MENTIONS]->(n:{e}) WHERE c.id IN $ids DELETE m "
+               f"WITH DISTINCT n WHERE COUNT {{ (n)-[r]-() WHERE type(r) <> 'IN_COMMUNITY' }} = 0 "
+               f"DETACH DELETE n", ids=ids).consume()
+        if clear:
+            tx.run(f"MATCH (c:{c}) WHERE c.id IN $ids REMOVE c.kg_hash, c.kg_prompt, c.kg_status, c.kg_ts",
+                   ids=clear).consume()
+
+    def retract(self, ids: Iterable[str], *, clear: Iterable[str] = ()) -> int:
+        """Retire la provenance des chunks *ids* ; efface l'état de ceux de *clear* (disparus)."""
+        ids, clear = sorted(set(ids)), sorted(set(clear))
+        if not ids:
+            return 0
+        with self.driver.session(database=self.db) as s:
+            s.execute_write(self._retract_tx, ids, clear)
+        return len(ids)
+
+    def mark(self, rows: List[Dict[str, str]]) -> None:
+        """rows : [{id, hash, prompt, status}] — écrit après le flush des triplets correspondants."""
+        if not rows:
+            return
+        q = (f"UNWIND $rows AS r MATCH (c:{self.chunk_label} {{id: r.id}}) "
+             f"SET c.kg_hash = r.hash, c.kg_prompt = r.prompt, c.kg_status = r.status, c.kg_ts = $ts")
+        ts = datetime.now().isoformat(timespec="seconds")
+        with self.driver.session(database=self.db) as s:
+            s.execute_write(lambda tx: tx.run(q, rows=rows, ts=ts).consume())
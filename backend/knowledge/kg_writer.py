@@ -0,0 +1,191 @@
+"""Écriture des triplets du KG par lots, groupés par type de relation.
+
+Les triplets de nombreux chunks s'accumulent dans le tampon ; un ``flush`` écrit tout
+dans **une** transaction gérée (``execute_write``) sur la base configurée : une requête
+``UNWIND`` par type de relation présent, au lieu d'une session par appel et par type.
+Les types de relation sont validés / normalisés avant d'être insérés dans la requête
+(un type ne peut pas être paramétré en Cypher). Les interblocages entre écritures
+concurrentes (TransientError) sont rejoués avec backoff exponentiel.
+
+Les entités sont résolues avant écriture (``EntityResolver``) : le MERGE porte sur la
+clé canonique ``key`` (contrainte d'unicité), le nom affiché n'est posé qu'à la création.
+
+Provenance : quand les chunks d'origine sont fournis, chaque entité est reliée à ses
+chunks par ``(:Chunk)-[:MENTIONS]->(:Entity)`` et chaque relation porte la liste
+``chunks`` des ids qui l'attestent (dans la même transaction que les triplets). Seuls les
+chunks déjà ingérés sont reliés (MATCH) : aucun nœud ``Chunk`` vide n'est créé. Le retrait
+de l'ancienne provenance d'un chunk réextrait (``retract``) part dans la transaction qui
+écrit ses nouveaux triplets : le graphe n'est jamais privé de ses triplets entre les deux.
+
+Relations numériques (``HAS_PRICE``, ``HAS_SURFACE``, ``HAS_ROOM_COUNT``…) : la valeur est
+analysée avant écriture (``numeric_normalizer``) ; la relation porte ``value`` et le
+sujet la propriété typée indexée (``price_mad``, ``surface_m2``, ``rooms``).
+"""
+from __future__ import annotations
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Mapping, Sequence
+
+from embedding.batch_writer import is_retryable
+from knowledge.entity_resolver import EntityResolver, canonical_key
+from knowledge.kg_state import KGBuildState
+from knowledge.numeric_normalizer import NUMERIC_RELATIONS, normalize, subject_update
+from settings import KG_CFG
+
+_REL_TYPE = re.compile(r"^[A-Z][A-Z0-9_]{0,63}$")
+
+
+def normalize_rel_type(relation: str) -> str | None:
+    """« has price » / « Has-Price » → HAS_PRICE ; None si rien d'utilisable."""
+    rel = re.sub(r"[^A-Za-z0-9]+", "_", str(relation or "")).strip("_").upper()
+    return rel if _REL_TYPE.match(rel) else None
+
+
+class KGWriteBuffer:
+    def __init__(self, driver, database: str | None = None, *, entity_label: str = "Entity",
+                 chunk_label: str = "Chunk", batch_size: int | None = None, max_retries: int | None = None, backoff: float = 0.5,
+                 resolver: EntityResolver | None = None):
+        self.driver = driver
+        self.resolver = resolver or EntityResolver()
+        self.db = database
+        self.entity_label = entity_label
+        self.chunk_label = chunk_label
+        self.batch_size = max(1, batch_size or KG_CFG["write_batch_size"])
+        self.max_retries = KG_CFG["write_max_retries"] if max_retries is None else max_retries
+        self.backoff = backoff
+        self._rows: Dict[str, Dict[tuple, Dict[str, Any]]] = defaultdict(dict)   # type → (sk, ok) → ligne
+        self._mentions: set = set()                                             # (chunk id, clé d'entité)
+        self._retract: set = set()                                              # provenance à retirer
+        self._clear: set = set()                                                # chunks disparus
+        self.state = KGBuildState(driver, database, chunk_label=chunk_label, entity_label=entity_label)
+        self._pending = 0
+        self.stats = {"accepted": 0, "rejected": 0, "duplicates": 0, "written": 0,
+                      "flushes": 0, "retries": 0, "retracted": 0}
+
+    # ------------------------------------------------------------------
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self) -> int:
+        return self._pending
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _sources(key: str, chunks: Mapping[str, str] | Sequence[str] | None, folded: Dict[str, str]) -> List[str]:
+        """Chunks qui mentionnent l'entité : ceux dont le texte contient sa clé, sinon tous les
+        chunks fournis (le LLM a pu reformuler le nom)."""
+        if not chunks:
+            return []
+        if not isinstance(chunks, Mapping):
+            return list(chunks)
+        hits = [cid for cid, text in folded.items() if f" {key} " in text]
+        return hits or list(chunks)
+
+    def retract(self, ids: Iterable[str], *, clear: Iterable[str] = ()) -> None:
+        """Retire au prochain flush la provenance des chunks *ids*, avant l'écriture des triplets
+        en attente ; l'état des chunks de *clear* (disparus) est effacé."""
+        self._retract.update(ids)
+        self._clear.update(clear)
+
+    def add(self, triplets: Iterable[Any], *, chunks: Mapping[str, str] | Sequence[str] | None = None) -> int:
+        """Ajoute des triplets (objets subject / relation / object ou dicts) ; flush au-delà de batch_size.
+
+        chunks : ids des chunks d'origine (liste) ou {id: texte} pour attribuer chaque entité
+        aux seuls chunks qui la citent. Retourne le nombre de triplets acceptés (valides et
+        absents du tampon)."""
+        folded = {cid: f" {canonical_key(text)} " for cid, text in chunks.items()} if isinstance(chunks, Mapping) else {}
+        accepted = 0
+        for t in triplets:
+            get = t.get if isinstance(t, dict) else lambda k, t=t: getattr(t, k, None)
+            s, o = str(get("subject") or "").strip(), str(get("object") or get("object_") or "").strip()
+            rel = normalize_rel_type(get("relation"))
+            (sk, s), (ok, o) = self.resolver.resolve(s), self.resolver.resolve(o)
+            if not sk or not ok or rel is None:
+                self.stats["rejected"] += 1
+                continue
+            s_src, o_src = self._sources(sk, chunks, folded), self._sources(ok, chunks, folded)
+            self._mentions.update((cid, sk) for cid in s_src)
+            self._mentions.update((cid, ok) for cid in o_src)
+            cids = [c for c in s_src if c in o_src] or s_src + o_src   # chunks citant les deux, à défaut l'un
+            row = self._rows[rel].get((sk, ok))
+            if row is not None:               # déjà en attente : seule la provenance s'enrichit
+                row["cids"].update(cids)
+                self.stats["duplicates"] += 1
+                continue
+            row = {"sk": sk, "s": s, "ok": ok, "o": o, "cids": set(cids)}
+            if rel in NUMERIC_RELATIONS:
+                num = normalize(rel, o)
+                row["num"] = num[1] if num else None
+            self._rows[rel][(sk, ok)] = row
+            self._pending += 1
+            accepted += 1
+        self.stats["accepted"] += accepted
+        if self._pending >= self.batch_size:
+            self.flush()
+        return accepted
+
+    def _query(self, rel: str) -> str:
+        q = (f"UNWIND $rows AS r "
+             f"MERGE (s:{self.entity_label} {{key: r.sk}}) ON CREATE SET s.name = r.s "
+             f"MERGE (o:{self.entity_label} {{key: r.ok}}) ON CREATE SET o.name = r.o "
+             f"MERGE (s)-[rel:`{rel}`]->(o) "
+             f"SET rel.chunks = reduce(acc = coalesce(rel.chunks, []), c IN r.cids | "
+             f"CASE WHEN c IN acc THEN acc ELSE acc + c END)")
+        if rel in NUMERIC_RELATIONS:
+            q += f" SET rel.value = r.num {subject_update(NUMERIC_RELATIONS[rel])}"
+        return q
+
+    def _mentions_query(self) -> str:
+        return (f"UNWIND $rows AS r "
+                f"MATCH (c:{self.chunk_label} {{id: r.cid}}) "
+                f"WITH c, r MATCH (e:{self.entity_label} {{key: r.key}}) "
+                f"MERGE (c)-[:MENTIONS]->(e)")
+
+    def _write_tx(self, tx, groups: Dict[str, List[Dict[str, Any]]], mentions: List[Dict[str, str]],
+                  retract: List[str], clear: List[str]) -> None:
+        if retract:
+            self.state._retract_tx(tx, retract, clear)
+        for rel, rows in groups.items():
+            tx.run(self._query(rel), rows=rows).consume()
+        if mentions:
+            tx.run(self._mentions_query(), rows=mentions).consume()
+
+    def flush(self) -> int:
+        """Écrit le tampon dans une transaction ; retourne le nombre de triplets écrits."""
+        if not self._pending and not self._retract:
+            return 0
+        # ordre stable (type, sujet, objet) : les transactions concurrentes verrouillent
+        # les nœuds dans le même ordre → moins d'interblocages
+        groups = {rel: [{**r, "cids": sorted(r["cids"])} for _, r in sorted(rows.items())]
+                  for rel, rows in sorted(self._rows.items())}
+        mentions = [{"cid": c, "key": k} for c, k in sorted(self._mentions)]
+        retract, clear = sorted(self._retract), sorted(self._clear)
+        attempt = 0
+        while True:
+            try:
+                with self.driver.session(database=self.db) as s:
+                    s.execute_write(self._write_tx, groups, mentions, retract, clear)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                print(f"KG : flush de {self._pending} triplets, erreur transitoire ({e}), "
+                      f"tentative {attempt}/{self.max_retries}")
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+        n = self._pending
+        self._rows.clear()
+        self._mentions.clear()
+        self._retract.clear()
+        self._clear.clear()
+        self._pending = 0
+        self.stats["written"] += n
+        self.stats["retracted"] += len(retract)
+        self.stats["flushes"] += 1
+        return n
@@ -0,0 +1,222 @@
+"""Valeurs numériques typées (prix, surface, pièces) à partir des triplets extraits.
+
+Le LLM produit ``(Appartement F3)-[:HAS_PRICE]->(Entity {name: "1,2 M DH"})`` : la valeur
+n'est qu'un nom d'entité, inutilisable pour « moins de 1,2 M DH ». À l'écriture des
+triplets (``KGWriteBuffer``), l'objet des relations numériques est analysé (formats
+FR / AR, chiffres arabo-indiens, multiplicateurs k / M / مليون, unités DH / m² / pièces) :
+
+- la relation porte ``value`` (nombre, dans l'unité de référence) ;
+- le sujet porte la plus petite valeur de ses relations (« à partir de ») dans une
+  propriété typée — ``price_mad``, ``surface_m2``, ``rooms`` — couverte par un index
+  RANGE (``SchemaBootstrap``).
+
+``range_constraints`` lit les bornes d'une question (« moins de 1,2 M DH », « entre 60
+et 80 m² », « F3 ») : le ``Retriever`` en fait une recherche par plage sur ces index.
+"""
+from __future__ import annotations
+import re
+import unicodedata
+from typing import Dict, List, Tuple
+
+from db.generations import generations
+from ingestion.tabular_importer import to_number
+
+# relation → propriété typée portée par le sujet
+NUMERIC_RELATIONS: Dict[str, str] = {
+    "HAS_PRICE": "price_mad",
+    "HAS_SURFACE": "surface_m2",
+    "HAS_AREA": "surface_m2",
+    "HAS_ROOM_COUNT": "rooms",
+    "HAS_ROOMS": "rooms",
+}
+NUMERIC_PROPERTIES: Tuple[str, ...] = tuple(dict.fromkeys(NUMERIC_RELATIONS.values()))
+
+_AR_SEPARATORS = str.maketrans({"٫": ",", "٬": " ", " ": " ", " ": " "})
+_NUM = r"\d+(?:[ .,]\d{3})*(?:[.,]\d+)?"
+_MULT = r"k|mdhs?|millions?|milliards?|mille|m(?![2\w])|الف|الاف|مليون|ملايين"
+_MULTIPLIERS = {"k": 1e3, "mille": 1e3, "الف": 1e3, "الاف": 1e3, "m": 1e6, "mdh": 1e6, "mdhs": 1e6,
+                "million": 1e6, "millions": 1e6, "مليون": 1e6, "ملايين": 1e6,
+                "milliard": 1e9, "milliards": 1e9}
+_PRICE_UNIT = r"dhs?|mad|dirhams?|درهم"
+_SURFACE_UNIT = r"m2|metres? carres|متر مربع|م2|ha|hectares?"
+_ROOM_UNIT = r"pieces?|chambres?|rooms?|bedrooms?|غرف|غرفه"
+_AMOUNT = rf"({_NUM})\s*({_MULT})?\s*({_PRICE_UNIT}|{_SURFACE_UNIT}|{_ROOM_UNIT})?(?!\w)"
+
+
+def fold(text: str) -> str:
+    """Forme de comparaison : NFKD sans diacritiques (« m² » → « m2 », « أقل » → « اقل »),
+    chiffres arabo-indiens → ASCII, séparateurs arabes → « , » / espace, minuscules."""
+    txt = unicodedata.normalize("NFKD", str(text or "").translate(_AR_SEPARATORS))
+    txt = "".join(c for c in txt if unicodedata.category(c) != "Mn")
+    txt = "".join(str(unicodedata.decimal(c)) if c.isdigit() else c for c in txt)
+    return txt.replace("ة", "ه").casefold()
+
+
+def _number(raw: str, *, grouped: bool = True) -> float | None:
+    """« 250.000 » → 250000 (groupe de 3 chiffres = milliers, voir ``to_number``) sauf après
+    un multiplicateur ou pour une surface (« 1,250 M », « 65,500 m² ») : séparateur décimal."""
+    s = raw.replace(" ", "")
+    m = None if grouped else re.fullmatch(r"\d+([.,])\d+", s)
+    return to_number(s, decimal=m.group(1) if m else None)
+
+
+def _amount(num: str, mult: str | None) -> float | None:
+    value = _number(num, grouped=mult is None)
+    return None if value is None else value * _MULTIPLIERS.get(mult or "", 1.0)
+
+
+def parse_price(text: str) -> float | None:
+    """« 1,2 M DH » / « à partir de 850 000 dhs » / « ٢٥٠ ألف درهم » → montant en MAD."""
+    m = re.search(_AMOUNT, fold(text))
+    return _amount(m.group(1), m.group(2)) if m else None
+
+
+def parse_surface(text: str) -> float | None:
+    """« 65,5 m² » / « 120 متر مربع » / « 2 ha » → m²."""
+    m = re.search(_AMOUNT, fold(text))
+    if not m:
+        return None
+    value = _number(m.group(1), grouped=False)
+    if value is not None and (m.group(3) or "").startswith(("ha", "hectare")):
+        value *= 10_000
+    return value
+
+
+def parse_rooms(text: str) -> int | None:
+    """« F3 » / « T4 » / « 3 pièces » / « studio » → nombre de pièces."""
+    t = fold(text).strip()
+    if re.search(r"\bstudio\b|ستوديو", t):
+        return 1
+    m = re.search(r"\b[ft](\d{1,2})\b", t) or re.search(r"(?<!\d)(\d{1,2})(?!\d)", t)
+    return int(m.group(1)) if m and 0 < int(m.group(1)) <= 50 else None
+
+
+_PARSERS = {"price_mad": parse_price, "surface_m2": parse_surface, "rooms": parse_rooms}
+
+
+def normalize(relation: str, value: str) -> Tuple[str, float] | None:
+    """(propriété, nombre) pour une relation numérique, sinon None."""
+    prop = NUMERIC_RELATIONS.get(relation)
+    if prop is None:
+        return None
+    num = _PARSERS[prop](value)
+    return None if num is None else (prop, num)
+
+
+# ----------------------------------------------------------------------
+# Écriture : requêtes partagées par KGWriteBuffer / KGBuildState / backfill
+# ----------------------------------------------------------------------
+def _rel_types(prop: str) -> str:
+    return "|".join(r for r, p in NUMERIC_RELATIONS.items() if p == prop)
+
+
+def subject_update(prop: str, var: str = "s", num: str = "r.num") -> str:
+    """SET du minimum courant (une ligne = une valeur) ; ``num`` nul → inchangé."""
+    return (f"SET {var}.{prop} = CASE WHEN {num} IS NULL OR {var}.{prop} < {num} "
+            f"THEN {var}.{prop} ELSE {num} END")
+
+
+def recompute(var: str = "s") -> str:
+    """Recalcule les propriétés typées de *var* depuis ses relations (nul → propriété retirée)."""
+    sets = [f"{var}.{p} = COLLECT {{ MATCH ({var})-[x:{_rel_types(p)}]->() WHERE x.value IS NOT NULL "
+            f"RETURN x.value ORDER BY x.value LIMIT 1 }}[0]" for p in NUMERIC_PROPERTIES]
+    return "SET " + ", ".join(sets)
+
+
+class NumericNormalizer:
+    """Rattrapage des graphes construits avant la normalisation (ou après un changement d'analyseur)."""
+
+    def __init__(self, driver, database: str | None = None, *, entity_label: str = "Entity",
+                 batch_size: int = 5000):
+        self.driver = driver
+        self.db = database
+        self.entity_label = entity_label
+        self.batch_size = max(1, batch_size)
+
+    def backfill(self) -> Dict[str, int]:
+        e = self.entity_label
+        types = "|".join(NUMERIC_RELATIONS)
+        with self.driver.session(database=self.db) as s:
+            rows = s.run(f"MATCH (:{e})-[r:{types}]->(o:{e}) "
+                         f"RETURN elementId(r) AS rid, type(r) AS rel, o.name AS value").data()
+        parsed: List[Dict] = []
+        for r in rows:
+            hit = normalize(r["rel"], r["value"] or "")
+            parsed.append({"rid": r["rid"], "num": hit[1] if hit else None})
+        q = "UNWIND $rows AS x MATCH ()-[r]->() WHERE elementId(r) = x.rid SET r.value = x.num"
+        for i in range(0, len(parsed), self.batch_size):
+            with self.driver.session(database=self.db) as s:
+                s.execute_write(lambda tx, b=parsed[i:i + self.batch_size]: tx.run(q, rows=b).consume())
+        props = " OR ".join(f"s.{p} IS NOT NULL" for p in NUMERIC_PROPERTIES)
+        with self.driver.session(database=self.db) as s:
+            s.execute_write(lambda tx: tx.run(
+                f"MATCH (s:{e}) WHERE EXISTS {{ (s)-[:{types}]->() }} OR {props} {recompute('s')}").consume())
+        if parsed:
+            generations.bump(kind="kg")           # invalide les résultats de retrieval en cache
+        return {"relations": len(parsed), "parsed": sum(p["num"] is not None for p in parsed)}
+
+
+# ----------------------------------------------------------------------
+# Lecture : bornes numériques d'une question
+# ----------------------------------------------------------------------
+_LE = (r"moins de|moins d|inferieure? a|en dessous de|au dessous de|max(?:imum)?|jusqu.?a|pas plus de|"
+       r"under|below|less than|at most|up to|اقل من|لا يتجاوز|حتى")
+_GE = (r"plus de|au moins|min(?:imum)?|superieure? a|a partir de|over|above|more than|at least|"
+       r"اكثر من|على الاقل|ابتداء من")
+_BETWEEN = re.compile(rf"(?:entre|between|de|from|من|بين)\s+{_AMOUNT}\s*(?:et|and|a|to|-|ال[ىي]|و)\s*{_AMOUNT}")
+_BOUND = re.compile(rf"(?<!\w)({_LE}|{_GE})\s+{_AMOUNT}")
+_ROOMS_Q = re.compile(rf"\b[ft](\d{{1,2}})\b|(\d{{1,2}})\s*(?:{_ROOM_UNIT})(?!\w)")
+
+
+def _classify(num: str, mult: str | None, unit: str | None) -> Tuple[str, float] | None:
+    unit = unit or ""
+    if re.fullmatch(_ROOM_UNIT, unit):
+        value = _number(num, grouped=False)
+        return ("rooms", value) if value else None
+    if re.fullmatch(_SURFACE_UNIT, unit):
+        value = parse_surface(f"{num} {unit}")
+        return ("surface_m2", value) if value is not None else None
+    value = _amount(num, mult)
+    if value is None:
+        return None
+    if mult or re.fullmatch(_PRICE_UNIT, unit) or value >= 10_000:   # sans unité : un prix si ≥ 10 000
+        return "price_mad", value
+    return None
+
+
+def range_constraints(question: str) -> Dict[str, Tuple[float | None, float | None]]:
+    """{propriété: (min, max)} — « appartements de moins de 1,2 M DH à Casablanca » →
+    {"price_mad": (None, 1200000.0)} ; « F3 entre 60 et 80 m² » → rooms (3, 3), surface (60, 80)."""
+    q, out, taken = fold(question), {}, []
+
+    def put(prop: str, lo: float | None, hi: float | None) -> None:
+        old_lo, old_hi = out.get(prop, (None, None))
+        lo = lo if old_lo is None else old_lo if lo is None else max(lo, old_lo)
+        hi = hi if old_hi is None else old_hi if hi is None else min(hi, old_hi)
+        out[prop] = (lo, hi)
+
+    for m in _BETWEEN.finditer(q):
+        n1, m1, u1, n2, m2, u2 = m.groups()
+        hi = _classify(n2, m2, u2)
+        lo = _classify(n1, m1 or m2, u1 or u2)            # « entre 1 et 1,5 M DH » : unité partagée
+        if lo and hi and lo[0] == hi[0]:
+            put(lo[0], min(lo[1], hi[1]), max(lo[1], hi[1]))
+            taken.append(m.span())
+    for m in _BOUND.finditer(q):
+        if any(a <= m.start() < b for a, b in taken):
+            continue
+        op, num, mult, unit = m.groups()
+        hit = _classify(num, mult, unit)
+        if hit:
+            if re.fullmatch(_LE, op):
+                put(hit[0], None, hit[1])
+            else:
+                put(hit[0], hit[1], None)
+            taken.append(m.span())
+    if "rooms" not in out:
+        for m in _ROOMS_Q.finditer(q):
+            if not any(a <= m.start() < b for a, b in taken):
+                n = float(m.group(1) or m.group(2))
+                put("rooms", n, n)
+                break
+    return out
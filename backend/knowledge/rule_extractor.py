@@ -0,0 +1,262 @@
+"""Extraction déterministe des triplets pour les données structurées (sans LLM).
+
+Formats reconnus : objet / tableau JSON (y compris pseudo-JSON à guillemets simples),
+JSONL, CSV (sortie ``df.to_csv`` des tableurs, séparateur détecté) et blocs de lignes
+« clé : valeur ». Chaque enregistrement donne un sujet (champ nom / projet / type…)
+et une relation par champ : table des clés connues (FR / AR / EN), sinon déduite de la
+valeur (prix en DH, surface en m², nombre de pièces), sinon ``HAS_<CLÉ>``.
+
+``RuleExtractor.extract`` renvoie None dès que le texte n'est pas franchement
+structuré (phrases libres, champs descriptifs longs majoritaires, pas de sujet) :
+``ExtractionRouter`` l'envoie alors au LLM.
+"""
+from __future__ import annotations
+import ast
+import csv
+import io
+import json
+import re
+from typing import Any, Dict, List
+
+from knowledge.entity_resolver import canonical_key
+from knowledge.extraction_cache import sha256
+from knowledge.triplet import _Triplet
+
+RULES_VERSION = "1"           # à incrémenter quand les règles changent (invalide l'état KG des chunks)
+
+_FIELDS = {
+    "HAS_PRICE":            ("prix", "price", "tarif", "montant", "prix de vente", "a partir de",
+                             "سعر", "السعر", "ثمن", "الثمن"),
+    "HAS_SURFACE":          ("surface", "superficie", "surface habitable", "area", "m2",
+                             "مساحه", "المساحه"),
+    "HAS_ROOM_COUNT":       ("pieces", "nombre de pieces", "nb pieces", "chambres", "nb chambres",
+                             "rooms", "bedrooms", "غرف", "عدد الغرف"),
+    "LOCATED_IN":           ("ville", "city", "quartier", "district", "localisation", "location",
+                             "adresse", "zone", "المدينه", "الحي"),
+    "HAS_STANDING":         ("standing", "gamme", "categorie"),
+    "HAS_CONTACT_PHONE":    ("telephone", "tel", "phone", "gsm", "الهاتف"),
+    "HAS_EQUIPMENT":        ("equipement", "equipements", "equipment", "amenities", "prestations", "المرافق"),
+    "OFFERS_PROPERTY_TYPE": ("type", "typologie", "type de bien", "property type"),
+}
+_RELATIONS = {key: rel for rel, keys in _FIELDS.items() for key in keys}
+
+# champs portant le nom de l'enregistrement, par priorité
+_SUBJECT_KEYS = ("nom", "name", "projet", "project", "programme", "residence", "titre", "title",
+                 "bien", "المشروع", "الاسم", "type", "typologie")
+
+_PRICE = re.compile(r"\d[\d\s.,]*\s*(?:k|m|millions?)?\s*(?:dhs?|mad|dirhams?|درهم)\b", re.I)
+_SURFACE = re.compile(r"\d[\d.,]*\s*(?:m²|m2|mètres? carrés|متر مربع|م²)", re.I)
+_ROOMS = re.compile(r"^(?:[FT]\d{1,2}|\d{1,2}\s*(?:pièces?|pieces?|chambres?|rooms?|غرف))$", re.I)
+_KV_LINE = re.compile(r"^\s*[-•*]?\s*([^:=\n]{1,40}?)\s*[:=]\s*(\S.*)$")
+
+MAX_VALUE_CHARS = 120         # au-delà : texte descriptif, laissé au LLM
+
+
+def infer_relation(value: str) -> str | None:
+    """Relation déduite de la forme de la valeur (clé inconnue)."""
+    v = value.strip()
+    if _PRICE.fullmatch(v):
+        return "HAS_PRICE"
+    if _SURFACE.fullmatch(v):
+        return "HAS_SURFACE"
+    if _ROOMS.match(v):
+        return "HAS_ROOM_COUNT"
+    return None
+
+
+class RuleExtractor:
+    def __init__(self, *, min_kv_ratio: float = 0.6, max_free_ratio: float = 0.5):
+        self.min_kv_ratio = min_kv_ratio          # part minimale de lignes « clé : valeur »
+        self.max_free_ratio = max_free_ratio      # part maximale de texte libre dans un enregistrement
+
+    # ---------------------------------------------------------------- formats
+    @staticmethod
+    def _json(text: str) -> List[Dict] | None:
+        if text[0] not in "{[":
+            return None
+        for loads in (json.loads, ast.literal_eval):       # pseudo-JSON : guillemets simples
+            try:
+                data = loads(text)
+                break
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                continue
+        else:
+            return None
+        data = [data] if isinstance(data, dict) else data
+        if isinstance(data, list) and data and all(isinstance(d, dict) for d in data):
+            return data
+        return None
+
+    @staticmethod
+    def _jsonl(lines: List[str]) -> List[Dict] | None:
+        if len(lines) < 2 or not all(l.startswith("{") for l in lines):
+            return None
+        try:
+            records = [json.loads(l) for l in lines]
+        except ValueError:
+            return None
+        return records if all(isinstance(r, dict) for r in records) else None
+
+    @staticmethod
+    def _csv(lines: List[str]) -> List[Dict] | None:
+        if len(lines) < 2:
+            return None
+        try:
+            dialect = csv.Sniffer().sniff(lines[0], delimiters=",;\t|")
+        except csv.Error:
+            return None
+        rows = list(csv.reader(io.StringIO("\n".join(lines)), dialect))
+        header = [h.strip() for h in rows[0]]
+        if len(header) < 2 or any(not h or len(h) > 40 or len(h.split()) > 4 or h.replace(".", "").isdigit()
+                                  for h in header):
+            return None
+        if any(len(r) != len(header) for r in rows[1:]):
+            return None
+        return [dict(zip(header, r)) for r in rows[1:]]
+
+    def _kv_blocks(self, text: str) -> List[Dict] | None:
+        """Blocs séparés par une ligne vide ; une ligne d'en-tête sans « : » devient le sujet."""
+        records = []
+        for block in re.split(r"\n\s*\n", text):
+            lines = [l.strip() for l in block.splitlines() if l.strip()]
+            if not lines:
+                continue
+            pairs = [m.groups() for m in map(_KV_LINE.match, lines) if m]
+            free = [l for l in lines if not _KV_LINE.match(l)]
+            if len(pairs) < 2 or len(pairs) / len(lines) < self.min_kv_ratio:
+                return None
+            rec: Dict[str, Any] = {}
+            if free and not _KV_LINE.match(lines[0]) and len(lines[0]) <= MAX_VALUE_CHARS:
+                rec["__title__"] = lines[0].strip("#*: ")
+                free = free[1:]
+            if sum(map(len, free)) > self.max_free_ratio * sum(map(len, lines)):
+                return None
+            for k, v in pairs:
+                rec.setdefault(k, v)
+            records.append(rec)
+        return records or None
+
+    # ---------------------------------------------------------------- enregistrements
+    @staticmethod
+    def _subject(rec: Dict[str, Any]) -> tuple:
+        if "__title__" in rec:
+            return "__title__", rec["__title__"]
+        keys = {canonical_key(k): k for k in rec}
+        for sk in _SUBJECT_KEYS:
+            raw = keys.get(sk)
+            if raw is not None and isinstance(rec[raw], (str, int, float)) and str(rec[raw]).strip():
+                return raw, str(rec[raw]).strip()
+        return None, None
+
+    def _record(self, rec: Dict[str, Any], out: List[_Triplet]) -> str | None:
+        """Triplets d'un enregistrement (récursif pour les objets imbriqués) ; renvoie le sujet."""
+        skey, subject = self._subject(rec)
+        if subject is None:
+            return None
+        total = free = 0
+        for key, value in rec.items():
+            if key in (skey, "__title__"):
+                continue
+            ck = canonical_key(key)
+            for v in value if isinstance(value, list) else [value]:
+                if isinstance(v, dict):
+                    child = self._record(v, out)
+                    rel = self._key_relation(key)
+                    if child is not None and rel is not None:
+                        out.append(_Triplet(subject, rel, child))
+                    continue
+                if v is None or isinstance(v, (list, bool)) or not str(v).strip():
+                    continue
+                v = str(v).strip()
+                total += len(v)
+                if len(v) > MAX_VALUE_CHARS:
+                    free += len(v)
+                    continue
+                rel = _RELATIONS.get(ck) or infer_relation(v) or self._key_relation(key)
+                if rel is not None:
+                    out.append(_Triplet(subject, rel, v))
+        if total and free > self.max_free_ratio * total:
+            raise ValueError("enregistrement surtout descriptif")
+        return subject
+
+    @staticmethod
+    def _key_relation(key: str) -> str | None:
+        rel = re.sub(r"[^A-Za-z0-9]+", "_", canonical_key(key)).strip("_").upper()
+        return f"HAS_{rel}" if rel and rel[0].isalpha() and len(rel) <= 60 else None
+
+    # ----------------------------------------------------------------
+    def records(self, text: str) -> List[Dict] | None:
+        s = text.strip()
+        if not s:
+            return None
+        lines = [l.strip() for l in s.splitlines() if l.strip()]
+        return self._json(s) or self._jsonl(lines) or self._csv(lines) or self._kv_blocks(s)
+
+    def extract(self, text: str) -> List[_Triplet] | None:
+        """Triplets du texte structuré, ou None s'il doit passer par le LLM."""
+        records = self.records(text)
+        if records is None:
+            return None
+        out: List[_Triplet] = []
+        try:
+            subjects = [self._record(r, out) for r in records]
+        except ValueError:
+            return None
+        if any(s is None for s in subjects) or not out:
+            return None
+        return out
+
+
+# ----------------------------------------------------------------------
+def extraction_version(prompt_hash: str) -> str:
+    """Version d'extraction (``kg_prompt`` des chunks) pour un hash de prompt LLM + les règles."""
+    return sha256(f"{prompt_hash}\x1f{RULES_VERSION}")[:16]
+
+
+class ExtractionRouter:
+    """Même interface que ``GraphBuilder`` : règles d'abord, LLM seulement pour le texte libre.
+
+    ``KGBuilder`` appelle ``try_rules`` chunk par chunk avant de grouper le reste pour
+    le LLM ; ``stats`` compte les chunks traités par chaque voie.
+    """
+
+    def __init__(self, llm, *, rules: RuleExtractor | None = None):
+        self.llm = llm                    # GraphBuilder
+        self.rules = rules or RuleExtractor()
+        self.stats = {"chunks": 0, "rules": 0, "llm_calls": 0}
+
+    def prompt_hash(self) -> str:
+        """Version d'extraction : prompt LLM + version des règles."""
+        fn = getattr(self.llm, "prompt_hash", None)
+        return extraction_version(fn() if callable(fn) else "")
+
+    def try_rules(self, text: str) -> List[_Triplet] | None:
+        triplets = self.rules.extract(text)
+        self.stats["chunks"] += 1
+        if triplets is not None:
+            self.stats["rules"] += 1
+        return triplets
+
+    def report(self) -> Dict[str, Any]:
+        n = self.stats["chunks"]
+        return {**self.stats, "rule_fraction": round(self.stats["rules"] / n, 3) if n else None}
+
+    # ----------------------------------------------------------------
+    def extract_relations(self, text: str) -> List[_Triplet]:
+        if (triplets := self.try_rules(text)) is not None:
+            return triplets
+        self.stats["llm_calls"] += 1
+        return self.llm.extract_relations(text)
+
+    async def aextract_relations(self, text: str) -> List[_Triplet]:
+        """Appelé par KGBuilder sur les groupes déjà refusés par les règles : LLM direct."""
+        self.stats["llm_calls"] += 1
+        return await self.llm.aextract_relations(text)
+
+    async def aextract_chunks(self, chunks: List[str]) -> List[_Triplet]:
+        """Groupe de chunks : cache par chunk du ``GraphBuilder`` s'il l'expose."""
+        fn = getattr(self.llm, "aextract_chunks", None)
+        if not callable(fn):
+            return await self.aextract_relations("\n".join(chunks))
+        self.stats["llm_calls"] += 1
+        return await fn(chunks)
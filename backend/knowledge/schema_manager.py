@@ -1,3 +1,10 @@
+import re
+
+from settings import NEO4J_CFG
+from knowledge.entity_resolver import EntityResolver, canonical_key
+from knowledge.numeric_normalizer import NUMERIC_PROPERTIES
+
+
 class GraphSchemaManager:
     """Application ou suggestion de schémas (placeholder)."""
 
@@ -8,4 +15,103 @@ class GraphSchemaManager:
     @staticmethod
     def suggest_schema_from_text(text: str):
         # Renvoie un schema fictif – à remplacer par appel LLM
-        return {"label": "Document", "properties": ["text", "embedding"]}
\ No newline at end of file
+        return {"label": "Document", "properties": ["text", "embedding"]}
+
+class SchemaBootstrap:
+    """Crée, de façon idempotente, les contraintes / index qui portent les clés de MERGE.
+
+    Sans contrainte sur ``Chunk.id`` ni ``Entity.key``, chaque ``MERGE`` fait un
+    scan du label et l'ingestion ralentit à mesure que le graphe grandit.
+    Appelé au démarrage (lifespan) puis avant chaque ingestion ; ``ensure`` ne
+    rejoue les DDL qu'une fois par (driver, base) dans la vie du processus.
+    Un graphe antérieur aux clés canoniques (entités sans ``key`` mais dont le nom en
+    donne une) est d'abord migré (``EntityResolver.backfill``) : sinon chaque MERGE sur
+    ``key`` créerait un doublon à côté de l'ancien nœud. Une entité sans nom utile reste
+    sans clé et ne relance pas la migration.
+    L'index plein texte porte le nom et la propriété interrogés par ``Neo4jVectorManager``
+    (``NEO4J_CFG["fulltext_index"]`` / ``text_prop``).
+    """
+    _done: set = set()
+
+    def __init__(self, driver, database: str | None = None, *, chunk_label: str | None = None,
+                 entity_label: str = "Entity", text_prop: str = "text", fulltext_index: str | None = None,
+                 await_timeout: int = 300):
+        self.driver = driver
+        self.db = database
+        self.chunk_label = chunk_label or NEO4J_CFG["node_label"]
+        self.entity_label = entity_label
+        self.text_prop = text_prop
+        # même assainissement que Neo4jVectorManager._sanitize
+        self.fulltext_index = re.sub(r"[^A-Za-z0-9_]", "_", fulltext_index or NEO4J_CFG["fulltext_index"])
+        self.await_timeout = await_timeout
+
+    @classmethod
+    def for_store(cls, store, **kw) -> "SchemaBootstrap":
+        """Bootstrap aligné sur un ``Neo4jVectorManager`` (label, propriété texte, index plein texte)."""
+        return cls(store.driver, store.db, chunk_label=store.node_label, text_prop=store.text_prop,
+                   fulltext_index=store.fulltext_index, **kw)
+
+    # ------------------------------------------------------------------
+    def statements(self) -> dict:
+        """{nom: DDL} — le nom est aussi celui de l'index (les contraintes possèdent un index homonyme)."""
+        c, e, ft = self.chunk_label, self.entity_label, self.fulltext_index
+        return {
+            "chunk_id_unique":    f"CREATE CONSTRAINT chunk_id_unique IF NOT EXISTS FOR (n:{c}) REQUIRE n.id IS UNIQUE",
+            "entity_key_unique":  f"CREATE CONSTRAINT entity_key_unique IF NOT EXISTS FOR (n:{e}) REQUIRE n.key IS UNIQUE",
+            "community_id_unique": "CREATE CONSTRAINT community_id_unique IF NOT EXISTS FOR (n:Community) REQUIRE n.id IS UNIQUE",
+            "vector_alias_unique": "CREATE CONSTRAINT vector_alias_unique IF NOT EXISTS FOR (n:VectorIndexAlias) REQUIRE n.name IS UNIQUE",
+            "data_generation_unique": "CREATE CONSTRAINT data_generation_unique IF NOT EXISTS FOR (n:DataGeneration) REQUIRE n.scope IS UNIQUE",
+            "entity_name":        f"CREATE INDEX entity_name IF NOT EXISTS FOR (n:{e}) ON (n.name)",
+            "chunk_series":       f"CREATE INDEX chunk_series IF NOT EXISTS FOR (n:{c}) ON (n.series)",
+            "chunk_ingest_ts":    f"CREATE INDEX chunk_ingest_ts IF NOT EXISTS FOR (n:{c}) ON (n.ingest_ts)",
+            "chunk_content_hash": f"CREATE INDEX chunk_content_hash IF NOT EXISTS FOR (n:{c}) ON (n.content_hash)",
+            ft:                   f"CREATE FULLTEXT INDEX `{ft}` IF NOT EXISTS FOR (n:{c}) ON EACH [n.`{self.text_prop}`]",
+            "entity_location":    f"CREATE POINT INDEX entity_location IF NOT EXISTS FOR (n:{e}) ON (n.location)",
+            # propriétés numériques typées (prix, surface, pièces) : recherches par plage
+            **{f"entity_{p}": f"CREATE RANGE INDEX entity_{p} IF NOT EXISTS FOR (n:{e}) ON (n.{p})"
+               for p in NUMERIC_PROPERTIES},
+        }
+
+    # anciens DDL remplacés (le MERGE des entités porte désormais sur ``key``)
+    RETIRED = ("DROP CONSTRAINT entity_name_unique IF EXISTS",)
+
+    def ensure(self, *, force: bool = False) -> dict:
+        """Applique les DDL manquants puis attend que les index soient ONLINE."""
+        key = (id(self.driver), self.db)
+        if key in self._done and not force:
+            return {"applied": False, "errors": {}}
+        errors, out = {}, {}
+        with self.driver.session(database=self.db) as s:
+            for ddl in self.RETIRED:
+                s.run(ddl).consume()
+            keyless = self._has_keyable(s)
+        if keyless:
+            out["backfill"] = EntityResolver().backfill(self.driver, self.db, label=self.entity_label)
+            print(f"Schéma : entités sans clé migrées ({out['backfill']})")
+        with self.driver.session(database=self.db) as s:
+            for name, ddl in self.statements().items():
+                try:
+                    s.run(ddl).consume()
+                except Exception as e:   # ex. doublons existants empêchant la contrainte
+                    errors[name] = str(e)
+                    print(f"Schéma : {name} non créé ({e})")
+            s.run("CALL db.awaitIndexes($t)", t=self.await_timeout).consume()
+        if not errors:
+            self._done.add(key)
+        return {"applied": True, "errors": errors, **out}
+
+    def _has_keyable(self, session) -> bool:
+        """Au moins une entité sans ``key`` dont le nom donne une clé canonique (les autres
+        resteraient sans clé après ``backfill`` : la migration serait rejouée à chaque démarrage)."""
+        q = f"MATCH (n:{self.entity_label}) WHERE n.key IS NULL AND n.name IS NOT NULL RETURN n.name AS name"
+        return any(canonical_key(r["name"]) for r in session.run(q))
+
+    def state(self) -> list:
+        """État (ONLINE, POPULATING, FAILED…) des index / contraintes gérés ; absents inclus."""
+        names = list(self.statements())
+        q = ("SHOW INDEXES YIELD name, type, entityType, labelsOrTypes, properties, state, "
+             "populationPercent, owningConstraint WHERE name IN $names "
+             "RETURN name, type, entityType, labelsOrTypes, properties, state, populationPercent, owningConstraint")
+        with self.driver.session(database=self.db) as s:
+            rows = {r["name"]: dict(r) for r in s.run(q, names=names)}
+        return [rows.get(n, {"name": n, "state": "MISSING"}) for n in names]
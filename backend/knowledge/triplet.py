@@ -0,0 +1,14 @@
+"""Triplet (subject, relation, object) produit par les extracteurs (LLM ou règles).
+
+Module sans dépendance : importable sans LangChain.
+"""
+
+
+class _Triplet:
+    def __init__(self, subject: str, relation: str, object_: str):
+        self.subject = subject
+        self.relation = relation
+        self.object = object_
+
+    def __repr__(self):
+        return f"<_Triplet {self.subject}-{self.relation}->{self.object}>"
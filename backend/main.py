@@ -12,29 +12,58 @@ from fastapi.middleware.wsgi import WSGIMiddleware
 # from app.router import router as api_router
 from app.api import api_router
 from tools.graph_rag_tool import mcp as mcp_app
-from settings import SERVER_OPTIONS
+from settings import SERVER_OPTIONS, NEO4J_CFG, ANN_CFG
+from db.driver_registry import driver_registry
+from db.generations import generations
+from knowledge.schema_manager import SchemaBootstrap
+from embedding.vector_store import Neo4jVectorManager
+from embedding.ann_index import load_or_build, set_ann_index
 
 load_dotenv()
 
 # ──────────────────────────────────────────────────────────────
-# Lifespan FastAPI : (for stdio/SSE background if needed) — not used when mounting SSE app
+# Lifespan FastAPI : pool Neo4j partagé + lifespan de la sous-app MCP (SSE)
 # ──────────────────────────────────────────────────────────────
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     transport = SERVER_OPTIONS.get("transport", "http")
     # START-UP
+    # Un seul driver (pool de connexions) pour toute l'application, injecté via app.state
+    app.state.neo4j_driver = driver_registry.from_cfg(NEO4J_CFG)
+    app.state.neo4j_async_driver = driver_registry.from_cfg_async(NEO4J_CFG)   # routes async + outil MCP
+    # compteurs de génération partagés : une ingestion invalide le cache de retrieval de tous les workers
+    generations.bind(app.state.neo4j_driver, NEO4J_CFG["database"], async_driver=app.state.neo4j_async_driver)
+    # Contraintes / index portant les clés de MERGE (idempotent) ; l'API démarre même si Neo4j est absent
+    try:
+        bootstrap = SchemaBootstrap(app.state.neo4j_driver, NEO4J_CFG["database"], chunk_label=NEO4J_CFG["node_label"],
+                                    fulltext_index=NEO4J_CFG["fulltext_index"])
+        app.state.schema_bootstrap = await asyncio.to_thread(bootstrap.ensure)
+    except Exception as e:
+        print(f"Bootstrap du schéma Neo4j impossible au démarrage : {e}")
+    # Miroir ANN en mémoire (optionnel) : rechargé depuis le disque ou reconstruit depuis Neo4j
+    if ANN_CFG["enabled"]:
+        try:
+            store = Neo4jVectorManager(**NEO4J_CFG, driver=app.state.neo4j_driver)
+            set_ann_index(await asyncio.to_thread(load_or_build, store, ANN_CFG))
+        except Exception as e:
+            print(f"Index ANN indisponible, recherche via Neo4j : {e}")
     if transport == "stdio":
         # Optional: run stdio transport in background (not used when mounting SSE app)
         app.state.mcp_task = asyncio.create_task(mcp_app.run_stdio_async())
-    # For SSE, we'll mount the Starlette sub-app instead of spawning a separate server.
 
-    yield  # —— l’application tourne ——
-
-    # SHUT-DOWN
-    if transport in {"sse", "stdio"}:
-        app.state.mcp_task.cancel()
-        with contextlib.suppress(asyncio.CancelledError):
-            await app.state.mcp_task
+    try:
+        # For SSE, the Starlette sub-app is mounted; its lifespan (session manager) runs here.
+        async with sub_app.router.lifespan_context(app):
+            yield  # —— l’application tourne ——
+    finally:
+        # SHUT-DOWN
+        mcp_task = getattr(app.state, "mcp_task", None)
+        if mcp_task is not None:
+            mcp_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await mcp_task
+        driver_registry.close_all()
+        await driver_registry.aclose_all()
 
 # ──────────────────────────────────────────────────────────────
 # FastAPI app racine
@@ -46,7 +75,7 @@ sub_app = mcp_app.sse_app()
 
 app = FastAPI(
     title="GraphRAG Admin + MCP",
-    lifespan=sub_app.router.lifespan_context,
+    lifespan=lifespan,
 )
 
 # Health-check
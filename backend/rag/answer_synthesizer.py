@@ -28,3 +28,8 @@ class AnswerSynthesizer:
         p = self.prompt.format(context=context, question=question)
         ans = self.llm.invoke(p)
         return ans.content if hasattr(ans, "content") else str(ans)
+
+    async def asynthesize(self, context: str, question: str) -> str:
+        p = self.prompt.format(context=context, question=question)
+        ans = await self.llm.ainvoke(p)
+        return ans.content if hasattr(ans, "content") else str(ans)
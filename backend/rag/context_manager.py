@@ -4,7 +4,12 @@ from typing import Dict, List
 
 class ContextManager:
     @staticmethod
-    def merge(vector_hits: List[Dict], cypher_hits: List[Dict], limit: int = 20) -> str:
+    def merge(vector_hits: List[Dict], cypher_hits: List[Dict], community_hits: List[Dict] | None = None,
+              limit: int = 20) -> str:
+        summaries = [f"{h['title']} : {h['summary']}" for h in community_hits or []][:limit]
         passages = [h["text"] for h in vector_hits][:limit]
-        entities = [f"{h['name']} ({', '.join(h['labels'])})" for h in cypher_hits][:limit]
-        return "\n".join(passages + entities)
+        entities = [f"{h['name']} ({', '.join(h['labels'])})"
+                    + (f" à {h['distance_km']} km" if h.get("distance_km") is not None else "")
+                    + (f" : {'; '.join(h['facts'])}" if h.get("facts") else "")
+                    for h in cypher_hits][:limit]
+        return "\n".join(summaries + passages + entities)
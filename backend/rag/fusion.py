@@ -0,0 +1,27 @@
+# backend/rag/fusion.py
+"""Fusion de listes de résultats classées (Reciprocal Rank Fusion)."""
+from typing import Dict, List, Sequence
+
+
+def rrf_fuse(ranked: Sequence[List[Dict]], *, names: Sequence[str] | None = None,
+             k: int = 60, limit: int | None = None, key: str = "id") -> List[Dict]:
+    """Fusionne plusieurs classements : score(d) = Σ 1 / (k + rang_i(d)).
+
+    Les scores bruts (cosinus, BM25) ne sont pas comparables entre sources ; seul le rang
+    compte. Chaque hit fusionné garde les champs de sa première occurrence et reçoit
+    ``rrf`` (score fusionné) et ``sources`` (listes où il apparaît). Identité : ``hit[key]``,
+    à défaut le texte.
+    """
+    names = list(names or [str(i) for i in range(len(ranked))])
+    fused: Dict[str, Dict] = {}
+    for name, hits in zip(names, ranked):
+        for rank, hit in enumerate(hits, 1):
+            ident = hit.get(key) or hit.get("text")
+            entry = fused.get(ident)
+            if entry is None:
+                entry = fused[ident] = {**hit, "rrf": 0.0, "sources": []}
+            entry["rrf"] += 1.0 / (k + rank)
+            if name not in entry["sources"]:
+                entry["sources"].append(name)
+    out = sorted(fused.values(), key=lambda h: h["rrf"], reverse=True)
+    return out[:limit] if limit is not None else out
@@ -1,6 +1,6 @@
 # backend/rag/graphrag_core.py
-from neo4j import GraphDatabase
-from embedding.embedding_manager import EmbeddingManager
+import asyncio
+from embedding.embedding_manager import IndexEmbeddingManager
 from embedding.vector_store import Neo4jVectorManager
 from rag.retriever import Retriever
 from rag.query_generator import QueryGenerator
@@ -9,22 +9,24 @@ from rag.context_manager import ContextManager
 
 
 class GraphRAG:
-    def __init__(self, neo4j_cfg: dict, embed_cfg: dict | None = None, llm_cfg: dict | None = None):
+    def __init__(self, neo4j_cfg: dict, embed_cfg: dict | None = None, llm_cfg: dict | None = None, *,
+                 driver=None, async_driver=None):
         # ----- Injection de dépendances -------------------------------
-        self.embedder = EmbeddingManager(**(embed_cfg or {"provider": "huggingface"}))
-        self.vstore = Neo4jVectorManager(**neo4j_cfg)
-        self.driver = GraphDatabase.driver(
-            neo4j_cfg["url"], auth=(neo4j_cfg["username"], neo4j_cfg["password"])
-        )
+        self.vstore = Neo4jVectorManager(**neo4j_cfg, driver=driver, async_driver=async_driver)
+        # embedder de la génération servie par l'alias (suit les reconstructions bleu / vert)
+        self.embedder = IndexEmbeddingManager(self.vstore, embed_cfg or {"provider": "huggingface"})
+        self.driver = self.vstore.driver      # même pool que le vector store (registre partagé)
 
-        self.retriever = Retriever(self.embedder, self.vstore, self.driver)
+        self.retriever = Retriever(self.embedder, self.vstore, self.driver, database=self.vstore.db)
         self.qgen = QueryGenerator()
         self.synth = AnswerSynthesizer()
         self.ctx_mgr = ContextManager()
 
     # ------------------------------------------------------------------
-    def query(self, question: str, *, k: int = 8) -> dict:
-        hits = self.retriever.retrieve(question, k=k)
+    def query(self, question: str, *, k: int = 8, mode: str | None = None) -> dict:
+        hits = self.retriever.retrieve(question, k=k, mode=mode)
+        if notice := hits.get("notice"):       # mode global sans communautés : pas d'appel LLM
+            return {"answer": notice, "context": hits, "cypher": None}
         context = self.ctx_mgr.merge(**hits)
 
         # (option) : générer + exécuter une requête Cypher supplémentaire
@@ -37,3 +39,23 @@ class GraphRAG:
             "context": hits,
             "cypher": cypher,
         }
+
+    # ------------------------------------------------------------------
+    async def aquery(self, question: str, *, k: int = 8, mode: str | None = None) -> dict:
+        """Version asynchrone de :meth:`query` : Neo4j via le driver asynchrone,
+        appels LLM via ``ainvoke`` ; la boucle d'événements n'est jamais bloquée."""
+        hits = await self.retriever.aretrieve(question, k=k, mode=mode)
+        if notice := hits.get("notice"):
+            return {"answer": notice, "context": hits, "cypher": None}
+        context = self.ctx_mgr.merge(**hits)
+
+        ents = self.retriever._extract_entities([question])
+        cypher, answer = await asyncio.gather(
+            self.qgen.agenerate(question, ents),
+            self.synth.asynthesize(context=context, question=question),
+        )
+        return {
+            "answer": answer,
+            "context": hits,
+            "cypher": cypher,
+        }
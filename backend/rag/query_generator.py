@@ -36,3 +36,8 @@ class QueryGenerator:
         p = self.prompt.format(question=question, entities=", ".join(entities))
         ans = self.llm.invoke(p)
         return ans.content.strip() if hasattr(ans, "content") else str(ans).strip()
+
+    async def agenerate(self, question: str, entities: list[str]) -> str:
+        p = self.prompt.format(question=question, entities=", ".join(entities))
+        ans = await self.llm.ainvoke(p)
+        return ans.content.strip() if hasattr(ans, "content") else str(ans).strip()
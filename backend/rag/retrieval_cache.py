@@ -0,0 +1,108 @@
+"""Cache des résultats de ``Retriever.retrieve`` : LRU + TTL + plafond mémoire.
+
+Clé : (question normalisée, k, filtres, mode, génération des données). La génération
+vient de ``db.generations`` : ``run_from_series`` / ``KGBuilder`` l'incrémentent après
+écriture, une ingestion rend donc immédiatement invisibles les entrées antérieures, dans
+tous les workers une fois les compteurs liés à Neo4j (voir ``db.generations``).
+"""
+from __future__ import annotations
+import copy
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Tuple
+
+from settings import RETRIEVAL_CACHE_CFG
+
+
+def normalize_question(question: str) -> str:
+    """« Prix  F3, Casablanca ? » → « prix f3, casablanca » (NFKC, casse, espaces, ponctuation finale)."""
+    q = unicodedata.normalize("NFKC", question).casefold()
+    q = re.sub(r"\s+", " ", q).strip()
+    return q.rstrip(" ?!.;:؟")
+
+
+class RetrievalCache:
+    def __init__(self, *, max_entries: int = 512, ttl: float = 300.0, max_bytes: int = 32 * 2**20):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    # ------------------------------------------------------------------
+    @staticmethod
+    def key(question: str, *, k: int, filters: Dict | None, generation, mode: str = "vector") -> Tuple:
+        flt = json.dumps(filters or {}, sort_keys=True, default=str, ensure_ascii=False)
+        return normalize_question(question), int(k), flt, mode, generation
+
+    @staticmethod
+    def _size(value: Any) -> int:
+        """Taille approximative (octets) : longueur de la sérialisation JSON."""
+        return len(json.dumps(value, default=str, ensure_ascii=False).encode("utf-8"))
+
+    def _drop(self, key: Hashable) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    # ------------------------------------------------------------------
+    def get(self, key: Hashable) -> Any | None:
+        """Copie profonde de la valeur (l'appelant peut la modifier sans polluer le cache)."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if time.monotonic() - item[0] > self.ttl:
+                self._drop(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            value = item[2]
+        return copy.deepcopy(value)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._size(value)
+        if size > self.max_bytes:
+            return                          # trop gros pour le cache : jamais stocké
+        value = copy.deepcopy(value)
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic(), size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": round(self.hits / total, 3) if total else None}
+
+
+# ----------------------------------------------------------------------
+_cache: RetrievalCache | None = None
+
+
+def get_retrieval_cache() -> RetrievalCache | None:
+    """Cache partagé du processus (None si désactivé dans RETRIEVAL_CACHE_CFG)."""
+    global _cache
+    if _cache is None and RETRIEVAL_CACHE_CFG["enabled"]:
+        _cache = RetrievalCache(max_entries=RETRIEVAL_CACHE_CFG["max_entries"],
+                                ttl=RETRIEVAL_CACHE_CFG["ttl"],
+                                max_bytes=RETRIEVAL_CACHE_CFG["max_mb"] * 2**20)
+    return _cache
@@ -2,10 +2,21 @@
 
 # backend/rag/retriever.py
 from __future__ import annotations
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 from neo4j import Driver
 from embedding.embedding_manager import EmbeddingManager
 from embedding.vector_store import Neo4jVectorManager
+from embedding.ann_index import get_ann_index
+from db.async_session import run_read
+from db.generations import generations
+from rag.retrieval_cache import RetrievalCache, get_retrieval_cache
+from rag.fusion import rrf_fuse
+from knowledge.entity_resolver import entity_key, place_keys
+from knowledge.numeric_normalizer import range_constraints
+from knowledge.geocoder import proximity
+from settings import RAG_CFG, GEO_CFG, COMMUNITY_CFG
 
 
 class Retriever:
@@ -18,15 +29,75 @@ class Retriever:
         embedder: EmbeddingManager,
         vector_store: Neo4jVectorManager,
         kg_driver: Driver,
+        ann_index=None,
+        *,
+        database: str | None = None,
+        async_driver=None,
+        cache: RetrievalCache | None = None,
     ):
         self.embedder = embedder
         self.vstore = vector_store
         self.driver = kg_driver
+        self.db = database
+        self._async_driver = async_driver
+        self.ann_index = ann_index      # IVFIndex ; sinon index partagé chargé au démarrage (ANN_CFG)
+        self.cache = cache if cache is not None else get_retrieval_cache()
+        self._community_index = False   # index des résumés vu une fois : plus vérifié ensuite
+
+    @property
+    def async_driver(self):
+        """Driver asynchrone injecté, sinon celui (partagé) du vector store."""
+        return self._async_driver or self.vstore.async_driver
 
     # ---------- Vector --------------------------------------------------
-    def _vector_hits(self, question: str, k: int = 8) -> List[Dict]:
+    def _vector_hits(self, question: str, k: int = 8, filters: Dict | None = None) -> List[Dict]:
         vec = self.embedder.embed_texts([question])[0]
-        return self.vstore.search_similar(vec, k=k)
+        ann = self.ann_index or get_ann_index()
+        if ann is not None and not filters:
+            return ann.search(vec, k=k)          # en mémoire : aucun aller-retour Bolt
+        # search (et non search_similar) : les hits gardent leur id, point de départ des MENTIONS
+        return self.vstore.search(vec, k=k, filters=filters)
+
+    async def _avector_hits(self, question: str, k: int = 8, filters: Dict | None = None) -> List[Dict]:
+        # l'embedding (CPU / HTTP synchrone) ne doit pas bloquer la boucle d'événements
+        vec = (await asyncio.to_thread(self.embedder.embed_texts, [question]))[0]
+        ann = self.ann_index or get_ann_index()
+        if ann is not None and not filters:
+            return ann.search(vec, k=k)
+        return await self.vstore.asearch(vec, k=k, filters=filters)
+
+    # ---------- Hybride (full-text + vecteur) ---------------------------
+    def _vector_candidates(self, question: str, n: int, filters: Dict | None) -> List[Dict]:
+        """Candidats vectoriels avec id (nécessaire à la fusion)."""
+        vec = self.embedder.embed_texts([question])[0]
+        ann = self.ann_index or get_ann_index()
+        if ann is not None and not filters:
+            return ann.search(vec, k=n)
+        return self.vstore.search(vec, k=n, filters=filters)
+
+    async def _avector_candidates(self, question: str, n: int, filters: Dict | None) -> List[Dict]:
+        vec = (await asyncio.to_thread(self.embedder.embed_texts, [question]))[0]
+        ann = self.ann_index or get_ann_index()
+        if ann is not None and not filters:
+            return ann.search(vec, k=n)
+        return await self.vstore.asearch(vec, k=n, filters=filters)
+
+    def _hybrid_hits(self, question: str, k: int = 8, filters: Dict | None = None) -> List[Dict]:
+        """Full-text et vecteur en parallèle (deux sessions), puis fusion RRF → top-k."""
+        n = k * RAG_CFG["candidates"]
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            vec = pool.submit(self._vector_candidates, question, n, filters)
+            ft = pool.submit(self.vstore.search_fulltext, question, n, filters=filters)
+            ranked = [vec.result(), ft.result()]
+        return rrf_fuse(ranked, names=["vector", "fulltext"], k=RAG_CFG["rrf_k"], limit=k)
+
+    async def _ahybrid_hits(self, question: str, k: int = 8, filters: Dict | None = None) -> List[Dict]:
+        n = k * RAG_CFG["candidates"]
+        ranked = await asyncio.gather(
+            self._avector_candidates(question, n, filters),
+            self.vstore.asearch_fulltext(question, n, filters=filters),
+        )
+        return rrf_fuse(ranked, names=["vector", "fulltext"], k=RAG_CFG["rrf_k"], limit=k)
 
     # ---------- Entities ------------------------------------------------
     @staticmethod
@@ -40,20 +111,267 @@ class Retriever:
         return list(entities)
 
     # ---------- Cypher --------------------------------------------------
-    def _kg_hits(self, entities: List[str], hops: int = 1) -> List[Dict]:
-        cypher = f"""
+    @staticmethod
+    def _kg_query(hops: int = 1) -> str:
+        return f"""
         UNWIND $ents AS e
-        MATCH (n:Entity {{name:e}})-[*1..{hops}]-(m:Entity)
+        MATCH (n:Entity {{key:e}})-[*1..{hops}]-(m:Entity)
         WITH DISTINCT m LIMIT 30
         RETURN m.name   AS name,
                labels(m) AS labels
         """
-        with self.driver.session() as s:
-            return [dict(r) for r in s.run(cypher, ents=entities)]
+
+    _MENTIONS_QUERY = """
+        UNWIND $ids AS cid
+        MATCH (:Chunk {id: cid})-[:MENTIONS]->(n:Entity)
+        WITH DISTINCT n LIMIT 30
+        OPTIONAL MATCH (n)-[r]-(m:Entity)
+        WITH n, collect(CASE WHEN startNode(r) = n THEN type(r) + ' ' + m.name
+                             ELSE m.name + ' ' + type(r) + ' ' + n.name END)[..10] AS facts
+        RETURN n.name   AS name,
+               labels(n) AS labels,
+               facts
+        """
+
+    @staticmethod
+    def _range_query(constraints: Dict[str, tuple]) -> tuple:
+        """Recherche par plage sur les propriétés typées (index RANGE) ; *places* restreint aux
+        entités à deux sauts au plus d'une ville citée (projet → ville, type de bien → projet → ville)."""
+        conds, params = [], {}
+        for prop, (lo, hi) in sorted(constraints.items()):
+            if lo is not None:
+                conds.append(f"n.{prop} >= ${prop}_min")
+                params[f"{prop}_min"] = lo
+            if hi is not None:
+                conds.append(f"n.{prop} <= ${prop}_max")
+                params[f"{prop}_max"] = hi
+        order = sorted(constraints)[0]
+        q = f"""
+        MATCH (n:Entity) WHERE {' AND '.join(conds)}
+          AND (size($places) = 0 OR EXISTS {{ (n)-[*1..2]-(p:Entity) WHERE p.key IN $places }})
+        WITH n ORDER BY n.{order} LIMIT $limit
+        OPTIONAL MATCH (n)-[r]-(m:Entity)
+        WITH n, collect(CASE WHEN startNode(r) = n THEN type(r) + ' ' + m.name
+                             ELSE m.name + ' ' + type(r) + ' ' + n.name END)[..10] AS facts
+        RETURN n.name   AS name,
+               labels(n) AS labels,
+               facts
+        """
+        return q, params
+
+    _GEO_QUERY = """
+        WITH point({latitude: $lat, longitude: $lon}) AS center
+        MATCH (n:Entity)
+        WHERE point.distance(n.location, center) <= $meters AND n.geo_source <> 'gazetteer'
+        WITH n, point.distance(n.location, center) AS d
+        ORDER BY d LIMIT $limit
+        OPTIONAL MATCH (n)-[r]-(m:Entity)
+        WITH n, d, collect(CASE WHEN startNode(r) = n THEN type(r) + ' ' + m.name
+                                ELSE m.name + ' ' + type(r) + ' ' + n.name END)[..10] AS facts
+        RETURN n.name   AS name,
+               labels(n) AS labels,
+               facts,
+               round(d / 1000.0, 1) AS distance_km
+        ORDER BY distance_km
+        """
+
+    def near(self, lat: float, lon: float, *, radius_km: float | None = None, limit: int = 20) -> List[Dict]:
+        """Entités géocodées (projets, biens) dans un rayon, des plus proches aux plus lointaines :
+        un seul parcours de l'index POINT ``entity_location``."""
+        meters = 1000 * (GEO_CFG["radius_km"] if radius_km is None else radius_km)
+        with self.driver.session(database=self.db) as s:
+            return [dict(r) for r in s.run(self._GEO_QUERY, lat=lat, lon=lon, meters=meters, limit=limit)]
+
+    def nearest(self, lat: float, lon: float, n: int = 5) -> List[Dict]:
+        """Les *n* plus proches, bornés par GEO_CFG["max_radius_km"] (la borne garde l'index)."""
+        return self.near(lat, lon, radius_km=GEO_CFG["max_radius_km"], limit=n)
+
+    @staticmethod
+    def _geo_params(question: str, limit: int) -> Dict | None:
+        geo = proximity(question)
+        if geo is None:
+            return None
+        return {"lat": geo["place"]["lat"], "lon": geo["place"]["lon"],
+                "meters": 1000 * geo["radius_km"], "limit": geo["limit"] or limit}
+
+    def _geo_hits(self, question: str, limit: int = 20) -> List[Dict]:
+        """« près de Mediouna », « à moins de 10 km de … » : recherche par distance."""
+        if (params := self._geo_params(question, limit)) is None:
+            return []
+        with self.driver.session(database=self.db) as s:
+            return [dict(r) for r in s.run(self._GEO_QUERY, **params)]
+
+    async def _ageo_hits(self, question: str, limit: int = 20) -> List[Dict]:
+        if (params := self._geo_params(question, limit)) is None:
+            return []
+        return await run_read(self.async_driver, self.db, self._GEO_QUERY, **params)
+
+    @staticmethod
+    def _merge_hits(*sources: List[Dict]) -> List[Dict]:
+        seen, out = set(), []
+        for hits in sources:
+            for h in hits:
+                if h["name"] not in seen:
+                    seen.add(h["name"])
+                    out.append(h)
+        return out
+
+    def _range_hits(self, question: str, limit: int = 20) -> List[Dict]:
+        """Entités satisfaisant les bornes numériques de la question (« moins de 1,2 M DH »)."""
+        constraints = range_constraints(question)
+        if not constraints:
+            return []
+        q, params = self._range_query(constraints)
+        with self.driver.session(database=self.db) as s:
+            return [dict(r) for r in s.run(q, places=place_keys(question), limit=limit, **params)]
+
+    async def _arange_hits(self, question: str, limit: int = 20) -> List[Dict]:
+        constraints = range_constraints(question)
+        if not constraints:
+            return []
+        q, params = self._range_query(constraints)
+        return await run_read(self.async_driver, self.db, q, places=place_keys(question), limit=limit, **params)
+
+    @staticmethod
+    def _hit_ids(v_hits: List[Dict]) -> List[str]:
+        return [h["id"] for h in v_hits if h.get("id")]
+
+    @staticmethod
+    def _entity_keys(entities: List[str]) -> List[str]:
+        """Noms → clés canoniques (mêmes règles qu'à l'écriture du KG)."""
+        return sorted({k for k in map(entity_key, entities) if k})
+
+    def _kg_hits(self, v_hits: List[Dict], hops: int = 1) -> List[Dict]:
+        """Entités citées par les passages trouvés (MENTIONS, une traversée depuis leurs ids) ;
+        repli sur l'heuristique des mots capitalisés pour un KG construit sans provenance."""
+        with self.driver.session(database=self.db) as s:
+            if ids := self._hit_ids(v_hits):
+                rows = [dict(r) for r in s.run(self._MENTIONS_QUERY, ids=ids)]
+                if rows:
+                    return rows
+            ents = self._entity_keys(self._extract_entities([h["text"] for h in v_hits]))
+            return [dict(r) for r in s.run(self._kg_query(hops), ents=ents)]
+
+    async def _akg_hits(self, v_hits: List[Dict], hops: int = 1) -> List[Dict]:
+        if ids := self._hit_ids(v_hits):
+            rows = await run_read(self.async_driver, self.db, self._MENTIONS_QUERY, ids=ids)
+            if rows:
+                return rows
+        ents = self._entity_keys(self._extract_entities([h["text"] for h in v_hits]))
+        return await run_read(self.async_driver, self.db, self._kg_query(hops), ents=ents)
+
+    # ---------- Global (résumés de communautés) ------------------------
+    _COMMUNITY_QUERY = """
+        CALL db.index.vector.queryNodes($index, $k, $vec) YIELD node, score
+        RETURN node.id AS id, node.title AS title, node.summary AS summary,
+               node.size AS size, score
+        """
+    _COMMUNITY_INDEX_QUERY = "SHOW VECTOR INDEXES YIELD name WHERE name = $index RETURN count(*) AS n"
+    NO_COMMUNITIES = ("Aucun résumé de communauté : le mode global nécessite le job des communautés "
+                      "(POST /idx-kg/communities).")
+
+    def _global(self, hits: List[Dict] | None) -> Dict:
+        out = {"vector_hits": [], "cypher_hits": [], "community_hits": hits or []}
+        if hits is None:
+            out["notice"] = self.NO_COMMUNITIES
+        return out
+
+    def _community_hits(self, question: str, k: int) -> List[Dict] | None:
+        """Résumés précalculés les plus proches de la question (index vectoriel des communautés) :
+        k résumés, quel que soit le nombre d'entités du graphe ; None si l'index n'existe pas
+        (job des communautés jamais lancé)."""
+        index = COMMUNITY_CFG["index_name"]
+        with self.driver.session(database=self.db) as s:
+            if not self._community_index:
+                self._community_index = bool(list(s.run(self._COMMUNITY_INDEX_QUERY, index=index))[0]["n"])
+                if not self._community_index:
+                    return None
+            vec = self.embedder.embed_texts([question])[0]
+            return [dict(r) for r in s.run(self._COMMUNITY_QUERY, index=index, k=k, vec=vec)]
+
+    async def _acommunity_hits(self, question: str, k: int) -> List[Dict] | None:
+        index = COMMUNITY_CFG["index_name"]
+        if not self._community_index:
+            rows = await run_read(self.async_driver, self.db, self._COMMUNITY_INDEX_QUERY, index=index)
+            self._community_index = bool(rows[0]["n"])
+            if not self._community_index:
+                return None
+        vec = (await asyncio.to_thread(self.embedder.embed_texts, [question]))[0]
+        return await run_read(self.async_driver, self.db, self._COMMUNITY_QUERY, index=index, k=k, vec=vec)
+
+    # ---------- Cache -------------------------------------------------
+    def _cache_key(self, question: str, k: int, filters: Dict | None, mode: str, token, index_generation: int = 0):
+        """Clé du cache (None si désactivé ou *token* illisible) ; inclut la génération des
+        données visibles (``generations.token``, partagée via Neo4j) et celle de l'alias
+        vectoriel (lue dans Neo4j) : ingestions et bascules sont vues par tous les workers."""
+        if self.cache is None or token is None:
+            return None
+        generation = (*token, index_generation)
+        return self.cache.key(question, k=k, filters=filters, mode=mode, generation=generation)
+
+    @staticmethod
+    def _mode(mode: str | None) -> str:
+        mode = mode or RAG_CFG["retrieval_mode"]
+        if mode not in ("vector", "hybrid", "global"):
+            raise ValueError(f"mode de retrieval inconnu : {mode}")
+        return mode
 
     # ---------- Public API ---------------------------------------------
-    def retrieve(self, question: str, *, k: int = 8) -> Dict:
-        v_hits = self._vector_hits(question, k=k)
-        ents = self._extract_entities([h["text"] for h in v_hits])
-        kg_hits = self._kg_hits(ents)
-        return {"vector_hits": v_hits, "cypher_hits": kg_hits}
+    def retrieve(self, question: str, *, k: int = 8, filters: Dict | None = None,
+                 mode: str | None = None) -> Dict:
+        """filters : restreint les passages (series, version, source_doc, ingest_from/ingest_to…).
+        mode : "vector" ou "hybrid" (full-text Lucene + vecteur fusionnés par RRF) ; défaut RAG_CFG.
+        "global" : uniquement les résumés de communautés (questions transverses, voir
+        knowledge/community.py) — ni passages ni entités ; *k* = nombre de résumés, *filters*
+        ne s'applique pas (une communauté couvre toutes les séries). Sans index des communautés,
+        résultat vide et ``notice`` explicite.
+        Une question bornée (« moins de 1,2 M DH », « F3 », « plus de 80 m² ») ajoute en tête
+        des entités la recherche par plage sur les propriétés typées indexées ; une demande de
+        proximité (« près de Mediouna ») une recherche par distance sur l'index POINT."""
+        mode = self._mode(mode)
+        key = None
+        if self.cache is not None:
+            token = generations.token((filters or {}).get("series"))
+            key = self._cache_key(question, k, filters, mode, token, self.vstore.active()["generation"])
+        if key is not None and (cached := self.cache.get(key)) is not None:
+            return cached
+        if mode == "global":
+            out = self._global(self._community_hits(question, k))
+            if key is not None and "notice" not in out:
+                self.cache.put(key, out)
+            return out
+        if mode == "hybrid":
+            v_hits = self._hybrid_hits(question, k=k, filters=filters)
+        else:
+            v_hits = self._vector_hits(question, k=k, filters=filters)
+        kg_hits = self._merge_hits(self._range_hits(question), self._geo_hits(question), self._kg_hits(v_hits))
+        out = {"vector_hits": v_hits, "cypher_hits": kg_hits}
+        if key is not None:
+            self.cache.put(key, out)
+        return out
+
+    async def aretrieve(self, question: str, *, k: int = 8, filters: Dict | None = None,
+                        mode: str | None = None) -> Dict:
+        """Pendant asynchrone de :meth:`retrieve` (sessions / transactions asynchrones)."""
+        mode = self._mode(mode)
+        key = None
+        if self.cache is not None:
+            token = await generations.atoken((filters or {}).get("series"))
+            key = self._cache_key(question, k, filters, mode, token, (await self.vstore.aactive())["generation"])
+        if key is not None and (cached := self.cache.get(key)) is not None:
+            return cached
+        if mode == "global":
+            out = self._global(await self._acommunity_hits(question, k))
+            if key is not None and "notice" not in out:
+                self.cache.put(key, out)
+            return out
+        if mode == "hybrid":
+            v_hits = await self._ahybrid_hits(question, k=k, filters=filters)
+        else:
+            v_hits = await self._avector_hits(question, k=k, filters=filters)
+        range_hits, geo_hits, kg_hits = await asyncio.gather(
+            self._arange_hits(question), self._ageo_hits(question), self._akg_hits(v_hits))
+        out = {"vector_hits": v_hits, "cypher_hits": self._merge_hits(range_hits, geo_hits, kg_hits)}
+        if key is not None:
+            self.cache.put(key, out)
+        return out
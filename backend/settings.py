@@ -9,6 +9,89 @@ NEO4J_CFG = {
     "index_name": os.getenv("NEO4J_INDEX_NAME", "chunk_vector"),  # nom de l'index vectoriel (index_110625_022017)
     "node_label": os.getenv("NEO4J_NODE_LABEL", "Chunk"),  # label des noeuds
     "embed_prop": os.getenv("NEO4J_EMBED_PROP", "embedding"),
+    # "list" (LIST<FLOAT> 64 bits) ou "native" (float32 via db.create.setNodeVectorProperty, Neo4j ≥ 5.11)
+    "vector_storage": os.getenv("NEO4J_VECTOR_STORAGE", "list"),
+    "fulltext_index": os.getenv("NEO4J_FULLTEXT_INDEX", "chunk_text_ft"),   # index Lucene sur Chunk.text
+    # index_name = alias logique résolu sur (:VectorIndexAlias) → reconstruction bleu / vert
+    "use_alias": os.getenv("NEO4J_INDEX_ALIAS", "true").lower() in {"1", "true", "yes"},
+}
+
+# Pool de connexions du driver Neo4j partagé (voir db/driver_registry.py)
+NEO4J_POOL_CFG = {
+    "max_connection_pool_size":       int(os.getenv("NEO4J_POOL_SIZE", 50)),
+    "connection_acquisition_timeout": float(os.getenv("NEO4J_POOL_ACQUIRE_TIMEOUT", 30)),   # secondes
+    "max_connection_lifetime":        int(os.getenv("NEO4J_POOL_MAX_LIFETIME", 3600)),       # secondes
+    "liveness_check_timeout":         float(os.getenv("NEO4J_POOL_LIVENESS_CHECK", 60)),     # ping si inactif > 60 s
+    "connection_timeout":             float(os.getenv("NEO4J_CONNECT_TIMEOUT", 15)),
+}
+
+# Écriture des chunks par lots (voir embedding/batch_writer.py)
+INGEST_CFG = {
+    "write_batch_size":  int(os.getenv("NEO4J_WRITE_BATCH_SIZE", 500)),    # lignes par transaction
+    "write_parallelism": int(os.getenv("NEO4J_WRITE_PARALLELISM", 1)),     # sessions d'écriture simultanées
+    "write_max_retries": int(os.getenv("NEO4J_WRITE_MAX_RETRIES", 3)),     # retries par lot (erreurs transitoires)
+}
+
+# Construction du KG (voir knowledge/kg_builder.py)
+KG_CFG = {
+    "extract_concurrency": int(os.getenv("KG_EXTRACT_CONCURRENCY", 8)),    # appels LLM simultanés
+    "group_max_tokens":    int(os.getenv("KG_GROUP_MAX_TOKENS", 3000)),    # taille max d'un groupe de chunks / prompt
+    "write_batch_size":    int(os.getenv("KG_WRITE_BATCH_SIZE", 5000)),    # triplets par transaction d'écriture
+    "write_max_retries":   int(os.getenv("KG_WRITE_MAX_RETRIES", 5)),      # retries sur interblocage
+    "entity_similarity":   float(os.getenv("KG_ENTITY_SIMILARITY", 0.88)), # seuil de fusion floue des entités (trigrammes)
+    "checkpoint_groups":   int(os.getenv("KG_CHECKPOINT_GROUPS", 20)),     # groupes entre deux points de reprise
+    "jobs_dir":            os.getenv("KG_JOBS_DIR", os.path.join(os.path.dirname(__file__), "data", "kg_jobs")),
+}
+
+# Cache persistant des triplets extraits par le LLM (voir knowledge/extraction_cache.py)
+EXTRACTION_CACHE_CFG = {
+    "enabled": os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"},
+    "path":    os.getenv("EXTRACTION_CACHE_PATH", os.path.join(os.path.dirname(__file__), "data", "cache", "extraction.sqlite")),
+}
+
+# Cache des résultats de Retriever.retrieve (voir rag/retrieval_cache.py)
+RETRIEVAL_CACHE_CFG = {
+    "enabled":     os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"},
+    "max_entries": int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", 512)),
+    # secondes ; les ingestions invalident le cache de tous les workers via les compteurs de
+    # génération partagés dans Neo4j (voir db/generations.py)
+    "ttl":         float(os.getenv("RETRIEVAL_CACHE_TTL", 300)),
+    "max_mb":      int(os.getenv("RETRIEVAL_CACHE_MAX_MB", 32)),      # plafond mémoire
+}
+
+# Mode de retrieval par défaut : "vector" ou "hybrid" (full-text + vecteur, fusion RRF)
+RAG_CFG = {
+    "retrieval_mode": os.getenv("RAG_RETRIEVAL_MODE", "vector"),
+    "rrf_k":          int(os.getenv("RAG_RRF_K", 60)),          # constante de lissage RRF
+    "candidates":     int(os.getenv("RAG_HYBRID_CANDIDATES", 3)),  # candidats par source = k × candidates
+}
+
+# Communautés d'entités et leurs résumés (voir knowledge/community.py) — mode de retrieval "global"
+COMMUNITY_CFG = {
+    "min_size":    int(os.getenv("COMMUNITY_MIN_SIZE", 3)),     # communautés plus petites : non résumées
+    "max_iter":    int(os.getenv("COMMUNITY_MAX_ITER", 20)),    # itérations de la propagation de labels
+    "hub_degree":  int(os.getenv("COMMUNITY_HUB_DEGREE", 50)),  # au-delà : nœud « hub » (ville, équipement…), ne propage pas
+    "max_facts":   int(os.getenv("COMMUNITY_MAX_FACTS", 60)),   # faits par prompt de résumé
+    "concurrency": int(os.getenv("COMMUNITY_CONCURRENCY", 4)),  # résumés LLM simultanés
+    "index_name":  os.getenv("COMMUNITY_INDEX", "community_embedding"),
+}
+
+# Géocodage hors ligne des lieux / projets (voir knowledge/geocoder.py)
+GEO_CFG = {
+    "gazetteer":     os.getenv("GEO_GAZETTEER", os.path.join(os.path.dirname(__file__), "knowledge", "gazetteer_ma.json")),
+    "radius_km":     float(os.getenv("GEO_RADIUS_KM", 5)),       # rayon par défaut de « près de … »
+    "max_radius_km": float(os.getenv("GEO_MAX_RADIUS_KM", 50)),  # borne des recherches « les N plus proches »
+}
+
+# Miroir ANN en mémoire de l'index vectoriel (voir embedding/ann_index.py) — optionnel
+ANN_CFG = {
+    "enabled": os.getenv("ANN_ENABLED", "false").lower() in {"1", "true", "yes"},
+    "path":    os.getenv("ANN_PATH", os.path.join(os.path.dirname(__file__), "data", "ann", "chunks")),
+    "nlist":   int(os.getenv("ANN_NLIST", 64)),     # nombre de listes IVF (centroïdes)
+    "nprobe":  int(os.getenv("ANN_NPROBE", 8)),     # listes parcourues par requête
+    # un seul worker écrit le dossier (instantanés + journal) ; les autres : ANN_WRITER=false
+    "writer":  os.getenv("ANN_WRITER", "true").lower() in {"1", "true", "yes"},
+    "refresh_s": float(os.getenv("ANN_REFRESH_S", 5)),   # lecteurs : relecture du dossier au plus toutes les N s
 }
 
 _embedder_params_raw = os.getenv("EMBEDDER_PARAMS", "{}")
@@ -35,7 +118,8 @@ SERVER_OPTIONS = {
 PROVIDERS = {
     "huggingface": "HuggingFace",
     "openai":      "OpenAI",
-    "gemini":      "Google Gemini"
+    "gemini":      "Google Gemini",
+    "hash":        "Local hash (offline)"
 }
 
 # GEMINI_TEXT_MODELS = {
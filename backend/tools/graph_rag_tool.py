@@ -2,7 +2,7 @@ from mcp.server.fastmcp import Context # , FastMCP
 from fastmcp import FastMCP
 from rag.graphrag_core import GraphRAG
 from settings import NEO4J_CFG  # ← mon dict centralisé
-from typing import List, Dict
+from typing import List, Dict, Literal
 from settings import SERVER_OPTIONS
 import json
 
@@ -24,13 +24,16 @@ rag_engine = GraphRAG(neo4j_cfg=NEO4J_CFG)
 
 
 @mcp.tool()
-async def search_data(ctx: Context, query: str, limit: int = 8) -> str:
+async def search_data(ctx: Context, query: str, limit: int = 8,
+                      mode: Literal["vector", "hybrid", "global"] | None = None) -> str:
 # async def search_data(query: str, limit: int = 8) -> str:
     """
     Recherche sémantique + graphe sur le portefeuille immobilier.
     Args:
         query: question exprimée en langue naturelle
-        limit: top-k passages vectoriels (par défaut : 8)
+        limit: top-k passages vectoriels, ou résumés en mode global (par défaut : 8)
+        mode: "vector", "hybrid" (full-text + vecteur) ou "global" (résumés de communautés,
+              pour les questions transverses sur tout le portefeuille) ; défaut RAG_RETRIEVAL_MODE
     """
-    res = rag_engine.query(query, k=limit)
+    res = await rag_engine.aquery(query, k=limit, mode=mode)    # driver Neo4j asynchrone : ne bloque pas la boucle SSE
     return json.dumps(res, ensure_ascii=False, indent=2)
@@ -0,0 +1,53 @@
+"""Doubles Neo4j partagés par les tests : driver, session (qui sert aussi de transaction) et résultat.
+
+Un test décrit son graphe en sous-classant ``FakeDriver`` et en surchargeant ``answer`` ;
+chaque requête est journalisée dans ``FakeDriver.log`` sous la forme ``(cypher, params)``.
+"""
+from types import SimpleNamespace
+
+
+class Rows(list):
+    """Résultat minimal : itérable de dicts, ``data`` / ``single`` / ``consume().counters``."""
+    def __init__(self, rows=(), **counters):
+        super().__init__(rows)
+        self.counters = SimpleNamespace(**{'nodes_created': 0, 'nodes_deleted': 0, 'relationships_created': 0,
+                                           'relationships_deleted': 0, 'properties_set': 0, **counters})
+    def data(self):
+        return list(self)
+    def single(self):
+        return self[0] if self else None
+    def consume(self):
+        return self
+
+
+class FakeSession:
+    def __init__(self, driver, database=None):
+        self.driver, self.database = driver, database
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def run(self, query, **params):
+        self.driver.log.append((query, params))
+        out = self.driver.answer(query, params)
+        return out if isinstance(out, Rows) else Rows(out or ())
+    def execute_write(self, fn, *args):
+        self.driver.before_write()
+        return fn(self, *args)
+    def execute_read(self, fn, *args):
+        return fn(self, *args)
+
+
+class FakeDriver:
+    def __init__(self):
+        self.log, self.databases = [], []
+    def session(self, database=None, **kwargs):
+        self.databases.append(database)
+        return FakeSession(self, database)
+    def answer(self, query, params):
+        """Lignes renvoyées pour *query* (aucune par défaut)."""
+        return Rows()
+    def before_write(self):
+        """Point d'injection d'erreurs avant chaque transaction d'écriture (deadlock…)."""
+    def queries(self, needle=''):
+        return [q for q, _ in self.log if needle in q]
@@ -0,0 +1,96 @@
+import sys
+import json
+import pathlib
+import pytest
+
+np = pytest.importorskip('numpy')
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'embedding' or m.startswith('embedding.')]:
+    sys.modules.pop(name)
+
+from embedding.ann_index import IVFIndex
+
+def _data(n=400, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return [f'c{i:04d}' for i in range(n)], rng.normal(size=(n, dim)).astype(np.float32)
+
+def test_ivf_search_finds_exact_vector():
+    ids, vecs = _data()
+    idx = IVFIndex(16, nlist=8, nprobe=8)
+    idx.add(ids, vecs, [f't{i}' for i in range(len(ids))])
+    idx.train()
+    hit = idx.search(vecs[123], k=3)[0]
+    assert hit['id'] == 'c0123' and hit['text'] == 't123'
+    assert hit['score'] == pytest.approx(1.0, abs=1e-5)
+
+def test_add_upserts_by_id_and_persists_to_mmap(tmp_path):
+    ids, vecs = _data(n=50)
+    idx = IVFIndex(16, nlist=4, path=tmp_path / 'ann')
+    assert idx.add(ids, vecs) == 50
+    assert idx.add(['c0001'], vecs[7:8], ['moved']) == 0
+    idx.save()
+    loaded = IVFIndex.load(tmp_path / 'ann')
+    assert len(loaded) == 50
+    assert isinstance(loaded._vectors, np.memmap)
+    assert loaded.search(vecs[7], k=2)[0]['text'] == 'moved'
+    loaded.add(['new'], vecs[3:4] * -1)
+    assert loaded.search(vecs[3] * -1, k=1)[0]['id'] == 'new'
+
+def test_flush_appends_delta_and_never_overwrites_snapshot_files(tmp_path):
+    ids, vecs = _data(n=50)
+    idx = IVFIndex(16, nlist=4, path=tmp_path / 'ann', compact_min=10)
+    idx.add(ids, vecs)
+    idx.flush()                                   # premier flush : instantané génération 1
+    assert idx.generation == 1 and (tmp_path / 'ann' / 'vectors.1.npy').exists()
+    snapshot = (tmp_path / 'ann' / 'vectors.1.npy').stat().st_mtime_ns
+    idx.add(['x1', 'c0002'], vecs[10:12] * -1, ['new', 'moved'])
+    idx.flush()                                   # petite ingestion : journal seulement
+    assert idx.generation == 1
+    assert (tmp_path / 'ann' / 'vectors.1.npy').stat().st_mtime_ns == snapshot
+    assert len((tmp_path / 'ann' / 'delta.1.jsonl').read_text().splitlines()) == 2
+    loaded = IVFIndex.load(tmp_path / 'ann')
+    assert len(loaded) == 51
+    assert loaded.search(vecs[11] * -1, k=1)[0]['text'] == 'moved'
+    loaded.compact_min = 10
+    loaded.add([f'y{i}' for i in range(10)], vecs[20:30])
+    loaded.flush()                                # journal trop long : nouvelle génération
+    assert loaded.generation == 2
+    assert (tmp_path / 'ann' / 'vectors.1.npy').exists()  # génération précédente : lecteurs pas encore rechargés
+    loaded.add(['z'], vecs[30:31])
+    loaded.save()                                 # génération 3 : la 1 est supprimée
+    gens = {f.name.split('.')[1] for f in (tmp_path / 'ann').glob('*.npy')}
+    assert gens == {'2', '3'}
+    assert len(IVFIndex.load(tmp_path / 'ann')) == 62
+
+def test_ids_and_texts_are_memory_mapped_not_in_meta(tmp_path):
+    ids, vecs = _data(n=20)
+    idx = IVFIndex(16, nlist=4, path=tmp_path / 'ann')
+    idx.add(ids, vecs, [f'texte é{i}' for i in range(20)])
+    idx.save()
+    meta = json.loads((tmp_path / 'ann' / 'meta.json').read_text())
+    assert 'ids' not in meta and 'texts' not in meta and meta['count'] == 20
+    loaded = IVFIndex.load(tmp_path / 'ann')
+    assert isinstance(loaded.texts._blob, np.memmap) and loaded.texts[5] == 'texte é5'
+    loaded.add(['c0005'], vecs[5:6], ['remplacé'])
+    assert loaded.search(vecs[5], k=1)[0]['text'] == 'remplacé'
+
+def test_reader_never_writes_and_reloads_what_the_writer_publishes(tmp_path):
+    ids, vecs = _data(n=30)
+    writer = IVFIndex(16, nlist=4, path=tmp_path / 'ann', compact_min=5)
+    writer.add(ids[:20], vecs[:20])
+    writer.save()
+    reader = IVFIndex.load(tmp_path / 'ann', writer=False, refresh_s=0)
+    with pytest.raises(RuntimeError):
+        reader.save()
+    reader.add(['local'], vecs[29:30])
+    reader.flush()                                # lecteur : rien sur disque
+    assert not list((tmp_path / 'ann').glob('delta.*'))
+    writer.add(ids[20:22], vecs[20:22])
+    writer.flush()                                # journal
+    assert reader.search(vecs[21], k=1)[0]['id'] == 'c0021'
+    writer.add(ids[22:30], vecs[22:30])
+    writer.flush()                                # compaction : nouvelle génération
+    assert reader.search(vecs[27], k=1)[0]['id'] == 'c0027'
+    assert reader.generation == writer.generation == 2 and len(reader) == 30
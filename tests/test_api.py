@@ -46,7 +46,9 @@ class GraphBuilder: ...
 graph_builder.GraphBuilder = GraphBuilder
 schema_manager = types.ModuleType('knowledge.schema_manager')
 class GraphSchemaManager: ...
+class SchemaBootstrap: ...
 schema_manager.GraphSchemaManager = GraphSchemaManager
+schema_manager.SchemaBootstrap = SchemaBootstrap
 kg_builder = types.ModuleType('knowledge.kg_builder')
 class KGBuilder:
     def __init__(self, *args, **kwargs):
@@ -0,0 +1,109 @@
+import sys
+import pathlib
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'embedding' or m.startswith('embedding.')]:
+    sys.modules.pop(name)
+
+from conftest import FakeDriver
+from embedding.batch_writer import ChunkBatchWriter
+from embedding.vector_storage import VectorStorageMigrator
+
+class TransientFailure(Exception):
+    def is_retryable(self):
+        return True
+
+class FlakyDriver(FakeDriver):
+    """Les *failures* premières transactions échouent sur une erreur transitoire."""
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+    def before_write(self):
+        if self.failures:
+            self.failures -= 1
+            raise TransientFailure('deadlock')
+
+def _rows(n):
+    return [{'cid': f's-{i:06d}', 'text': str(i), 'vec': [0.1], 'series': 's', 'ingest_ts': 't',
+             'prev': f's-{i - 1:06d}' if i > 1 else None} for i in range(1, n + 1)]
+
+def test_writes_in_batches_with_next_chunk_in_same_query():
+    driver = FakeDriver()
+    stats = ChunkBatchWriter(driver, 'neo4j', batch_size=2).write(_rows(5))
+    assert [len(p['rows']) for _, p in driver.log] == [2, 2, 1]
+    assert 'NEXT_CHUNK' in driver.log[0][0]
+    assert stats['rows'] == 5 and stats['batches'] == 3 and stats['retries'] == 0
+
+def test_parallel_sessions_write_every_row():
+    driver = FakeDriver()
+    ChunkBatchWriter(driver, batch_size=3, parallel=3).write(_rows(10))
+    written = sorted(r['cid'] for _, p in driver.log for r in p['rows'])
+    assert written == [f's-{i:06d}' for i in range(1, 11)]
+
+def test_transient_errors_are_retried_then_raised():
+    driver = FlakyDriver(failures=1)
+    stats = ChunkBatchWriter(driver, batch_size=10, max_retries=2, backoff=0).write(_rows(3))
+    assert stats['retries'] == 1 and len(driver.log) == 1
+    with pytest.raises(TransientFailure):
+        ChunkBatchWriter(FlakyDriver(failures=5), max_retries=1, backoff=0).write(_rows(1))
+
+def test_native_vector_storage_uses_typed_procedure():
+    driver = FakeDriver()
+    ChunkBatchWriter(driver, vector_storage='native').write(_rows(2))
+    cypher = driver.log[0][0]
+    assert "db.create.setNodeVectorProperty(c, 'embedding', row.vec)" in cypher
+    assert 'c.`embedding` = row.vec' not in cypher
+    assert "c.`embedding_storage` = 'native'" in cypher
+    with pytest.raises(ValueError):
+        ChunkBatchWriter(driver, vector_storage='float16')
+
+def test_migrator_flags_the_generation_it_converts():
+    from unittest.mock import MagicMock
+    driver = MagicMock()
+    session = driver.session.return_value.__enter__.return_value
+    VectorStorageMigrator(driver, embed_prop='embedding_g2').migrate()
+    cypher = session.run.call_args[0][0]
+    assert "setNodeVectorProperty(c, 'embedding_g2', c.`embedding_g2`)" in cypher
+    assert "coalesce(c.`embedding_g2_storage`, 'list') <> 'native'" in cypher
+    assert 'embed_storage' not in cypher
+
+def test_boundary_chunk_gets_ingest_ts_whichever_batch_creates_it():
+    # un lot parallèle peut créer le chunk frontière comme simple extrémité de NEXT_CHUNK :
+    # son ingest_ts doit être posé par le lot qui l'écrit ensuite, pas seulement à la création
+    driver = FakeDriver()
+    writer = ChunkBatchWriter(driver, batch_size=2)
+    writer.write(_rows(5))
+    cypher = ' '.join(driver.log[0][0].split())
+    assert 'SET c.ingest_ts = coalesce(c.ingest_ts, row.ingest_ts)' in cypher
+    assert 'ON CREATE SET' not in cypher
+    assert 'MERGE (p:Chunk {id: row.prev}) MERGE (p)-[:NEXT_CHUNK]->(c)' in cypher   # stub sans propriété
+    batches = [p['rows'] for _, p in driver.log]
+    assert [r['prev'] for r in batches[1]][0] == batches[0][-1]['cid']               # frontière entre lots
+    assert all(r['ingest_ts'] == 't' for rows in batches for r in rows)
+
+def test_out_of_order_batches_against_neo4j():
+    """Contre une vraie base (NEO4J_TEST_URI) : le dernier lot termine en premier."""
+    import os
+    uri = os.getenv('NEO4J_TEST_URI')
+    if not uri:
+        pytest.skip('NEO4J_TEST_URI non défini')
+    neo4j = pytest.importorskip('neo4j')
+    if not hasattr(neo4j, 'GraphDatabase') or not callable(getattr(neo4j.GraphDatabase, 'driver', None)):
+        pytest.skip('driver neo4j indisponible')
+    auth = (os.getenv('NEO4J_TEST_USER', 'neo4j'), os.getenv('NEO4J_TEST_PASSWORD', 'neo4j'))
+    label = 'BatchWriterTest'
+    with neo4j.GraphDatabase.driver(uri, auth=auth) as driver:
+        try:
+            writer = ChunkBatchWriter(driver, node_label=label, batch_size=2)
+            with driver.session() as s:
+                for batch in reversed(writer.batches(_rows(5))):
+                    s.execute_write(writer._write_tx, batch)
+                rows = s.run(f'MATCH (c:{label}) RETURN c.id AS id, c.ingest_ts AS ts ORDER BY id').data()
+                links = s.run(f'MATCH (:{label})-[r:NEXT_CHUNK]->(:{label}) RETURN count(r) AS n').single()['n']
+        finally:
+            with driver.session() as s:
+                s.run(f'MATCH (c:{label}) DETACH DELETE c').consume()
+    assert [r['id'] for r in rows] == [f's-{i:06d}' for i in range(1, 6)]
+    assert all(r['ts'] == 't' for r in rows) and links == 4
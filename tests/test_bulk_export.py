@@ -0,0 +1,101 @@
+import csv
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from knowledge.bulk_export import AdminImportExporter
+from embedding.vector_store import Neo4jVectorManager
+
+class TinyEmbedder:
+    model_id = 'tiny:2'
+    def embed_texts(self, texts):
+        return [[float(len(t)), 0.5] for t in texts]
+
+def _read(path):
+    with open(path, encoding='utf-8', newline='') as f:
+        return list(csv.reader(f))
+
+def test_export_writes_admin_import_files(tmp_path):
+    series_dir = tmp_path / 'chunks' / 'chunks_s1'
+    series_dir.mkdir(parents=True)
+    for i, text in enumerate(['Prix : 250 000 DH', 'Ligne 1\nLigne "2"', 'Fin'], 1):
+        (series_dir / f'chunk_{i}.txt').write_text(text, encoding='utf-8')
+    triplets = [
+        {'subject': 'Al Abrar', 'relation': 'located in', 'object': 'Mediouna'},
+        {'subject': 'Al Abrar', 'relation': 'LOCATED_IN', 'object': 'Mediouna'},
+        {'subject': 'F3', 'relation': 'HAS_PRICE', 'object_': '250000'},
+        {'subject': 'F3', 'relation': 'HAS--PRICE', 'object': '250000'},
+        {'subject': 'F3', 'relation': '2 rooms', 'object': 'x'},
+    ]
+    exporter = AdminImportExporter(tmp_path / 'out', chunks_root=tmp_path / 'chunks',
+                                   embedder=TinyEmbedder(), embed_batch=2)
+    manifest = exporter.export(['s1'], triplets=triplets, ingest_ts='2025-01-01T00:00:00')
+    out = tmp_path / 'out'
+
+    assert _read(out / 'chunks_header.csv')[0] == ['id:ID(Chunk)', 'text', 'series', 'ingest_ts', 'content_hash',
+                                                   'embedding:float[]', 'embed_model', ':LABEL']
+    chunks = _read(out / 'chunks.csv')
+    assert [r[0] for r in chunks] == ['s1-000001', 's1-000002', 's1-000003']
+    assert chunks[1][1] == 'Ligne 1\nLigne "2"'
+    # mêmes (content_hash, embed_model) que run_from_series : pas de ré-embedding après l'import
+    assert chunks[0][4] == Neo4jVectorManager.content_hash('Prix : 250 000 DH')
+    assert chunks[0][5] == '17.0;0.5' and chunks[0][6] == 'tiny:2'
+    assert _read(out / 'next_chunk.csv') == [['s1-000001', 's1-000002', 'NEXT_CHUNK'],
+                                             ['s1-000002', 's1-000003', 'NEXT_CHUNK']]
+    # identifiants = clés canoniques des entités (mêmes clés que le MERGE de KGWriteBuffer)
+    assert _read(out / 'entities_header.csv')[0] == ['key:ID(Entity)', 'name', ':LABEL']
+    entities = _read(out / 'entities.csv')
+    assert ['al abrar', 'Al Abrar', 'Entity'] in entities
+    assert sorted(r[0] for r in entities) == ['250000', 'al abrar', 'f3', 'mediouna']   # une ligne par clé
+    assert _read(out / 'relations.csv') == [['al abrar', 'mediouna', 'LOCATED_IN', ''], ['f3', '250000', 'HAS_PRICE', '']]
+    # types normalisés comme KGWriteBuffer : « HAS--PRICE » = HAS_PRICE, « 2 rooms » rejeté
+    assert manifest['chunks'] == 3 and manifest['relations'] == 2 and manifest['rejected'] == 1
+    assert manifest['dimension'] == 2
+    assert "--array-delimiter=';'" in (out / 'import.sh').read_text()
+    assert '`vector.dimensions`: 2' in (out / 'post_import.cypher').read_text()
+
+def test_export_uses_configured_embed_prop_and_declares_alias(tmp_path):
+    series_dir = tmp_path / 'chunks' / 'chunks_s1'
+    series_dir.mkdir(parents=True)
+    (series_dir / 'chunk_1.txt').write_text('Texte', encoding='utf-8')
+    exporter = AdminImportExporter(tmp_path / 'out', chunks_root=tmp_path / 'chunks',
+                                   embedder=TinyEmbedder(), embed_prop='embedding_g2')
+    exporter.export(['s1'], index_name='chunk_vector')
+    assert 'embedding_g2:float[]' in _read(tmp_path / 'out' / 'chunks_header.csv')[0]
+    ddl = (tmp_path / 'out' / 'post_import.cypher').read_text()
+    assert 'ON (c.`embedding_g2`)' in ddl
+    assert 'MERGE (a:VectorIndexAlias {name: "chunk_vector"})' in ddl
+    assert 'a.embed_prop = "embedding_g2"' in ddl and 'a.model = "tiny:2"' in ddl
+
+def test_export_carries_provenance_and_kg_state_from_the_extraction_cache(tmp_path):
+    from knowledge.extraction_cache import ExtractionCache
+    from knowledge.rule_extractor import extraction_version
+    series_dir = tmp_path / 'chunks' / 'chunks_s1'
+    series_dir.mkdir(parents=True)
+    texts = ['Al Abrar à Mediouna', 'Al Abrar, F3 à 250 000 DH', 'Pas encore extrait']
+    for i, text in enumerate(texts, 1):
+        (series_dir / f'chunk_{i}.txt').write_text(text, encoding='utf-8')
+    cache = ExtractionCache(tmp_path / 'x.sqlite')
+    args = {'prompt_hash': 'p1', 'model': 'm', 'temperature': 0}
+    cache.put(texts[0], [{'subject': 'Al Abrar', 'relation': 'LOCATED_IN', 'object': 'Mediouna'}], **args)
+    cache.put(texts[1], [{'subject': 'Al Abrar', 'relation': 'LOCATED_IN', 'object': 'Mediouna'},
+                         {'subject': 'F3', 'relation': 'HAS_PRICE', 'object': '250000'}], **args)
+    out = tmp_path / 'out'
+    manifest = AdminImportExporter(out, chunks_root=tmp_path / 'chunks', cache=cache).export(
+        ['s1'], ingest_ts='2025-01-01T00:00:00')
+    assert manifest['chunks_extracted'] == 2 and manifest['mentions'] == 6
+    header = _read(out / 'chunks_header.csv')[0]
+    assert header[-5:] == ['kg_hash', 'kg_prompt', 'kg_status', 'kg_ts', ':LABEL']
+    chunks = _read(out / 'chunks.csv')
+    # même état que KGBuilder + ExtractionRouter : le chunk n'est pas réextrait après l'import
+    assert chunks[0][-5:-1] == [Neo4jVectorManager.content_hash(texts[0]), extraction_version('p1'),
+                                'done', '2025-01-01T00:00:00']
+    assert chunks[2][-5:-1] == ['', '', '', '']
+    assert _read(out / 'relations.csv') == [['al abrar', 'mediouna', 'LOCATED_IN', 's1-000001;s1-000002'],
+                                            ['f3', '250000', 'HAS_PRICE', 's1-000002']]
+    assert ['s1-000002', 'f3', 'MENTIONS'] in _read(out / 'mentions.csv')
+    assert "--relationships=mentions_header.csv,mentions.csv" in (out / 'import.sh').read_text()
@@ -0,0 +1,83 @@
+import sys
+import asyncio
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from conftest import FakeDriver
+from knowledge.community import PROMPT_VERSION, CommunityJob, communities, community_id, label_propagation
+
+def _clique(names):
+    return [(a, b, 1.0) for i, a in enumerate(names) for b in names[i + 1:]]
+
+EDGES = _clique(['a1', 'a2', 'a3', 'a4']) + _clique(['b1', 'b2', 'b3', 'b4']) + [('a1', 'b1', 1.0)]
+
+def test_label_propagation_separates_cliques_and_ignores_hubs():
+    hub = [(n, 'casablanca', 1.0) for n in ['a1', 'a2', 'a3', 'a4', 'b1', 'b2', 'b3', 'b4']]
+    labels = label_propagation(EDGES + hub, hub_degree=5)
+    groups = communities(labels, min_size=3)
+    assert sorted(map(sorted, groups))[0][:4] == ['a1', 'a2', 'a3', 'a4']
+    assert len(groups) == 2 and sum(map(len, groups)) == 9       # le hub rejoint une communauté
+    assert label_propagation(EDGES + hub, hub_degree=5) == labels   # reproductible
+
+class CommunityDriver(FakeDriver):
+    """Arêtes EDGES, communautés déjà résumées (*existing*), dimension de l'index existant."""
+    def __init__(self, existing=()):
+        super().__init__()
+        self.existing, self.index_dim = list(existing), None
+    def answer(self, cypher, params):
+        if 'count(r) AS w' in cypher:
+            return ({'a': a, 'b': b, 'w': w} for a, b, w in EDGES)
+        if 'c.prompt AS prompt' in cypher:
+            return self.existing
+        if 'SHOW VECTOR INDEXES' in cypher:
+            return [{'dim': self.index_dim}] if self.index_dim else []
+        if 'keys' in params:
+            return ({'s': k, 'rel': 'LOCATED_IN', 'o': 'Mediouna'} for k in params['keys'])
+        return ()
+    @property
+    def writes(self):
+        return [(c, p) for c, p in self.log if not any(
+            t in c for t in ('count(r) AS w', 'c.prompt AS prompt', 'SHOW VECTOR INDEXES')) and 'keys' not in p]
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+    async def ainvoke(self, prompt):
+        self.prompts.append(prompt)
+        return 'Projets de Mediouna\nCommunauté des projets situés à Mediouna.'
+
+class FakeEmbedder:
+    model_id = 'fake:2'
+    def embed_texts(self, texts):
+        return [[1.0, 0.0] for _ in texts]
+
+def test_job_summarizes_only_new_communities_and_writes_them():
+    kept = community_id(['a1', 'a2', 'a3', 'a4'])
+    driver, llm = CommunityDriver(existing=[{'id': kept, 'prompt': PROMPT_VERSION, 'embed_model': 'fake:2'}, {'id': 'old', 'prompt': 'x'}]), FakeLLM()
+    job = CommunityJob(driver, 'neo4j', llm=llm, embedder=FakeEmbedder(), min_size=3)
+    state = asyncio.run(job.run())
+    assert state['status'] == 'done' and state['communities'] == 2
+    assert state['reused'] == 1 and state['summarized'] == 1 and len(llm.prompts) == 1
+    assert 'b1 LOCATED_IN Mediouna' in llm.prompts[0]
+    params = {k: v for _, p in driver.writes for k, v in p.items()}
+    new_id = community_id(['b1', 'b2', 'b3', 'b4'])
+    assert params['keep'] == sorted([kept, new_id])                     # « old » supprimée
+    row = params['rows'][0]
+    assert row['id'] == new_id and row['title'] == 'Projets de Mediouna' and row['embedding'] == [1.0, 0.0]
+    assert any('CREATE VECTOR INDEX' in c and '`vector.dimensions`: 2' in c for c, _ in driver.writes)
+
+def test_reused_summaries_are_reembedded_after_an_embedder_change():
+    kept = community_id(['a1', 'a2', 'a3', 'a4'])
+    driver, llm = CommunityDriver(existing=[{'id': kept, 'prompt': PROMPT_VERSION, 'embed_model': 'old:384',
+                                        'title': 'Projets A', 'summary': 'Résumé A.'}]), FakeLLM()
+    driver.index_dim = 384
+    state = asyncio.run(CommunityJob(driver, 'neo4j', llm=llm, embedder=FakeEmbedder(), min_size=3).run())
+    # résumé gardé (pas d'appel LLM pour A), vecteur refait avec le modèle courant
+    assert state['reused'] == 1 and state['reembedded'] == 1 and len(llm.prompts) == 1
+    rows = {r['id']: r for _, p in driver.writes for r in p.get('rows', [])}
+    assert rows[kept]['summary'] == 'Résumé A.' and rows[kept]['embed_model'] == 'fake:2'
+    assert any(c.startswith('DROP INDEX `community_embedding`') for c, _ in driver.writes)   # 384 → 2
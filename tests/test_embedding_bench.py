@@ -0,0 +1,49 @@
+import sys
+import pathlib
+import math
+
+# ensure real backend modules are used, not stubs from other test files
+for name in [m for m in sys.modules if m == 'embedding' or m.startswith('embedding.')]:
+    sys.modules.pop(name)
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+from embedding.embedder_base import HashEmbedder
+from benchmarks.corpus import synthetic_corpus
+from benchmarks.embedding_bench import run_embedder_benchmark
+
+def test_hash_embedder_is_deterministic_and_normalized():
+    emb = HashEmbedder(dim=64)
+    v1 = emb.embed('Appartement F3 à Casablanca, 250 000 DH')
+    v2 = HashEmbedder(dim=64).embed('Appartement F3 à Casablanca, 250 000 DH')
+    assert v1 == v2
+    assert len(v1) == emb.dimension == 64
+    assert math.isclose(sum(x * x for x in v1), 1.0, rel_tol=1e-9)
+    assert v1 != emb.embed('مشروع الأبرار في مديونة')
+
+def test_synthetic_corpus_is_reproducible():
+    assert synthetic_corpus(20, seed=1) == synthetic_corpus(20, seed=1)
+    assert len(synthetic_corpus(20)) == 20
+
+def test_benchmark_reports_metrics_per_batch_size():
+    texts = synthetic_corpus(16)
+    rows = run_embedder_benchmark(HashEmbedder(dim=32), texts, batch_sizes=(4, 8), warmup=0)
+    assert [r['batch_size'] for r in rows] == [4, 8]
+    for r in rows:
+        assert r['n_texts'] == 16
+        assert r['texts_per_sec'] > 0 and r['tokens_per_sec'] > 0
+        assert r['p95_batch_ms'] >= r['p50_batch_ms']
+
+def test_peak_rss_without_resource_module(monkeypatch):
+    import builtins
+    import benchmarks.embedding_bench as bench
+    real_import = builtins.__import__
+    def no_psutil(name, *args, **kwargs):
+        if name == 'psutil':
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+    monkeypatch.setattr(bench, 'resource', None)
+    monkeypatch.setattr(builtins, '__import__', no_psutil)
+    assert bench._peak_rss_mb() is None
+    rows = bench.run_embedder_benchmark(HashEmbedder(dim=8), ['a b'], batch_sizes=(1,), warmup=0)
+    assert rows[0]['peak_rss_mb'] is None
@@ -0,0 +1,81 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from knowledge.entity_resolver import EntityResolver, canonical_key, entity_key
+
+def test_canonical_key_folds_case_accents_and_arabic_variants():
+    assert canonical_key('  CASABLANCA ') == canonical_key('casablanca') == 'casablanca'
+    assert canonical_key('Fès') == 'fes'
+    assert canonical_key('Résidence  Al-Abrar, 2') == 'residence al abrar 2'
+    assert canonical_key('أكادير') == canonical_key('اكادير')
+    assert canonical_key('مدينـــة') == canonical_key('مدينه')
+    assert canonical_key('شقة ٣') == canonical_key('شقة 3')
+    assert canonical_key('!!') == ''
+
+def test_resolver_aliases_fuzzy_matches_and_keeps_numbers_apart():
+    r = EntityResolver(threshold=0.6)
+    assert r.resolve('Casablanca') == ('casablanca', 'Casablanca')
+    assert r.resolve('Casa')[0] == r.resolve('الدار البيضاء')[0] == 'casablanca'
+    assert r.resolve('Marrakesh') == ('marrakech', 'Marrakech')
+    key, name = r.resolve('Residence Al Abrar')
+    assert r.resolve('Résidence Al-Abrar') == (key, name)
+    assert r.resolve('Residence Al Abrars')[0] == key        # faute de frappe : même bloc, trigrammes proches
+    assert r.resolve('Tranche 1')[0] != r.resolve('Tranche 2')[0]
+    assert r.stats['fuzzy'] == 1
+    assert entity_key('CASA') == 'casablanca'
+
+def test_resolver_loads_existing_entities():
+    r = EntityResolver()
+    r.load([('mediouna', 'Mediouna'), (None, 'Al Abrar')])
+    assert r.resolve('MEDIOUNA') == ('mediouna', 'Mediouna')
+    assert r.resolve('al abrar ') == ('al abrar', 'Al Abrar')
+
+def test_backfill_keeps_relationship_properties_in_one_transaction_per_key():
+    class Res:
+        def __init__(self, rows=()):
+            self.rows = list(rows)
+        def data(self):
+            return self.rows
+        def consume(self):
+            pass
+    class Tx:
+        def __init__(self, log):
+            self.log = log
+        def run(self, cypher, **params):
+            self.log.append((cypher, params))
+            if cypher.startswith('MATCH (d)-[r]-(m)'):
+                return Res([{'type': 'HAS_PRICE', 'm': 'p1', 'out': True,
+                             'props': {'value': 250000.0, 'chunks': ['s1-000002']}},
+                            {'type': 'MENTIONS', 'm': 'c9', 'out': False, 'props': {}}])
+            return Res()
+    class Session:
+        def __init__(self, driver):
+            self.driver = driver
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            pass
+        def run(self, cypher, **params):
+            return Res([{'eid': 'e1', 'name': 'Al Abrar', 'degree': 5},
+                        {'eid': 'e2', 'name': 'AL ABRAR', 'degree': 1}])
+        def execute_write(self, fn, *args):
+            self.driver.transactions += 1
+            return fn(Tx(self.driver.log), *args)
+    class Driver:
+        log, transactions = [], 0
+        def session(self, database=None):
+            return Session(self)
+    driver = Driver()
+    assert EntityResolver().backfill(driver) == {'keyed': 1, 'merged': 1}
+    assert driver.transactions == 1
+    merges = {c.split(':`')[1].split('`]')[0]: (c, p) for c, p in driver.log if 'MERGE' in c}
+    cypher, params = merges['HAS_PRICE']
+    assert params['rows'] == [{'m': 'p1', 'props': {'value': 250000.0}, 'chunks': ['s1-000002']}]
+    assert 'SET x += r.props SET x += old' in cypher and 'reduce(acc = coalesce(x.chunks, [])' in cypher
+    assert '(m)-[x:`MENTIONS`]->(k)' in merges['MENTIONS'][0]
+    assert 'k.price_mad = COLLECT' in driver.log[-1][0]
@@ -0,0 +1,87 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+from knowledge.extraction_cache import ExtractionCache
+
+ARGS = {'prompt_hash': 'p1', 'model': 'gemini-2.0-flash', 'temperature': 0}
+TRIPLETS = [{'subject': 'Al Abrar', 'relation': 'LOCATED_IN', 'object': 'Mediouna'}]
+
+def test_roundtrip_and_key_components(tmp_path):
+    cache = ExtractionCache(tmp_path / 'x.sqlite')
+    cache.put('chunk text', TRIPLETS, **ARGS)
+    assert cache.get('chunk text', **ARGS) == TRIPLETS
+    assert cache.get('chunk text ', **ARGS) is None
+    assert cache.get('chunk text', **{**ARGS, 'prompt_hash': 'p2'}) is None
+    assert cache.get('chunk text', **{**ARGS, 'model': 'gemini-1.5-pro'}) is None
+    assert cache.get('chunk text', **{**ARGS, 'temperature': 0.7}) is None
+    cache.close()
+    reopened = ExtractionCache(tmp_path / 'x.sqlite')      # persistant entre processus
+    assert reopened.get('chunk text', **ARGS) == TRIPLETS
+
+def test_purge_stale_prompt_versions(tmp_path):
+    cache = ExtractionCache(tmp_path / 'x.sqlite')
+    cache.put('a', TRIPLETS, **ARGS)
+    cache.put('b', TRIPLETS, **{**ARGS, 'prompt_hash': 'p2'})
+    assert cache.purge_stale('p2') == 1
+    assert cache.get('a', **ARGS) is None
+    assert list(cache.iter_triplets(prompt_hash='p2')) == TRIPLETS
+    assert cache.invalidate() == 1 and cache.stats()['entries'] == 0
+
+def test_iter_triplets_streams_in_batches(tmp_path):
+    cache = ExtractionCache(tmp_path / 'x.sqlite')
+    for i in range(5):
+        cache.put(f'chunk {i}', TRIPLETS, **ARGS)
+    it = cache.iter_triplets(batch=2)
+    first = next(it)                                   # lecture en cours : le cache reste utilisable
+    cache.put('chunk 5', TRIPLETS, **ARGS)
+    assert first == TRIPLETS[0] and len([first, *it]) == 5 * len(TRIPLETS)
+
+def _graph_builder_module():
+    """knowledge/graph_builder.py chargé sous un nom privé, LangChain remplacé par un stub."""
+    import types
+    import importlib.util
+    prompts, schema = types.ModuleType('langchain.prompts'), types.ModuleType('langchain.schema')
+    class PromptTemplate:
+        def __init__(self, template):
+            self.template = template
+        @classmethod
+        def from_template(cls, template):
+            return cls(template)
+        def format(self, **kw):
+            return kw['passage']
+    prompts.PromptTemplate, schema.BaseOutputParser = PromptTemplate, object
+    saved = {n: sys.modules.get(n) for n in ('langchain', 'langchain.prompts', 'langchain.schema')}
+    sys.modules.update({'langchain': types.ModuleType('langchain'),
+                        'langchain.prompts': prompts, 'langchain.schema': schema})
+    try:
+        path = pathlib.Path(__file__).resolve().parents[1] / 'backend' / 'knowledge' / 'graph_builder.py'
+        spec = importlib.util.spec_from_file_location('_graph_builder_under_test', path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+    finally:
+        for n, m in saved.items():
+            if m is None:
+                sys.modules.pop(n, None)
+            else:
+                sys.modules[n] = m
+    return mod
+
+def test_group_extraction_is_cached_per_chunk(tmp_path):
+    import json
+    import asyncio
+    class LLM:
+        model, temperature, prompts = 'fake', 0, []
+        async def ainvoke(self, prompt):
+            self.prompts.append(prompt)
+            out = [{'subject': line.split()[0], 'relation': 'LOCATED_IN', 'object': 'Mediouna'}
+                   for line in prompt.splitlines()]
+            return type('R', (), {'content': json.dumps(out)})()
+    gb = _graph_builder_module().GraphBuilder(llm=LLM(), cache=ExtractionCache(tmp_path / 'x.sqlite'))
+    first = asyncio.run(gb.aextract_chunks(['Abrar à Mediouna', 'Nour à Mediouna']))
+    assert len(first) == 2 and len(gb.llm.prompts) == 1
+    # regroupement différent : seul le nouveau chunk part au LLM
+    again = asyncio.run(gb.aextract_chunks(['Nour à Mediouna', 'Zahra à Mediouna']))
+    assert gb.llm.prompts[-1] == 'Zahra à Mediouna'
+    assert sorted(t.subject for t in again) == ['Nour', 'Zahra']
@@ -0,0 +1,61 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from knowledge.geocoder import Geocoder, get_gazetteer, proximity
+
+def test_bundled_gazetteer_resolves_french_and_arabic_names():
+    g = get_gazetteer()
+    assert g.lookup('الدار البيضاء')['name'] == 'Casablanca'
+    assert g.lookup('Médiouna')['name'] == 'Mediouna'
+    assert [p['name'] for p in g.find('Résidence Al Abrar, Casa Anfa - Casablanca')] == ['Casa Anfa', 'Casablanca']
+    assert all(-17 < p['lon'] < 0 and 20 < p['lat'] < 36 for p in g.places)
+
+def test_proximity_questions():
+    near = proximity('projets près de Mediouna')
+    assert near['place']['name'] == 'Mediouna' and near['radius_km'] == 5 and near['limit'] is None
+    assert proximity('à moins de 10 km de Bouskoura')['radius_km'] == 10
+    top = proximity('les 3 projets les plus proches de Temara')
+    assert top['place']['name'] == 'Temara' and top['limit'] == 3
+    assert proximity('مشاريع بالقرب من الدار البيضاء')['place']['name'] == 'Casablanca'
+    assert proximity('appartements de moins de 1,2 M DH à Casablanca') is None
+
+def test_geocoder_writes_places_then_propagates_in_one_transaction():
+    class Result:
+        def __init__(self, n):
+            self.n = n
+        def single(self):
+            return {'n': self.n}
+        def consume(self):
+            pass
+    class Tx:
+        def __init__(self, log):
+            self.log = log
+        def run(self, cypher, **params):
+            self.log.append((cypher, params))
+            return Result(2 if 'rows' in params else 1)
+    class Session:
+        def __init__(self, log):
+            self.log = log
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            pass
+        def execute_write(self, fn, *args):
+            self.log.append('tx')
+            return fn(Tx(self.log), *args)
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return Session(self.log)
+    driver = Driver()
+    assert Geocoder(driver, 'neo4j').run() == {'places': 2, 'located': 1}
+    assert driver.log.count('tx') == 1
+    (places_q, params), (retract_q, _), (located_q, _) = driver.log[1:]
+    assert 'point({latitude: r.lat, longitude: r.lon})' in places_q
+    assert {'key': 'casa', 'name': 'Casablanca', 'kind': 'city', 'lat': 33.5731, 'lon': -7.5898} in params['rows']
+    assert 'REMOVE p.location' in retract_q and 'LOCATED_IN*1..2' in located_q
@@ -0,0 +1,202 @@
+import sys
+import types
+import asyncio
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m in ('knowledge', 'embedding') or m.startswith(('knowledge.', 'embedding.'))]:
+    sys.modules.pop(name)
+
+# GraphBuilder (LangChain) et neo4j ne sont pas nécessaires : stubs légers
+if 'neo4j' not in sys.modules:
+    neo4j_mod = types.ModuleType('neo4j')
+    neo4j_mod.GraphDatabase = object
+    sys.modules['neo4j'] = neo4j_mod
+graph_builder_mod = types.ModuleType('knowledge.graph_builder')
+graph_builder_mod.GraphBuilder = object
+sys.modules['knowledge.graph_builder'] = graph_builder_mod
+
+from conftest import FakeDriver
+from knowledge.kg_builder import KGBuilder
+from knowledge.kg_writer import KGWriteBuffer, normalize_rel_type
+
+class T:
+    def __init__(self, s, r, o):
+        self.subject, self.relation, self.object = s, r, o
+
+class FakeChain:
+    def __init__(self):
+        self.prompts = []
+    async def aextract_relations(self, text):
+        self.prompts.append(text)
+        if 'boom' in text:
+            raise RuntimeError('quota')
+        return [T('Al Abrar', 'LOCATED_IN', 'Mediouna'), T('al abrar ', 'located_in', 'MEDIOUNA'),
+                T(text.split()[0], 'HAS_PRICE', '250000')]
+
+class Deadlock(Exception):
+    def is_retryable(self):
+        return True
+
+class KGDriver(FakeDriver):
+    """Graphe minimal du KG : triplets écrits, MENTIONS, provenance retirée, état des chunks."""
+    def __init__(self, deadlocks=0, entities=()):
+        super().__init__()
+        self.triplets, self.deadlocks, self.transactions = [], deadlocks, 0
+        self.mentions, self.retracted, self.states = [], [], {}
+        self.entities = list(entities)
+        self.missing = set()
+    def before_write(self):
+        if self.deadlocks:
+            self.deadlocks -= 1
+            raise Deadlock('DeadlockDetected')
+        self.transactions += 1
+    def answer(self, cypher, params):
+        rows = params.get('rows', ())
+        if 'kg_hash AS hash' in cypher:
+            return ({'id': i, 'hash': h, 'prompt': p, 'status': st}
+                    for i, (h, p, st) in self.states.items() if i in params['ids'])
+        if 'c IS NULL' in cypher:                        # chunks non ingérés
+            return ({'id': i} for i in params['ids'] if i in self.missing)
+        if 'STARTS WITH' in cypher:
+            return ({'id': i} for i in self.states if i.startswith(params['prefix']) and i not in params['ids'])
+        if 'c.kg_hash = r.hash' in cypher:
+            self.states.update({r['id']: (r['hash'], r['prompt'], r['status']) for r in rows})
+        elif 'ids' in params:                            # retrait de provenance
+            self.retracted.append(params['ids'])
+        elif ':MENTIONS]' in cypher:
+            self.mentions.extend((r['cid'], r['key']) for r in rows)
+        elif rows and ':`' in cypher:
+            rel = cypher.split(':`')[1].split('`]')[0]
+            self.triplets.extend({'s': r['s'], 'rel': rel, 'o': r['o'], 'chunks': r['cids']} for r in rows)
+        else:
+            return self.entities
+        return ()
+
+def test_group_chunks_respects_token_budget():
+    chunks = ['a' * 40, 'b' * 40, 'c' * 40, '   ', 'd' * 400]
+    groups = KGBuilder.group_chunks(chunks, max_tokens=25)
+    assert [len(g) for g in groups] == [2, 1, 1]
+
+def test_abuild_extracts_groups_concurrently_and_dedupes():
+    chain, driver = FakeChain(), KGDriver()
+    kg = KGBuilder(driver=driver, database='neo4j', llm=chain, schema_manager=None)
+    out = asyncio.run(kg.abuild_from_chunks(['F3 ' * 10, 'F4 ' * 10, 'boom ' * 10], max_tokens=10, concurrency=2))
+    assert len(chain.prompts) == 3
+    assert out['failed_groups'] == [2] and out['groups'] == 3
+    # 1 LOCATED_IN dédupliqué entre groupes et variantes de casse + 1 HAS_PRICE par groupe réussi
+    assert out['triplets_created'] == 3
+    written = [(r['s'], r['rel'], r['o']) for r in driver.triplets]
+    assert sorted(written) == [('Al Abrar', 'LOCATED_IN', 'Mediouna'), ('F3', 'HAS_PRICE', '250000'),
+                               ('F4', 'HAS_PRICE', '250000')]
+    assert not driver.mentions                  # sans série : pas d'ids de chunks
+
+def test_abuild_records_chunk_provenance():
+    class Chain:
+        async def aextract_relations(self, text):
+            if 'F3' in text:
+                return [T('F3', 'HAS_PRICE', '250000'), T('al-abrar', 'LOCATED_IN', 'Mediouna')]
+            return [T('Al Abrar', 'LOCATED_IN', 'Mediouna')]
+    driver = KGDriver()
+    kg = KGBuilder(driver=driver, database='neo4j', llm=Chain(), schema_manager=None)
+    chunks = ['Résidence Al Abrar à Mediouna', '', 'F3 Al Abrar : 250 000 DH']
+    asyncio.run(kg.abuild_from_chunks(chunks, series='s1', max_tokens=8))
+    rels = {r['rel']: r['chunks'] for r in driver.triplets}
+    # chunk 2 vide : ids alignés sur la position ; « 250000 » absent du texte (250 000) → tout le groupe
+    assert rels == {'LOCATED_IN': ['s1-000001', 's1-000003'], 'HAS_PRICE': ['s1-000003']}
+    assert sorted(driver.mentions) == [('s1-000001', 'al abrar'), ('s1-000001', 'mediouna'),
+                                       ('s1-000003', '250000'), ('s1-000003', 'al abrar'),
+                                       ('s1-000003', 'f3'), ('s1-000003', 'mediouna')]
+
+def test_write_buffer_groups_by_type_in_one_transaction_with_retry():
+    driver = KGDriver(deadlocks=1)
+    buf = KGWriteBuffer(driver, 'addoha2', batch_size=100, backoff=0)
+    buf.add([T('A', 'has price', '1'), T('B', 'LOCATED_IN', 'X'), T('A', 'Has-Price', '1'),
+             T('C', 'LOCATED_IN`]->(x) DETACH DELETE x //', 'Y'), T('', 'LOCATED_IN', 'Z'), T('D', '42', 'E')])
+    assert len(buf) == 3 and buf.stats['duplicates'] == 1 and buf.stats['rejected'] == 2
+    assert buf.flush() == 3
+    assert driver.transactions == 1 and buf.stats['retries'] == 1
+    assert set(driver.databases) == {'addoha2'}
+    assert {r['rel'] for r in driver.triplets} == {'HAS_PRICE', 'LOCATED_IN', 'LOCATED_IN_X_DETACH_DELETE_X'}
+    assert normalize_rel_type('42') is None
+
+def test_write_buffer_flushes_when_full():
+    driver = KGDriver()
+    buf = KGWriteBuffer(driver, batch_size=2)
+    buf.add([T('A', 'R', str(i)) for i in range(5)])
+    assert driver.transactions == 1 and len(buf) == 0
+
+def test_incremental_build_extracts_only_the_delta():
+    chain, driver = FakeChain(), KGDriver()
+    kg = KGBuilder(driver=driver, database='neo4j', llm=chain, schema_manager=None)
+    first = asyncio.run(kg.abuild_from_chunks(['F3 a', 'F4 b', 'F5 c'], series='s1', max_tokens=2))
+    assert first['chunks_extracted'] == 3 and set(driver.states) == {'s1-000001', 's1-000002', 's1-000003'}
+    chain.prompts.clear()
+    again = asyncio.run(kg.abuild_from_chunks(['F3 a', 'F4 b', 'F5 c'], series='s1', max_tokens=2))
+    assert chain.prompts == [] and again['chunks_skipped'] == 3 and again['triplets_created'] == 0
+    # chunk 2 modifié, chunk 3 disparu : seul le chunk 2 est réextrait, les deux perdent leur provenance
+    third = asyncio.run(kg.abuild_from_chunks(['F3 a', 'F6 b'], series='s1', max_tokens=2))
+    assert chain.prompts == ['F6 b'] and third['chunks_retracted'] == 2
+    assert driver.retracted[-3:] == [['s1-000002', 's1-000003']] * 2 + [['s1-000003']]   # état effacé : disparu
+
+def test_budget_defers_groups_and_checkpoints_progress():
+    chain, driver, snaps = FakeChain(), KGDriver(), []
+    kg = KGBuilder(driver=driver, database='neo4j', llm=chain, schema_manager=None)
+    out = asyncio.run(kg.abuild_from_chunks(['F3 aaaa', 'F4 bbbb', 'F5 cccc'], series='s1', max_tokens=2,
+                                            concurrency=1, token_budget=4, on_progress=snaps.append))
+    # 2 tokens estimés par groupe : le 3e groupe n'est pas lancé, ses chunks restent à traiter
+    assert out['complete'] is False and out['deferred_groups'] == [2] and len(chain.prompts) == 2
+    assert set(driver.states) == {'s1-000001', 's1-000002'}
+    assert snaps[-1]['chunks_done'] == 2 and snaps[-1]['tokens'] == 4
+
+def test_structured_chunks_bypass_the_llm():
+    from knowledge.rule_extractor import ExtractionRouter
+    chain, driver = FakeChain(), KGDriver()
+    kg = KGBuilder(driver=driver, database='neo4j', llm=ExtractionRouter(chain), schema_manager=None)
+    out = asyncio.run(kg.abuild_from_chunks(['{"projet": "Al Abrar", "ville": "Mediouna"}', 'F4 texte libre'],
+                                            series='s1', max_tokens=50))
+    assert chain.prompts == ['F4 texte libre']
+    assert out['chunks_rules'] == 1 and out['rule_fraction'] == 0.5 and out['chunks_extracted'] == 2
+    assert set(driver.states) == {'s1-000001', 's1-000002'}
+
+def test_sync_build_works_inside_a_running_loop():
+    driver = KGDriver()
+    kg = KGBuilder(driver=driver, database='neo4j', llm=FakeChain(), schema_manager=None)
+    async def handler():                        # handler FastAPI / cellule de notebook
+        return kg.build_from_chunks(['F3 ' * 10], incremental=False)
+    out = asyncio.run(handler())
+    assert out['groups'] == 1 and out['triplets_created'] == 2
+
+def test_changed_chunk_keeps_provenance_until_its_new_triplets_are_written():
+    chain, driver = FakeChain(), KGDriver()
+    kg = KGBuilder(driver=driver, database='neo4j', llm=chain, schema_manager=None)
+    asyncio.run(kg.abuild_from_chunks(['F3 a', 'F4 b'], series='s1', max_tokens=2))
+    # réextraction en échec : l'ancienne provenance reste, le chunk sera repris
+    out = asyncio.run(kg.abuild_from_chunks(['F3 a', 'boom b'], series='s1', max_tokens=2))
+    assert out['failed_groups'] == [0] and out['chunks_retracted'] == 0 and not driver.retracted
+    assert driver.states['s1-000002'][2] == 'failed'
+    before = driver.transactions
+    out = asyncio.run(kg.abuild_from_chunks(['F3 a', 'F6 b'], series='s1', max_tokens=2))
+    # retrait et nouveaux triplets dans la même transaction, puis l'état des chunks
+    assert out['chunks_retracted'] == 1 and driver.retracted == [['s1-000002']] * 3
+    assert driver.transactions - before == 2
+
+def test_groups_are_passed_chunk_by_chunk_when_the_chain_supports_it():
+    class Chain(FakeChain):
+        async def aextract_chunks(self, chunks):
+            self.prompts.append(list(chunks))
+            return [T(c.split()[0], 'HAS_PRICE', '1') for c in chunks]
+    chain = Chain()
+    kg = KGBuilder(driver=KGDriver(), database='neo4j', llm=chain, schema_manager=None)
+    out = asyncio.run(kg.abuild_from_chunks(['F3 a', 'F4 b', 'F5 c'], series='s1', max_tokens=4))
+    assert chain.prompts == [['F3 a', 'F4 b'], ['F5 c']] and out['triplets_created'] == 3
+
+def test_series_build_refuses_chunks_that_were_never_ingested():
+    import pytest
+    chain, driver = FakeChain(), KGDriver()
+    driver.missing = {'s1-000002'}
+    kg = KGBuilder(driver=driver, database='neo4j', llm=chain, schema_manager=None)
+    with pytest.raises(ValueError, match='1 chunk'):
+        asyncio.run(kg.abuild_from_chunks(['F3 a', 'F4 b'], series='s1'))
+    assert chain.prompts == [] and not driver.states
@@ -0,0 +1,58 @@
+import sys
+import json
+import asyncio
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from knowledge.kg_jobs import KGBuildJob, list_jobs, load_job
+
+class FakeBuilder:
+    """Série de 10 chunks, 100 tokens par chunk ; les chunks déjà faits sont sautés à la reprise."""
+    def __init__(self):
+        self.done, self.calls = 0, []
+    async def abuild_from_series(self, series, *, concurrency, token_budget, cancel, on_progress):
+        self.calls.append(token_budget)
+        todo = 10 - self.done
+        n = todo if token_budget is None else min(todo, token_budget // 100)
+        for i in range(1, n + 1):
+            on_progress({'chunks_total': todo, 'chunks_done': i, 'triplets': 2 * i, 'tokens': 100 * i, 'eta': 1.0})
+        self.done += n
+        return {'complete': self.done == 10, 'failed_groups': [], 'chunks_skipped': 10 - todo,
+                'chunks_retracted': 0}
+
+def test_job_checkpoints_and_resumes_with_cumulative_budget(tmp_path):
+    builder = FakeBuilder()
+    job = KGBuildJob(builder, 's1', token_budget=400, job_dir=tmp_path)
+    state = asyncio.run(job.run())
+    assert state['status'] == 'budget_exhausted' and state['chunks_done'] == 4 and state['tokens'] == 400
+    saved = json.loads((tmp_path / f'{job.job_id}.json').read_text())
+    assert saved['chunks_done'] == 4 and not list(tmp_path.glob('*.tmp'))
+
+    # nouveau processus : rechargé depuis le fichier, budget total relevé à 1000
+    restored = KGBuildJob.load(builder, tmp_path / f'{job.job_id}.json')
+    state = asyncio.run(restored.run(token_budget=1000))
+    assert builder.calls == [400, 600]                    # budget restant, pas le total
+    assert state['status'] == 'done' and state['chunks_done'] == 10 and state['triplets'] == 20
+    assert state['chunks_total'] == 10 and state['runs'] == 2
+
+def test_interrupted_job_is_listed_and_reloadable(tmp_path):
+    job = KGBuildJob(FakeBuilder(), 's2', job_dir=tmp_path)
+    job.state['status'] = 'running'
+    job.save()
+    assert [j['status'] for j in list_jobs(tmp_path)] == ['interrupted']
+    again = load_job(FakeBuilder(), job.job_id, tmp_path)
+    assert again.state['status'] == 'interrupted' and again.state['series'] == 's2'
+
+def test_failed_groups_end_in_a_distinct_terminal_status(tmp_path):
+    from knowledge.kg_jobs import TERMINAL
+    class Failing(FakeBuilder):
+        async def abuild_from_series(self, series, **kw):
+            out = await super().abuild_from_series(series, **kw)
+            return {**out, 'failed_groups': [3]}
+    state = asyncio.run(KGBuildJob(Failing(), 's3', job_dir=tmp_path).run())
+    assert state['status'] == 'done_with_errors' and state['failed_groups'] == 1
+    assert 'done_with_errors' in TERMINAL
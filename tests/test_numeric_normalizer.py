@@ -0,0 +1,60 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from knowledge.numeric_normalizer import normalize, parse_price, parse_rooms, parse_surface, range_constraints
+from knowledge.kg_writer import KGWriteBuffer
+
+def test_parses_french_and_arabic_formats():
+    assert parse_price('1,2 M DH') == 1200000.0
+    assert parse_price('à partir de 850 000 dhs') == 850000.0
+    assert parse_price('250.000 DH') == 250000.0
+    assert parse_price('٢٥٠ ألف درهم') == 250000.0
+    assert parse_surface('65,5 m²') == 65.5
+    assert parse_surface('120 متر مربع') == 120.0
+    assert parse_rooms('F3') == 3 and parse_rooms('4 pièces') == 4 and parse_rooms('Studio') == 1
+    assert normalize('HAS_PRICE', 'sur demande') is None
+    assert normalize('HAS_STANDING', 'Haut standing') is None
+
+def test_range_constraints_from_questions():
+    assert range_constraints('appartements de moins de 1,2 M DH à Casablanca') == {'price_mad': (None, 1200000.0)}
+    assert range_constraints('apartments under 1.2M DH in Casablanca') == {'price_mad': (None, 1200000.0)}
+    assert range_constraints('F3 entre 60 et 80 m²') == {'surface_m2': (60.0, 80.0), 'rooms': (3.0, 3.0)}
+    assert range_constraints('شقق أقل من ٨٠٠ ألف درهم') == {'price_mad': (None, 800000.0)}
+    assert range_constraints('Qui est le promoteur ?') == {}
+
+def test_write_buffer_sets_typed_value_on_numeric_relations():
+    class Tx:
+        def __init__(self, log):
+            self.log = log
+        def run(self, cypher, rows=(), **params):
+            self.log.append((cypher, list(rows)))
+            return self
+        def consume(self):
+            pass
+    class Session:
+        def __init__(self, log):
+            self.log = log
+        def __enter__(self):
+            return self
+        def __exit__(self, *exc):
+            pass
+        def execute_write(self, fn, *args):
+            return fn(Tx(self.log), *args)
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return Session(self.log)
+    driver = Driver()
+    with KGWriteBuffer(driver) as buf:
+        buf.add([{'subject': 'Appartement F3', 'relation': 'HAS_PRICE', 'object': '1,2 M DH'},
+                 {'subject': 'Appartement F3', 'relation': 'LOCATED_IN', 'object': 'Casablanca'}])
+    queries = {c.split(':`')[1].split('`]')[0]: (c, rows) for c, rows in driver.log}
+    price_q, price_rows = queries['HAS_PRICE']
+    assert price_rows[0]['num'] == 1200000.0
+    assert 'SET rel.value = r.num' in price_q and 's.price_mad' in price_q
+    assert 'num' not in queries['LOCATED_IN'][1][0] and 'price_mad' not in queries['LOCATED_IN'][0]
@@ -17,16 +17,32 @@ class FakeEmbeddingManager:
 embedding_manager_mod.EmbeddingManager = FakeEmbeddingManager
 vector_store_mod = types.ModuleType('embedding.vector_store')
 class FakeVectorStore:
+    alias_generation = 0
     def __init__(self, *args, **kwargs):
         pass
+    def active(self):
+        return {'index': 'chunk_vector', 'embed_prop': 'embedding', 'generation': self.alias_generation}
+    async def aactive(self):
+        return self.active()
+    # même contrat que Neo4jVectorManager : search garde l'id, search_similar le retire
+    def search(self, embedding, k=5, filters=None):
+        return [{'id': 's1-000001', 'score': 0.9, 'text': 'Alice met Bob.'}]
+    async def asearch(self, embedding, k=5, filters=None):
+        return self.search(embedding, k=k, filters=filters)
     def search_similar(self, embedding, k=5):
-        return [{'score': 0.9, 'text': 'Alice met Bob.'}]
+        return [{'score': h['score'], 'text': h['text']} for h in self.search(embedding, k=k)]
+    async def asearch_similar(self, embedding, k=5):
+        return self.search_similar(embedding, k=k)
 vector_store_mod.Neo4jVectorManager = FakeVectorStore
+ann_index_mod = types.ModuleType('embedding.ann_index')
+ann_index_mod.get_ann_index = lambda: None
 embedding_pkg.embedding_manager = embedding_manager_mod
 embedding_pkg.vector_store = vector_store_mod
+embedding_pkg.ann_index = ann_index_mod
 sys.modules['embedding'] = embedding_pkg
 sys.modules['embedding.embedding_manager'] = embedding_manager_mod
 sys.modules['embedding.vector_store'] = vector_store_mod
+sys.modules['embedding.ann_index'] = ann_index_mod
 
 # stub neo4j driver and type
 neo4j_mod = types.ModuleType('neo4j')
@@ -40,9 +56,23 @@ neo4j_mod.GraphDatabase = GraphDatabase
 sys.modules['neo4j'] = neo4j_mod
 
 from rag.retriever import Retriever
+from rag.retrieval_cache import RetrievalCache, get_retrieval_cache
+from db.generations import generations
+
+@pytest.fixture(autouse=True)
+def fresh_retrieval_cache():
+    # le cache partagé survivrait d'un test à l'autre
+    cache = get_retrieval_cache()
+    if cache is not None:
+        cache.clear()
 
 class DummySession:
-    def run(self, cypher, ents):
+    def __init__(self, log=None):
+        self.log = log if log is not None else []
+    def run(self, cypher, **params):
+        self.log.append(params)
+        if 'ids' in params:           # KG construit sans provenance : aucune MENTIONS
+            return []
         return [{'name': 'Alice', 'labels': ['Person']}]
     def __enter__(self):
         return self
@@ -50,9 +80,41 @@ class DummySession:
         pass
 
 class DummyDriver:
-    def session(self):
+    def session(self, database=None):
         return DummySession()
 
+class AsyncRecord(dict):
+    def data(self):
+        return dict(self)
+
+class AsyncResult:
+    def __init__(self, rows):
+        self.rows = rows
+    def __aiter__(self):
+        self._it = iter(self.rows)
+        return self
+    async def __anext__(self):
+        try:
+            return AsyncRecord(next(self._it))
+        except StopIteration:
+            raise StopAsyncIteration
+
+class AsyncTx:
+    async def run(self, cypher, **params):
+        return AsyncResult([{'name': 'Alice', 'labels': ['Person']}])
+
+class AsyncSession:
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *exc):
+        pass
+    async def execute_read(self, work):
+        return await work(AsyncTx())
+
+class AsyncDriver:
+    def session(self, database=None):
+        return AsyncSession()
+
 @pytest.fixture
 def retriever():
     embedder = FakeEmbeddingManager()
@@ -64,3 +126,181 @@ def test_retrieve_combines_sources(retriever):
     result = retriever.retrieve('Who is Alice?')
     assert result['vector_hits'][0]['text'] == 'Alice met Bob.'
     assert result['cypher_hits'][0]['name'] == 'Alice'
+
+def test_retrieve_expands_hits_through_mentions():
+    class MentionsSession(DummySession):
+        def run(self, cypher, **params):
+            self.log.append(params)
+            return [{'name': 'Alice', 'labels': ['Entity'], 'facts': ['LIVES_IN Paris']}]
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return MentionsSession(self.log)
+    driver = Driver()
+    # mode "vector" par défaut, sans ANN ni filtre : le chemin de production
+    result = Retriever(FakeEmbeddingManager(), FakeVectorStore(), driver).retrieve('Where is Alice?')
+    assert driver.log == [{'ids': ['s1-000001']}]          # une seule traversée, pas d'heuristique
+    assert result['cypher_hits'][0]['facts'] == ['LIVES_IN Paris']
+
+def test_aretrieve_default_mode_expands_through_mentions():
+    import asyncio
+    queries = []
+    class Tx:
+        async def run(self, cypher, **params):
+            queries.append(params)
+            return AsyncResult([{'name': 'Alice', 'labels': ['Entity'], 'facts': ['LIVES_IN Paris']}])
+    class Session(AsyncSession):
+        async def execute_read(self, work):
+            return await work(Tx())
+    class Driver:
+        def session(self, database=None):
+            return Session()
+    r = Retriever(FakeEmbeddingManager(), FakeVectorStore(), DummyDriver(), async_driver=Driver())
+    result = asyncio.run(r.aretrieve('Where is Alice?'))
+    assert {'ids': ['s1-000001']} in queries
+    assert result['cypher_hits'][0]['facts'] == ['LIVES_IN Paris']
+
+def test_retrieve_uses_in_process_ann_when_enabled():
+    class FakeAnn:
+        def search(self, embedding, k=5):
+            return [{'id': 'c1', 'score': 0.95, 'text': 'Alice lives in Paris.'}]
+    r = Retriever(FakeEmbeddingManager(), FakeVectorStore(), DummyDriver(), ann_index=FakeAnn())
+    result = r.retrieve('Where is Alice?')
+    assert result['vector_hits'] == [{'id': 'c1', 'score': 0.95, 'text': 'Alice lives in Paris.'}]
+
+def test_aretrieve_uses_async_driver():
+    import asyncio
+    r = Retriever(FakeEmbeddingManager(), FakeVectorStore(), DummyDriver(), async_driver=AsyncDriver())
+    result = asyncio.run(r.aretrieve('Who is Alice?'))
+    assert result['vector_hits'][0]['text'] == 'Alice met Bob.'
+    assert result['cypher_hits'] == [{'name': 'Alice', 'labels': ['Person']}]
+
+def test_retrieve_cache_serves_repeats_until_series_is_reingested():
+    calls = []
+    class CountingStore(FakeVectorStore):
+        def search(self, embedding, k=5, filters=None):
+            calls.append(filters)
+            return [{'id': 'c1', 'score': 0.9, 'text': 'Alice met Bob.'}]
+    r = Retriever(FakeEmbeddingManager(), CountingStore(), DummyDriver(), cache=RetrievalCache())
+    first = r.retrieve('Prix F3  Casablanca ?', filters={'series': 's1'})
+    first['vector_hits'].clear()                       # copie : le cache n'est pas modifié
+    again = r.retrieve('prix f3 casablanca', filters={'series': 's1'})
+    assert len(calls) == 1 and again['vector_hits'][0]['id'] == 'c1'
+    generations.bump('s2')                             # autre série : entrée toujours valide
+    r.retrieve('prix f3 casablanca', filters={'series': 's1'})
+    assert len(calls) == 1
+    generations.bump('s1')
+    r.retrieve('prix f3 casablanca', filters={'series': 's1'})
+    assert len(calls) == 2
+
+def test_alias_swap_invalidates_series_filtered_entries():
+    calls = []
+    class CountingStore(FakeVectorStore):
+        def search(self, embedding, k=5, filters=None):
+            calls.append(filters)
+            return [{'id': 'c1', 'score': 0.9, 'text': 'Alice met Bob.'}]
+    store = CountingStore()
+    r = Retriever(FakeEmbeddingManager(), store, DummyDriver(), cache=RetrievalCache())
+    r.retrieve('prix f3', filters={'series': 's1'})
+    generations.bump(kind='index')                     # bascule dans ce processus
+    r.retrieve('prix f3', filters={'series': 's1'})
+    assert len(calls) == 2
+    store.alias_generation = 7                         # bascule faite par un autre worker (nœud alias)
+    r.retrieve('prix f3', filters={'series': 's1'})
+    r.retrieve('prix f3', filters={'series': 's1'})
+    assert len(calls) == 3
+
+def test_hybrid_mode_fuses_fulltext_and_vector_by_rank():
+    class HybridStore(FakeVectorStore):
+        def search(self, embedding, k=5, filters=None):
+            return [{'id': 'c1', 'score': 0.9, 'text': 'Alice met Bob.'},
+                    {'id': 'c2', 'score': 0.8, 'text': 'Résidence Al Abrar, Casablanca.'}]
+        def search_fulltext(self, text, k=5, filters=None):
+            return [{'id': 'c2', 'score': 7.1, 'text': 'Résidence Al Abrar, Casablanca.'},
+                    {'id': 'c3', 'score': 2.0, 'text': 'Al Abrar tranche 2.'}]
+    r = Retriever(FakeEmbeddingManager(), HybridStore(), DummyDriver(), cache=RetrievalCache())
+    hits = r.retrieve('Al Abrar', k=2, mode='hybrid')['vector_hits']
+    assert [h['id'] for h in hits] == ['c2', 'c1']
+    assert hits[0]['sources'] == ['vector', 'fulltext']
+    with pytest.raises(ValueError):
+        r.retrieve('Al Abrar', mode='bm25')
+
+def test_numeric_question_adds_indexed_range_lookup():
+    class RangeSession(DummySession):
+        def run(self, cypher, **params):
+            self.log.append((cypher, params))
+            if 'price_mad_max' in params:
+                return [{'name': 'Appartement F3', 'labels': ['Entity'], 'facts': ['HAS_PRICE 1,1 M DH']}]
+            return [{'name': 'Alice', 'labels': ['Person']}]
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return RangeSession(self.log)
+    driver = Driver()
+    r = Retriever(FakeEmbeddingManager(), FakeVectorStore(), driver, cache=RetrievalCache())
+    hits = r.retrieve('Appartements à moins de 1,2 M DH à Casablanca')['cypher_hits']
+    assert [h['name'] for h in hits] == ['Appartement F3', 'Alice']
+    cypher, params = driver.log[0]
+    assert 'n.price_mad <= $price_mad_max' in cypher
+    assert params['price_mad_max'] == 1200000.0 and params['places'] == ['casablanca']
+
+def test_proximity_question_runs_point_distance_lookup():
+    class GeoSession(DummySession):
+        def run(self, cypher, **params):
+            self.log.append((cypher, params))
+            if 'meters' in params:
+                return [{'name': 'Al Abrar', 'labels': ['Entity'], 'facts': [], 'distance_km': 1.2}]
+            return []
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return GeoSession(self.log)
+    driver = Driver()
+    r = Retriever(FakeEmbeddingManager(), FakeVectorStore(), driver, cache=RetrievalCache())
+    hits = r.retrieve('Projets près de Mediouna ?')['cypher_hits']
+    assert hits == [{'name': 'Al Abrar', 'labels': ['Entity'], 'facts': [], 'distance_km': 1.2}]
+    cypher, params = driver.log[0]
+    assert 'point.distance(n.location, center) <= $meters' in cypher
+    assert params['meters'] == 5000 and params['limit'] == 20 and round(params['lat'], 2) == 33.45
+
+def test_global_mode_answers_from_community_summaries():
+    class Session(DummySession):
+        def run(self, cypher, **params):
+            self.log.append((cypher, params))
+            if cypher.startswith('SHOW VECTOR INDEXES'):
+                return [{'n': 1}]
+            return [{'id': 'c1', 'title': 'Addoha', 'summary': 'Économique à Casablanca et Fès.',
+                     'size': 12, 'score': 0.9}]
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return Session(self.log)
+    class Store(FakeVectorStore):
+        def search_similar(self, embedding, k=5):
+            raise AssertionError('le mode global ne lit pas les passages')
+    driver = Driver()
+    hits = Retriever(FakeEmbeddingManager(), Store(), driver, cache=RetrievalCache()).retrieve(
+        'Quels standings Addoha propose-t-il selon les villes ?', mode='global')
+    assert hits['vector_hits'] == [] and hits['cypher_hits'] == []
+    assert hits['community_hits'][0]['title'] == 'Addoha'
+    assert len(driver.log) == 2 and 'db.index.vector.queryNodes' in driver.log[1][0]
+    assert driver.log[1][1]['k'] == 8                   # k = nombre de résumés
+    from rag.context_manager import ContextManager
+    assert ContextManager.merge(**hits) == 'Addoha : Économique à Casablanca et Fès.'
+
+def test_global_mode_without_community_index_returns_a_notice():
+    class Session(DummySession):
+        def run(self, cypher, **params):
+            self.log.append((cypher, params))
+            if cypher.startswith('SHOW VECTOR INDEXES'):
+                return [{'n': 0}]
+            raise AssertionError("pas de requête sur un index absent")
+    class Driver:
+        log = []
+        def session(self, database=None):
+            return Session(self.log)
+    cache = RetrievalCache()
+    r = Retriever(FakeEmbeddingManager(), FakeVectorStore(), Driver(), cache=cache)
+    hits = r.retrieve('Vue d\'ensemble du portefeuille ?', mode='global')
+    assert hits['community_hits'] == [] and 'communautés' in hits['notice']
+    assert cache.stats()['entries'] == 0                 # réponse provisoire : pas mise en cache
@@ -0,0 +1,134 @@
+import sys
+import json
+import pathlib
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'embedding' or m.startswith('embedding.')]:
+    sys.modules.pop(name)
+
+from conftest import FakeDriver
+from embedding.reindexer import BlueGreenReindexer
+from embedding.embedding_manager import EmbeddingManager, IndexEmbeddingManager
+from db.generations import generations
+
+
+def _stale(c):
+    """Sans vecteur g1, ou vecteur g1 calculé sur un autre texte (``null <> x`` est faux en Cypher)."""
+    return 'embedding_g1' not in c or c.get('embedding_g1_hash', c.get('content_hash')) != c.get('content_hash')
+
+
+class FakeGraph(FakeDriver):
+    """Chunks {eid: {text, props}} ; répond aux requêtes du reindexer."""
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+    def answer(self, query, params):
+        if query.startswith('MATCH (c:Chunk) WHERE c.`text` IS NOT NULL'):
+            return [{'eid': e} for e, c in self.chunks.items() if _stale(c)]
+        if query.startswith('UNWIND $eids'):
+            return [{'eid': e, 'text': self.chunks[e]['text'], 'hash': self.chunks[e].get('content_hash')}
+                    for e in params['eids'] if _stale(self.chunks[e])]
+        if query.startswith('UNWIND $rows'):
+            for row in params['rows']:
+                self.chunks[row['eid']].update(embedding_g1=row['vec'], embedding_g1_hash=row['hash'])
+            return []
+        if 'REMOVE c.`embedding`' in query:
+            todo = [c for c in self.chunks.values()
+                    if 'embedding' in c and 'embedding_g1' in c and not _stale(c)][:params['n']]
+            for c in todo:
+                del c['embedding']
+                c['embed_model'] = params['model']
+            return [{'n': len(todo)}]
+        return []
+
+
+class FakeStore:
+    node_label, text_prop, index_name, embed_prop = 'Chunk', 'text', 'chunk_vector', 'embedding'
+    vector_storage, use_alias, alias_ttl, db = 'list', True, 0, None
+    ALIAS_LABEL = 'VectorIndexAlias'
+    def __init__(self, graph, target=None):
+        self.driver = graph
+        self.target = target or {'index': 'chunk_vector', 'embed_prop': 'embedding', 'generation': 0,
+                                 'model': None, 'embed_cfg': None}
+        self.invalidated = 0
+    @staticmethod
+    def _sanitize(name):
+        return name
+    def active(self):
+        return self.target
+    def invalidate_alias(self):
+        self.invalidated += 1
+
+
+def _reindexer(chunks, **kw):
+    graph = FakeGraph(chunks)
+    job = BlueGreenReindexer(FakeStore(graph), EmbeddingManager('hash', dim=4), grace=0, **kw)
+    return job, graph
+
+
+def test_fill_scans_label_once_and_embeds_in_batches():
+    job, graph = _reindexer({f'e{i}': {'text': f'chunk {i}', 'embedding': [0.0]} for i in range(5)}, batch_size=2)
+    graph.chunks['e3']['embedding_g1'] = [1.0]            # déjà rempli : ignoré
+    assert job._fill('embedding_g1') == 4
+    scans = [q for q, _ in graph.log if q.startswith('MATCH (c:Chunk)')]
+    assert len(scans) == 1 and 'LIMIT' not in scans[0]
+    writes = [p['rows'] for q, p in graph.log if q.startswith('UNWIND $rows')]
+    assert [len(r) for r in writes] == [2, 2]
+    assert all(len(c['embedding_g1']) == 4 for e, c in graph.chunks.items() if e != 'e3')
+    assert job.state['embedded'] == 4
+    assert job._fill('embedding_g1') == 0                 # rattrapage : plus rien à faire
+
+
+def test_fill_reembeds_chunks_whose_text_changed_meanwhile():
+    chunks = {'e0': {'text': 'ancien', 'content_hash': 'h0', 'embedding': [0.0]},
+              'e1': {'text': 'stable', 'content_hash': 'h1', 'embedding': [0.0]}}
+    job, graph = _reindexer(chunks)
+    assert job._fill('embedding_g1') == 2
+    scan = next(q for q, _ in graph.log if q.startswith('MATCH (c:Chunk)'))
+    assert 'c.`embedding_g1_hash` <> c.content_hash' in scan
+    chunks['e0'].update(text='nouveau', content_hash='h0b')   # réingéré pendant le remplissage
+    old = job.store.active()
+    job._cleanup(old, job.next_target(old))
+    assert 'embedding' in chunks['e0'] and 'embed_model' not in chunks['e0']   # pas estampillé
+    assert job._fill('embedding_g1') == 1 and chunks['e0']['embedding_g1_hash'] == 'h0b'
+    job._cleanup(old, job.next_target(old))
+    assert 'embedding' not in chunks['e0'] and chunks['e0']['embed_model'] == 'hash:4'
+
+
+def test_switch_records_embedder_config_and_bumps_index_epoch():
+    job, graph = _reindexer({})
+    old = job.store.active()
+    new = job.next_target(old)
+    assert new == {'index': 'chunk_vector_g1', 'embed_prop': 'embedding_g1', 'generation': 1, 'model': 'hash:4'}
+    epoch = generations.token()[2]
+    job._switch(old, new, dim=4)
+    query, params = graph.log[-1]
+    assert query.startswith('MERGE (a:VectorIndexAlias {name: $name})')
+    assert params['model'] == 'hash:4' and params['prop'] == 'embedding_g1'
+    assert json.loads(params['embed_cfg']) == {'provider': 'hash', 'params': {'dim': 4}}
+    assert generations.token()[2] == epoch + 1 and job.store.invalidated == 1
+
+
+def test_cleanup_drops_old_index_and_property_in_batches():
+    chunks = {f'e{i}': {'text': 't', 'embedding': [0.0], 'embedding_g1': [1.0]} for i in range(5)}
+    chunks['e4'].pop('embedding_g1')                      # pas encore rempli : ancien vecteur gardé
+    job, graph = _reindexer(chunks, cleanup_batch=3)
+    old = job.store.active()
+    job._cleanup(old, job.next_target(old))
+    assert graph.log[0][0] == 'DROP INDEX `chunk_vector` IF EXISTS'
+    assert job.state['cleaned'] == 4
+    assert 'embedding' in chunks['e4'] and all('embedding' not in chunks[f'e{i}'] for i in range(4))
+    assert chunks['e0']['embed_model'] == 'hash:4'
+
+
+def test_index_embedder_follows_alias_and_rejects_other_models():
+    target = {'index': 'chunk_vector_g1', 'model': 'hash:8',
+              'embed_cfg': json.dumps({'provider': 'hash', 'params': {'dim': 8}})}
+    store = FakeStore(FakeGraph({}), target)
+    emb = IndexEmbeddingManager(store, {'provider': 'hash', 'params': {'dim': 4}})
+    assert emb.model_id == 'hash:8' and len(emb.embed_texts(['a'])[0]) == 8
+    store.target = {'index': 'chunk_vector', 'model': 'hash:16', 'embed_cfg': None}   # alias sans config
+    with pytest.raises(ValueError, match='hash:16'):
+        emb.embed_texts(['a'])
@@ -0,0 +1,79 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+from rag.retrieval_cache import RetrievalCache, normalize_question
+from db.generations import GenerationCounter
+
+
+class SharedGenerations:
+    """Nœuds (:DataGeneration {scope}) partagés par plusieurs « workers »."""
+    def __init__(self):
+        self.n = {}
+    def session(self, database=None):
+        return self
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        pass
+    def execute_write(self, fn):
+        return fn(self)
+    def run(self, query, scopes):
+        if 'MERGE' in query:
+            for scope in scopes:
+                self.n[scope] = self.n.get(scope, 0) + 1
+            return self
+        rows = [{'scope': scope, 'n': self.n.get(scope, 0)} for scope in scopes]
+        return type('Rows', (list,), {'data': lambda r: list(r)})(rows)
+    def consume(self):
+        pass
+
+def test_normalize_question():
+    assert normalize_question('  Prix\tF3, CASABLANCA ?') == 'prix f3, casablanca'
+    assert normalize_question('ثمن شقة؟') == 'ثمن شقة'
+
+def test_lru_and_memory_cap_evict_oldest():
+    cache = RetrievalCache(max_entries=2)
+    for i in range(3):
+        cache.put(i, {'v': i})
+    assert cache.get(0) is None and cache.get(2) == {'v': 2}
+    big = RetrievalCache(max_bytes=40)
+    big.put('a', 'x' * 20)
+    big.put('b', 'y' * 20)
+    assert big.get('a') is None and big.get('b') == 'y' * 20
+    big.put('c', 'z' * 100)                     # plus gros que le plafond : ignoré
+    assert big.get('c') is None and big.stats()['entries'] == 1
+
+def test_ttl_expires_entries(monkeypatch):
+    import rag.retrieval_cache as rc
+    now = [100.0]
+    monkeypatch.setattr(rc.time, 'monotonic', lambda: now[0])
+    cache = RetrievalCache(ttl=10)
+    cache.put('k', [1])
+    now[0] += 5
+    assert cache.get('k') == [1]
+    now[0] += 6
+    assert cache.get('k') is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_bump_in_one_worker_changes_the_token_of_the_others():
+    graph = SharedGenerations()
+    a, b = GenerationCounter(), GenerationCounter()
+    a.bind(graph, 'neo4j')
+    b.bind(graph, 'neo4j')
+    before, other = b.token('s1'), b.token('s2')
+    a.bump('s1')
+    assert b.token('s1') != before and b.token('s2') == other
+    a.bump(kind='kg')
+    assert b.token('s2') != other
+
+def test_token_is_none_when_shared_counters_are_unreadable():
+    class Down:
+        def session(self, database=None):
+            raise OSError('neo4j indisponible')
+    g = GenerationCounter()
+    g.bind(Down())
+    assert g.token() is None
+    g.bind(None)
+    assert g.token() == (0, 0, 0)
@@ -0,0 +1,57 @@
+import sys
+import asyncio
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from knowledge.rule_extractor import ExtractionRouter, RuleExtractor, infer_relation
+
+def _facts(triplets):
+    return sorted((t.subject, t.relation, t.object) for t in triplets)
+
+def test_json_and_pseudo_json_records():
+    rules = RuleExtractor()
+    assert _facts(rules.extract('{"type":"Appartement F5","price":250000}')) == [
+        ('Appartement F5', 'HAS_PRICE', '250000')]
+    nested = "{'projet': 'Al Abrar', 'ville': 'Mediouna', 'biens': [{'type': 'F3', 'prix': '250 000 DH'}]}"
+    assert _facts(rules.extract(nested)) == [('Al Abrar', 'HAS_BIENS', 'F3'), ('Al Abrar', 'LOCATED_IN', 'Mediouna'),
+                                             ('F3', 'HAS_PRICE', '250 000 DH')]
+
+def test_csv_jsonl_and_key_value_blocks():
+    rules = RuleExtractor()
+    grid = 'Projet;Type;Pièces;Prix\nAl Abrar;Appartement;3;250000\nJardins;Villa;5;1200000'
+    facts = _facts(rules.extract(grid))
+    assert ('Al Abrar', 'HAS_ROOM_COUNT', '3') in facts and ('Jardins', 'OFFERS_PROPERTY_TYPE', 'Villa') in facts
+    assert len(facts) == 6
+    assert _facts(rules.extract('{"projet":"A","prix":"1"}\n{"projet":"B","prix":"2"}')) == [
+        ('A', 'HAS_PRICE', '1'), ('B', 'HAS_PRICE', '2')]
+    listing = 'Résidence Al Abrar\nPrix : 250 000 DH\nSurface : 65 m²\nLivraison : 2026'
+    assert _facts(rules.extract(listing)) == [('Résidence Al Abrar', 'HAS_LIVRAISON', '2026'),
+                                              ('Résidence Al Abrar', 'HAS_PRICE', '250 000 DH'),
+                                              ('Résidence Al Abrar', 'HAS_SURFACE', '65 m²')]
+    assert _facts(rules.extract('المشروع : النور\nالسعر : 250000 درهم')) == [('النور', 'HAS_PRICE', '250000 درهم')]
+
+def test_free_text_and_subjectless_records_go_to_the_llm():
+    rules = RuleExtractor()
+    assert rules.extract("Le projet Al Abrar, situé à Mediouna, propose des F3.\nIl est proche de l'autoroute.") is None
+    assert rules.extract('Prix : 250 000 DH\nSurface : 65 m²') is None          # pas de sujet
+    assert rules.extract('{"projet": "X", "description": "' + 'Très beau projet ' * 20 + '"}') is None
+    assert infer_relation('1,2 M DH') == 'HAS_PRICE' and infer_relation('F3') == 'HAS_ROOM_COUNT'
+
+def test_router_reports_rule_fraction():
+    class Llm:
+        calls = []
+        def extract_relations(self, text):
+            self.calls.append(text)
+            return []
+        def prompt_hash(self):
+            return 'p1'
+    router = ExtractionRouter(Llm())
+    router.extract_relations('{"projet": "A", "prix": "1"}')
+    router.extract_relations('Un texte libre sur le projet.')
+    assert Llm.calls == ['Un texte libre sur le projet.']
+    assert router.report()['rule_fraction'] == 0.5
+    assert router.prompt_hash() != 'p1'
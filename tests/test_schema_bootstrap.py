@@ -0,0 +1,65 @@
+import sys
+import pathlib
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+for name in [m for m in sys.modules if m == 'knowledge' or m.startswith('knowledge.')]:
+    sys.modules.pop(name)
+
+from conftest import FakeDriver
+from knowledge.schema_manager import SchemaBootstrap
+
+class SchemaDriver(FakeDriver):
+    """*rows* : réponse de SHOW INDEXES ; *keyless* : entités sans clé (nom, degré)."""
+    def __init__(self, rows=(), keyless=()):
+        super().__init__()
+        self.rows, self.keyless = rows, list(keyless)
+    def answer(self, cypher, params):
+        if 'WHERE n.key IS NULL' in cypher:
+            return ({'name': r['name']} for r in self.keyless)
+        if 'COUNT { (e)--() }' in cypher:
+            return self.keyless
+        return self.rows if cypher.startswith('SHOW') else ()
+
+def test_ensure_creates_merge_key_constraints_once():
+    driver = SchemaDriver()
+    first = SchemaBootstrap(driver, 'neo4j').ensure()
+    ddl = ' '.join(driver.queries())
+    assert first == {'applied': True, 'errors': {}}
+    assert 'REQUIRE n.id IS UNIQUE' in ddl and 'REQUIRE n.key IS UNIQUE' in ddl
+    assert 'DROP CONSTRAINT entity_name_unique IF EXISTS' in ddl
+    assert 'ON (n.series)' in ddl and 'ON (n.ingest_ts)' in ddl
+    assert all('IF NOT EXISTS' in q for q in driver.queries() if q.startswith('CREATE'))
+    assert driver.queries()[-1].startswith('CALL db.awaitIndexes')
+    n = len(driver.queries())
+    assert SchemaBootstrap(driver, 'neo4j').ensure()['applied'] is False
+    assert len(driver.queries()) == n
+
+def test_state_reports_missing_items():
+    driver = SchemaDriver(rows=[{'name': 'chunk_id_unique', 'state': 'ONLINE'}])
+    state = {i['name']: i['state'] for i in SchemaBootstrap(driver).state()}
+    assert state['chunk_id_unique'] == 'ONLINE'
+    assert state['entity_key_unique'] == 'MISSING'
+
+def test_ensure_migrates_keyless_entities_before_merge_on_key():
+    driver = SchemaDriver(keyless=[{'eid': 'e1', 'name': 'Casablanca', 'degree': 3},
+                                 {'eid': 'e2', 'name': 'casablanca ', 'degree': 1}])
+    out = SchemaBootstrap(driver, 'migration').ensure()
+    assert out['backfill'] == {'keyed': 1, 'merged': 1}
+    delete = next(i for i, q in enumerate(driver.queries()) if 'DETACH DELETE' in q)
+    create = next(i for i, q in enumerate(driver.queries()) if q.startswith('CREATE CONSTRAINT'))
+    assert delete < create
+
+def test_ensure_skips_backfill_for_entities_without_a_usable_name():
+    driver = SchemaDriver(keyless=[{'eid': 'e1', 'name': ' - ', 'degree': 0}])
+    out = SchemaBootstrap(driver, 'sans-nom').ensure()
+    assert 'backfill' not in out
+    assert not any('COUNT { (e)--() }' in q for q in driver.queries())
+
+def test_fulltext_index_follows_vector_store_settings():
+    class Store:
+        driver, db, node_label, text_prop, fulltext_index = None, None, 'Passage', 'body', 'passages-ft'
+    ddl = SchemaBootstrap.for_store(Store()).statements()
+    assert 'chunk_text_ft' not in ddl
+    assert ddl['passages_ft'] == ('CREATE FULLTEXT INDEX `passages_ft` IF NOT EXISTS '
+                                  'FOR (n:Passage) ON EACH [n.`body`]')
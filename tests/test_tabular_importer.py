@@ -0,0 +1,94 @@
+import sys
+import pathlib
+
+import pytest
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / 'backend'))
+
+from conftest import FakeDriver, Rows
+from ingestion.tabular_importer import ColumnMapping, TabularImporter, to_number
+
+MAPPING = {
+    'nodes': [
+        {'alias': 'p', 'label': 'Project', 'key': {'name': 'Projet'}},
+        {'alias': 'u', 'label': 'Unit', 'key': {'ref': 'Ref'},
+         'props': {'rooms': {'column': 'Pieces', 'type': 'int'},
+                   'price_mad': {'column': 'Prix', 'type': 'float'}}},
+    ],
+    'relationships': [{'type': 'HAS_UNIT', 'from': 'p', 'to': 'u'}],
+}
+
+
+class ImportDriver(FakeDriver):
+    def answer(self, query, params):
+        return Rows(nodes_created=len(params.get('rows', [])))
+
+
+def test_to_number_formats():
+    assert to_number('1 250 000') == 1250000.0
+    assert to_number('65,5') == 65.5
+    assert to_number('1.250.000,00') == 1250000.0
+    assert to_number('1,250,000.50') == 1250000.5
+    assert to_number('n/a') is None
+
+
+def test_single_separator_before_three_digits_is_a_thousands_separator():
+    assert to_number('250.000') == 250000.0
+    assert to_number('250,000') == 250000.0
+    assert to_number('1.250') == 1250.0
+    assert to_number('12.50') == 12.5
+    # séparateur décimal déclaré par colonne
+    assert to_number('1.250', decimal='.') == 1.25
+    assert to_number('1.250.000,5', decimal=',') == 1250000.5
+    stats = {'invalid_values': 0}
+    col = ColumnMapping._column({'column': 'Surface', 'type': 'float', 'decimal': ','})
+    assert ColumnMapping._value({'Surface': '65,500'}, col, stats) == 65.5
+    with pytest.raises(ValueError):
+        ColumnMapping._column({'column': 'Prix', 'type': 'float', 'decimal': ';'})
+
+
+def test_mapping_rejects_unsafe_identifiers():
+    with pytest.raises(ValueError):
+        ColumnMapping({'nodes': [{'label': 'Unit` DETACH DELETE n //', 'key': {'ref': 'Ref'}}]})
+    with pytest.raises(ValueError):
+        ColumnMapping({'nodes': [{'label': 'Unit'}]})
+    with pytest.raises(ValueError):
+        ColumnMapping({'nodes': MAPPING['nodes'], 'relationships': [{'type': 'X', 'from': 'p', 'to': 'zz'}]})
+
+
+def test_queries_and_row_preparation():
+    m = ColumnMapping(MAPPING)
+    qs = m.queries()
+    assert len(qs) == 3
+    assert 'MERGE (n:`Unit` {`ref`: row.n1.key.`ref`})' in qs[1]
+    assert 'MERGE (a)-[rel:`HAS_UNIT`]->(b)' in qs[2]
+    stats = {'invalid_values': 0}
+    row = m.prepare({'Projet': 'Al Abrar', 'Ref': 'A-12', 'Pieces': '3', 'Prix': 'inconnu'}, stats)
+    assert row['n1'] == {'key': {'ref': 'A-12'}, 'props': {'rooms': 3}}
+    assert row['r0'] == {}
+    assert stats['invalid_values'] == 1
+    # unité sans référence : nœud et relation absents, le projet reste importé
+    row = m.prepare({'Projet': 'Al Abrar', 'Ref': ' ', 'Pieces': '', 'Prix': ''}, stats)
+    assert set(row) == {'n0'}
+
+
+def test_csv_import_streams_in_batches(tmp_path):
+    path = tmp_path / 'stock.csv'
+    lines = ['Projet;Ref;Pieces;Prix'] + [f'P{i % 2};U{i};3;"1 200 000"' for i in range(5)] + [';;;']
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    driver = ImportDriver()
+    stats = TabularImporter(driver, batch_size=2).run(path, MAPPING)
+    assert stats['rows'] == 6
+    assert stats['skipped_rows'] == 1
+    assert stats['batches'] == 3
+    writes = [p['rows'] for q, p in driver.log if 'rows' in p]
+    assert [len(r) for r in writes] == [2] * 3 + [2] * 3 + [1] * 3
+    assert writes[0][0]['n1']['props'] == {'rooms': 3, 'price_mad': 1200000.0}
+    assert sum(1 for q, _ in driver.log if q.startswith('CREATE CONSTRAINT')) == 2
+
+
+def test_missing_column_is_reported(tmp_path):
+    path = tmp_path / 'stock.csv'
+    path.write_text('Projet,Ref\nP,U1\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='Pieces'):
+        TabularImporter(ImportDriver()).run(path, MAPPING, ensure_constraints=False)
@@ -54,6 +54,120 @@ def test_save_builds_rows(manager):
 
 def test_search_similar_formats_results(manager):
     mgr, session = manager
-    session.run.return_value = [{'score': 1.0, 'node': {'text': 'hello'}}]
+    session.run.return_value = [{'id': 'c1', 'score': 1.0, 'props': {'text': 'hello'}}]
     results = mgr.search_similar([0.1], k=1)
     assert results == [{'score': 1.0, 'text': 'hello'}]
+    cypher = session.run.call_args[0][0]
+    assert 'node {.`text`}' in cypher and 'RETURN node,' not in cypher
+
+def test_search_filters_overfetch_until_top_k(manager):
+    mgr, session = manager
+    session.run.side_effect = [
+        [{'id': 'c1', 'score': 0.9, 'props': {'text': 'a'}}],
+        [{'id': 'c1', 'score': 0.9, 'props': {'text': 'a'}}, {'id': 'c2', 'score': 0.8, 'props': {'text': 'b'}}],
+    ]
+    hits = mgr.search([0.1], k=2, filters={'series': 's1', 'city': 'Casablanca'}, overfetch=3)
+    assert [h['id'] for h in hits] == ['c1', 'c2']
+    first, second = session.run.call_args_list
+    assert first.kwargs['fetch'] == 6 and second.kwargs['fetch'] == 12
+    assert first.kwargs['f_series'] == 's1'
+    assert 'node.series = $f_series' in first.args[0]
+
+def test_search_with_neighbours_projects_adjacent_chunks(manager):
+    mgr, session = manager
+    session.run.return_value = [{'id': 'c2', 'score': 0.7, 'props': {'text': 'b'},
+                                 'prev': {'id': 'c1', 'text': 'a'}, 'next': None}]
+    hit = mgr.search([0.1], k=1, with_neighbours=True)[0]
+    assert hit['prev'] == {'id': 'c1', 'text': 'a'} and hit['next'] is None
+    assert 'NEXT_CHUNK' in session.run.call_args[0][0]
+
+def test_managers_share_registry_driver(monkeypatch):
+    from db.driver_registry import DriverRegistry
+    created = []
+    class FakeDriver:
+        closed = False
+        def close(self):
+            self.closed = True
+    class FakeGraphDatabase:
+        @staticmethod
+        def driver(url, auth, **pool):
+            created.append(pool)
+            return FakeDriver()
+    fake_neo4j = types.ModuleType('neo4j')
+    fake_neo4j.GraphDatabase = FakeGraphDatabase
+    monkeypatch.setitem(sys.modules, 'neo4j', fake_neo4j)
+    registry = DriverRegistry(pool_cfg={'max_connection_pool_size': 7})
+    monkeypatch.setattr('embedding.vector_store.driver_registry', registry)
+
+    a = Neo4jVectorManager(url='bolt://x', username='u', password='p')
+    b = Neo4jVectorManager(url='bolt://x', username='u', password='p')
+    assert a.driver is b.driver
+    assert created == [{'max_connection_pool_size': 7}]
+    drv = a.driver
+    registry.close_all()
+    assert drv.closed and len(registry) == 0
+
+def test_save_upsert_skips_unchanged_and_counts(manager):
+    mgr, session = manager
+    h_same, h_old = mgr.content_hash('same'), mgr.content_hash('old model')
+    session.run.side_effect = [
+        [{'h': h_same, 'model': 'hash:384'}, {'h': h_old, 'model': 'hash:128'}],
+        None,
+    ]
+    counts = mgr.save(texts=['same', 'old model', 'new', 'new '], embeddings=[[0.1]] * 4,
+                      version='v1', mode='upsert', model='hash:384')
+    assert counts == {'inserted': 1, 'updated': 1, 'unchanged': 1, 'duplicates': 1}
+    cypher, kwargs = session.run.call_args[0][0], session.run.call_args[1]
+    assert 'MERGE' in cypher and 'content_hash: r.content_hash' in cypher
+    assert sorted(r['text'] for r in kwargs['rows']) == ['new ', 'old model']
+    assert all(r['embed_model'] == 'hash:384' and r['version'] == 'v1' for r in kwargs['rows'])
+
+def test_save_native_storage_writes_vector_separately():
+    session = DummySession()
+    mgr = Neo4jVectorManager(url='bolt://x', username='u', password='p', vector_storage='native')
+    mgr.driver = DummyDriver(session)
+    mgr.save(texts=['foo'], embeddings=[[0.1, 0.2]], version='v1')
+    cypher, kwargs = session.run.call_args[0][0], session.run.call_args[1]
+    assert 'SET c = r.props' in cypher and 'setNodeVectorProperty(c, \'embedding\', r.vec)' in cypher
+    assert kwargs['rows'] == [{'props': {'text': 'foo', 'version': 'v1'}, 'vec': [0.1, 0.2]}]
+
+def test_search_fulltext_escapes_lucene_syntax(manager):
+    mgr, session = manager
+    session.run.return_value = [{'id': 'c9', 'score': 3.2, 'props': {'text': 'Réf A/12'}}]
+    hits = mgr.search_fulltext('réf: A/12 (Al-Abrar) ?', k=1)
+    assert hits == [{'id': 'c9', 'score': 3.2, 'text': 'Réf A/12'}]
+    cypher, kwargs = session.run.call_args[0][0], session.run.call_args[1]
+    assert 'db.index.fulltext.queryNodes' in cypher and kwargs['index'] == 'chunk_text_ft'
+    assert kwargs['lucene'] == 'réf\\: A\\/12 \\(Al\\-Abrar\\)'
+    assert mgr.search_fulltext('?? !!') == []
+
+def test_alias_resolves_physical_index_with_ttl_cache():
+    session = DummySession()
+    alias = MagicMock()
+    alias.data.return_value = [{'index': 'chunk_vector_g2', 'embed_prop': 'embedding_g2',
+                                'generation': 2, 'model': 'hash:384'}]
+    session.run.side_effect = [alias, [{'id': 'c1', 'score': 0.5, 'props': {'text': 'x'}}],
+                               [{'id': 'c1', 'score': 0.5, 'props': {'text': 'x'}}]]
+    mgr = Neo4jVectorManager(url='bolt://alias', username='u', password='p',
+                             index_name='chunk_vector', use_alias=True)
+    mgr.driver = DummyDriver(session)
+    mgr.invalidate_alias()
+    mgr.search([0.1], k=1)
+    other = Neo4jVectorManager(url='bolt://alias', username='u', password='p',
+                               index_name='chunk_vector', use_alias=True)
+    other.driver = mgr.driver
+    other.search([0.1], k=1)                  # même alias : servi par le cache partagé
+    assert session.run.call_count == 3
+    assert all(c[1]['index'] == 'chunk_vector_g2' for c in session.run.call_args_list[1:])
+    assert other.active()['embed_prop'] == 'embedding_g2'
+    mgr.invalidate_alias()
+
+def test_version_filter_uses_configured_version_property():
+    session = DummySession()
+    session.run.return_value = []
+    mgr = Neo4jVectorManager(url='bolt://x', username='u', password='p', version_prop='embed_version')
+    mgr.driver = DummyDriver(session)
+    mgr.search([0.1], k=1, filters={'version': 'v2'})
+    cypher = session.run.call_args.args[0]
+    assert 'node.`embed_version` = $f_version' in cypher and 'node.version' not in cypher
+    assert session.run.call_args.kwargs['f_version'] == 'v2'